@@ -1,9 +1,122 @@
 import * as THREE from "three";
 
+/** Window of a chunked keyframe track: [start time, end time, encoded times, encoded values]. */
+export type TrackWindow = [number, number, any, any];
+
+/** Constructor of a keyframe track, e.g., THREE.VectorKeyframeTrack. */
+type KeyframeTrackType = new (
+    name: string,
+    times: any,
+    values: any,
+    ...args: any[]
+) => THREE.KeyframeTrack;
+
+/**
+ * Keyframe track that is split into time windows, each holding the keyframes that cover it. The
+ * windows are kept encoded and only decoded when they are played.
+ */
+class ChunkedTrack {
+    /** Class constructor
+     * @param Track {KeyframeTrackType} - Type of the keyframe track of each window.
+     * @param name {string} - Name of the keyframe track.
+     * @param windows {TrackWindow[]} - Windows of the track, sorted by their start time.
+     * @param decode {(data: any) => any} - Function that decodes the times and values of a window.
+     * @param args {any[]} - Extra arguments of the keyframe tracks, e.g., the interpolation.
+     */
+    constructor(
+        public Track: KeyframeTrackType,
+        public name: string,
+        public windows: TrackWindow[],
+        public decode: (data: any) => any,
+        public args: any[],
+    ) {}
+
+    /**
+     * Finds the window that covers a time. Times before the first window or after the last one
+     * are covered by those windows.
+     * @param t {number} - Time.
+     */
+    windowAt(t: number): number {
+        let lo = 0;
+        let hi = this.windows.length - 1;
+        while (lo < hi) {
+            const mid = (lo + hi + 1) >> 1;
+            if (this.windows[mid][0] <= t) {
+                lo = mid;
+            } else {
+                hi = mid - 1;
+            }
+        }
+        return lo;
+    }
+
+    /**
+     * Decodes a window into a keyframe track.
+     * @param k {number} - Index of the window.
+     */
+    window(k: number): THREE.KeyframeTrack {
+        const [, , times, values] = this.windows[k];
+        return new this.Track(this.name, this.decode(times), this.decode(values), ...this.args);
+    }
+}
+
+/**
+ * Interpolant of a chunked keyframe track. It evaluates the interpolant of the window that covers
+ * the time being evaluated, whether the time comes from playback or from a seek. Only that window
+ * and its neighbors are kept decoded, so memory stays flat however long the track is.
+ */
+class WindowInterpolant {
+    /** Buffer the values are written to. The mixer sets this when it binds the track. */
+    resultBuffer: any;
+
+    /** Interpolation settings. The mixer sets these when it creates the action. */
+    settings: any = null;
+
+    /** Interpolants of the decoded windows keyed on their index. */
+    decoded = new Map<number, THREE.Interpolant>();
+
+    /** Class constructor
+     * @param track {ChunkedTrack} - Chunked keyframe track.
+     * @param resultBuffer {any} - Buffer the values are written to.
+     */
+    constructor(
+        public track: ChunkedTrack,
+        resultBuffer: any,
+    ) {
+        this.resultBuffer = resultBuffer;
+    }
+
+    /**
+     * Evaluates the track.
+     * @param t {number} - Time.
+     */
+    evaluate(t: number): any {
+        const k = this.track.windowAt(t);
+        let interpolant = this.decoded.get(k);
+        if (interpolant === undefined) {
+            interpolant = this.track.window(k).createInterpolant(this.resultBuffer);
+            this.decoded.set(k, interpolant);
+
+            // Drop the windows that are not next to this one
+            for (const j of this.decoded.keys()) {
+                if (Math.abs(j - k) > 1) {
+                    this.decoded.delete(j);
+                }
+            }
+        }
+        interpolant.resultBuffer = this.resultBuffer;
+        interpolant.settings = this.settings;
+        return interpolant.evaluate(t);
+    }
+}
+
 export class MyMixer extends THREE.AnimationMixer {
     /** An array of keyframe tracks that make up the animation clip. */
     keyframe_tracks: THREE.KeyframeTrack[] = [];
 
+    /** End time of the chunked keyframe tracks, whose keyframes are not all in the clip. */
+    chunked_duration: number = 0;
+
     /** This is the animation clip, which is composed of the keyframe tracks. */
     clip: THREE.AnimationClip;
 
@@ -19,6 +132,38 @@ export class MyMixer extends THREE.AnimationMixer {
         this.keyframe_tracks.push(keyframe_track);
     }
 
+    /**
+     * Adds a keyframe track that is split into time windows to the clip. The windows are decoded
+     * when the animation reaches them, and dropped again when it moves on, so long tracks neither
+     * delay the first frame nor have to be held in memory all at once.
+     * @param Track {KeyframeTrackType} - Type of the keyframe track, e.g.,
+     * THREE.VectorKeyframeTrack.
+     * @param name {string} - Name of the keyframe track.
+     * @param windows {TrackWindow[]} - Windows of the track, sorted by their start time. Each
+     * window holds the keyframes that cover it, so interpolating within a window gives the same
+     * values as interpolating the whole track.
+     * @param decode {(data: any) => any} - Function that decodes the times and values of a window,
+     * e.g., decodeFloat32Array.
+     * @param args {any[]} - Extra arguments of the keyframe track, e.g., the interpolation.
+     */
+    addChunkedTrack(
+        Track: KeyframeTrackType,
+        name: string,
+        windows: TrackWindow[],
+        decode: (data: any) => any,
+        ...args: any[]
+    ) {
+        const chunked = new ChunkedTrack(Track, name, windows, decode, args);
+
+        // The clip binds the first window to the animated property, and evaluates the track
+        // through a WindowInterpolant
+        const keyframe_track = chunked.window(0);
+        keyframe_track.createInterpolant = (result: any) =>
+            new WindowInterpolant(chunked, result) as any;
+        this.keyframe_tracks.push(keyframe_track);
+        this.chunked_duration = Math.max(this.chunked_duration, windows[windows.length - 1][1]);
+    }
+
     /** This method locks the object and makes it ready for use.
      *  This should be done before the anmiation is started.
      */
@@ -26,6 +171,7 @@ export class MyMixer extends THREE.AnimationMixer {
         // Used to lock the mixer. This creates the clip
         this.clip = new THREE.AnimationClip("Action", -1, this.keyframe_tracks);
         this.clip.resetDuration();
+        this.clip.duration = Math.max(this.clip.duration, this.chunked_duration);
         this.clip_action = this.clipAction(this.clip);
         this.clip_action.play();
     }
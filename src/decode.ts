@@ -0,0 +1,49 @@
+/**
+ * Decodes a base64 string into its raw bytes.
+ * @param data {string} - Base64 encoded data.
+ */
+export function decodeBase64(data: string): Uint8Array {
+    const binary = atob(data);
+    const bytes = new Uint8Array(binary.length);
+    for (let k = 0; k < binary.length; k++) {
+        bytes[k] = binary.charCodeAt(k);
+    }
+    return bytes;
+}
+
+/**
+ * Decompresses base64 encoded, zlib compressed data with the browser's DecompressionStream.
+ * @param data {string} - Base64 encoded, compressed data, see sihm.compress.
+ */
+export async function decompress(data: string): Promise<Uint8Array> {
+    const stream = new Blob([decodeBase64(data)])
+        .stream()
+        .pipeThrough(new DecompressionStream("deflate"));
+    return new Uint8Array(await new Response(stream).arrayBuffer());
+}
+
+/**
+ * Decompresses base64 encoded, zlib compressed UTF-8 text.
+ * @param data {string} - Base64 encoded, compressed text, see sihm.compress.
+ */
+export async function decompressText(data: string): Promise<string> {
+    return new TextDecoder().decode(await decompress(data));
+}
+
+/**
+ * Decodes little-endian float32 data into a Float32Array.
+ * @param data {string | Uint8Array} - Base64 encoded data, or its raw bytes.
+ */
+export function decodeFloat32Array(data: string | Uint8Array): Float32Array {
+    const bytes = typeof data === "string" ? decodeBase64(data) : data;
+    return new Float32Array(bytes.buffer, bytes.byteOffset, bytes.byteLength / 4);
+}
+
+/**
+ * Decodes little-endian float64 data into a Float64Array.
+ * @param data {string | Uint8Array} - Base64 encoded data, or its raw bytes.
+ */
+export function decodeFloat64Array(data: string | Uint8Array): Float64Array {
+    const bytes = typeof data === "string" ? decodeBase64(data) : data;
+    return new Float64Array(bytes.buffer, bytes.byteOffset, bytes.byteLength / 8);
+}
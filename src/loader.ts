@@ -0,0 +1,132 @@
+import * as THREE from "three";
+import { MyMixer, TrackWindow } from "./animator";
+import { decodeFloat32Array, decodeFloat64Array } from "./decode";
+import { MyInstances } from "./instancing";
+
+/**
+ * Keyframe track in a payload: [property, times, values, ...extra arguments]. Chunked tracks are
+ * [property, windows, null, ...extra arguments], see MyMixer.addChunkedTrack.
+ */
+type PayloadTrack = [
+    string,
+    number[] | string | TrackWindow[],
+    number[] | string | null,
+    ...any[],
+];
+
+/** Object in a payload: [name, parent, geometry, material, tracks]. */
+type PayloadObject = [string, number, number, number, PayloadTrack[]];
+
+/** Scene description written by the parser when the scene_format option is payload. */
+export interface ScenePayload {
+    /** Encoding of keyframe data given as base64 strings. */
+    encoding: string;
+
+    /** Objects in depth-first order, so parents always come before their children. */
+    objects: PayloadObject[];
+}
+
+/**
+ * Decodes the times or values of a keyframe track.
+ * @param data {number[] | string} - Array, or base64 encoded data.
+ * @param encoding {string} - Encoding of base64 encoded data.
+ */
+function decodeTrackData(data: number[] | string, encoding: string): ArrayLike<number> {
+    if (typeof data !== "string") {
+        return data;
+    }
+    return encoding == "float64" ? decodeFloat64Array(data) : decodeFloat32Array(data);
+}
+
+/**
+ * Resolves an extra keyframe track argument, e.g., "THREE.InterpolateDiscrete".
+ * @param arg {any} - Argument as written in the config.
+ */
+function resolveTrackArg(arg: any): any {
+    if (typeof arg === "string" && arg.startsWith("THREE.")) {
+        return (THREE as any)[arg.slice(6)];
+    }
+    return arg;
+}
+
+/**
+ * Builds the objects described by a payload and adds their keyframe tracks to the mixer.
+ * @param scene {THREE.Scene} - Scene to add the objects to.
+ * @param mixer {MyMixer} - Mixer to add the keyframe tracks to.
+ * @param followable_objects {THREE.Object3D[]} - Array that objects with a geometry are added to.
+ * @param payload {ScenePayload} - Scene description.
+ * @param geometries {(THREE.BufferGeometry | THREE.Object3D)[]} - Geometries the payload refers
+ * to by index. Objects created by the OBJ loader are cloned rather than shared, and objects that
+ * refer to a MyInstances group become instances of it.
+ * @param materials {THREE.Material[]} - Materials the payload refers to by index.
+ */
+export function buildScene(
+    scene: THREE.Scene,
+    mixer: MyMixer,
+    followable_objects: THREE.Object3D[],
+    payload: ScenePayload,
+    geometries: (THREE.BufferGeometry | THREE.Object3D)[],
+    materials: THREE.Material[],
+): THREE.Object3D[] {
+    const objects: THREE.Object3D[] = [];
+    for (const [name, parent, geometry, material, tracks] of payload.objects) {
+        const parent_obj = parent < 0 ? scene : objects[parent];
+        let obj: THREE.Object3D;
+        if (geometry < 0) {
+            obj = new THREE.Object3D();
+        } else {
+            const template = geometries[geometry];
+            if (template instanceof MyInstances) {
+                // Instanced object. The instances group shares the parent of its instances.
+                obj = template.addInstance();
+                if (template.parent === null) {
+                    parent_obj.add(template);
+                }
+            } else if (template instanceof THREE.Object3D) {
+                obj = template.clone();
+                if (material >= 0) {
+                    // Apply material manually, since it was not applied via an MTL file
+                    obj.traverse(function (child) {
+                        if (child instanceof THREE.Mesh) {
+                            child.material = materials[material];
+                        }
+                    });
+                }
+            } else if (material >= 0) {
+                obj = new THREE.Mesh(template, materials[material]);
+            } else {
+                obj = new THREE.Mesh(template);
+            }
+        }
+        obj.name = name;
+        parent_obj.add(obj);
+        objects.push(obj);
+        if (geometry >= 0) {
+            followable_objects.push(obj);
+        }
+
+        for (const [property, times, values, ...args] of tracks) {
+            const Track =
+                property == "quaternion" ? THREE.QuaternionKeyframeTrack : THREE.VectorKeyframeTrack;
+            if (values === null) {
+                mixer.addChunkedTrack(
+                    Track,
+                    obj.uuid + "." + property,
+                    times as TrackWindow[],
+                    (data: number[] | string) => decodeTrackData(data, payload.encoding),
+                    ...args.map(resolveTrackArg),
+                );
+                continue;
+            }
+            mixer.addKeyframeTrack(
+                new Track(
+                    obj.uuid + "." + property,
+                    decodeTrackData(times as number[] | string, payload.encoding) as any,
+                    decodeTrackData(values, payload.encoding) as any,
+                    ...(args.map(resolveTrackArg) as []),
+                ),
+            );
+        }
+    }
+    return objects;
+}
@@ -0,0 +1,100 @@
+import * as THREE from "three";
+import { decodeBase64 } from "./decode";
+
+/** Quantized vertex attribute: value = q * scale + offset. */
+interface QuantizedAttribute {
+    offset: number[];
+    scale: number[];
+    byte_offset: number;
+}
+
+/** Header of a mesh written by sihm.mesh.write_mesh. */
+interface MeshHeader {
+    vertices: number;
+    indices: number;
+    index_type: "uint16" | "uint32";
+    position: QuantizedAttribute;
+    normal: { byte_offset: number };
+    uv?: QuantizedAttribute;
+    groups: [number, number, string][];
+    index_byte_offset: number;
+}
+
+/** Mesh written by sihm.mesh.write_mesh. */
+export interface EncodedMesh {
+    header: MeshHeader;
+
+    /** Base64 encoded data, or the decompressed bytes of compressed data. */
+    data: string | Uint8Array;
+
+    /** Decoded geometry, which is shared by all objects that use the mesh. */
+    geometry?: THREE.BufferGeometry;
+}
+
+/**
+ * Dequantizes a 16-bit vertex attribute.
+ * @param buffer {ArrayBuffer} - Binary data of the mesh.
+ * @param attribute {QuantizedAttribute} - Location, offset, and scale of the attribute.
+ * @param count {number} - Number of vertices.
+ */
+function dequantize(buffer: ArrayBuffer, attribute: QuantizedAttribute, count: number): THREE.BufferAttribute {
+    const size = attribute.offset.length;
+    const q = new Uint16Array(buffer, attribute.byte_offset, count * size);
+    const values = new Float32Array(count * size);
+    for (let k = 0; k < values.length; k++) {
+        const d = k % size;
+        values[k] = q[k] * attribute.scale[d] + attribute.offset[d];
+    }
+    return new THREE.BufferAttribute(values, size);
+}
+
+/**
+ * Decodes the geometry of a mesh.
+ * @param mesh {EncodedMesh} - Mesh written by sihm.mesh.write_mesh.
+ */
+function decodeGeometry(mesh: EncodedMesh): THREE.BufferGeometry {
+    const header = mesh.header;
+    const buffer = (typeof mesh.data === "string" ? decodeBase64(mesh.data) : mesh.data).buffer;
+    const n = header.vertices;
+
+    const geometry = new THREE.BufferGeometry();
+    geometry.setAttribute("position", dequantize(buffer, header.position, n));
+    geometry.setAttribute(
+        "normal",
+        new THREE.BufferAttribute(new Int16Array(buffer, header.normal.byte_offset, n * 3), 3, true),
+    );
+    if (header.uv) {
+        geometry.setAttribute("uv", dequantize(buffer, header.uv, n));
+    }
+
+    const index =
+        header.index_type == "uint16"
+            ? new Uint16Array(buffer, header.index_byte_offset, header.indices)
+            : new Uint32Array(buffer, header.index_byte_offset, header.indices);
+    geometry.setIndex(new THREE.BufferAttribute(index, 1));
+    header.groups.forEach(([start, count], k) => geometry.addGroup(start, count, k));
+    return geometry;
+}
+
+/**
+ * Creates an object from a mesh written by sihm.mesh.write_mesh. Like the objects the OBJ loader
+ * creates, this is a group that holds the mesh, so the two can be used interchangeably. The
+ * geometry is decoded once and shared by all objects created from the same mesh.
+ * @param mesh {EncodedMesh} - Mesh written by sihm.mesh.write_mesh.
+ * @param materials {any} - Materials created by the MTL loader, or null to use a default material.
+ */
+export function decodeMesh(mesh: EncodedMesh, materials: any = null): THREE.Group {
+    if (mesh.geometry === undefined) {
+        mesh.geometry = decodeGeometry(mesh);
+    }
+
+    // Faces before the first usemtl are in a group without a name, which has no material in
+    // the MTL file, so they get the default material like the OBJ loader gives them
+    const created = mesh.header.groups.map(
+        ([, , name]) =>
+            (name && materials && materials.create(name)) || new THREE.MeshPhongMaterial(),
+    );
+    const object = new THREE.Group();
+    object.add(new THREE.Mesh(mesh.geometry, created.length == 1 ? created[0] : created));
+    return object;
+}
@@ -2,16 +2,24 @@
 
 import os
 import click
-from typing import Any, Dict, Set, Tuple
+from typing import Any, Dict, List, Optional, TYPE_CHECKING
 from copy import deepcopy
 from pathlib import Path
 
+if TYPE_CHECKING:
+    from sihm.parser import SihmParser
+
 
 def main():
 
     options = {}
     output_type = ""
-    cfg_file = ""
+    cfg_files = []
+    watching = False
+    profile = False
+    profile_json = None
+    sizes = False
+    sizes_json = None
 
     def _get_default(cli) -> Dict[Any, Any]:
         """
@@ -51,10 +59,27 @@ def main():
 
     def input_cb(ctx, opt, val) -> None:
         """
-        Sets the input filename.
+        Sets the input filenames, expanding any glob patterns.
         """
-        nonlocal cfg_file
-        cfg_file = val
+        from glob import glob, has_magic
+
+        nonlocal cfg_files
+        cfg_files = []
+        for pattern in val:
+            if not has_magic(pattern):
+                # Report missing files the way click.Path(exists=True) would
+                if not os.path.exists(pattern):
+                    raise click.BadParameter(
+                        f"File '{pattern}' does not exist.", ctx=ctx, param=opt
+                    )
+                if not os.path.isfile(pattern):
+                    raise click.BadParameter(
+                        f"File '{pattern}' is a directory.", ctx=ctx, param=opt
+                    )
+            matches = sorted(f for f in glob(pattern) if os.path.isfile(f))
+            if not matches:
+                raise click.BadParameter(f"No files match '{pattern}'.", ctx=ctx, param=opt)
+            cfg_files += [Path(f) for f in matches if Path(f) not in cfg_files]
 
     def param_cb(ctx, opt, val):
         """
@@ -71,6 +96,15 @@ def main():
                 type=click.Path(exists=True, dir_okay=True, file_okay=False),
                 default=".",
                 show_default=True,
+                help="Project directory. With several input files, each project is created in a subdirectory named after its input file.",
+            )
+            @click.option(
+                "--jobs",
+                "-j",
+                type=click.IntRange(min=1),
+                default=1,
+                show_default=True,
+                help="Number of input files to parse at once. Project mode does not compile the projects, so unlike in html mode, this is not the number of cores webpack and yarn use.",
             )
             def params(ctx, **kwargs):
                 _add_options("params", kwargs)
@@ -85,7 +119,25 @@ def main():
                 type=click.IntRange(min=1),
                 default=1,
                 show_default=True,
-                help="Number of cores to use when building the project",
+                help="Number of cores to use when building the project. With several input files, the cores are split between the projects.",
+            )
+            @click.option(
+                "--workspace/--no-workspace",
+                default=os.name != "nt",
+                show_default=True,
+                help="Reuse a persistent node workspace keyed on the extra modules instead of installing the node modules for every build.",
+            )
+            @click.option(
+                "--clear-workspaces",
+                is_flag=True,
+                default=False,
+                help="Delete the persistent node workspaces before building, so their node modules are reinstalled.",
+            )
+            @click.option(
+                "--prebuilt/--no-prebuilt",
+                default=True,
+                show_default=True,
+                help="Link scenes that need no extra modules or glslify against the prebuilt runtime instead of compiling them with webpack.",
             )
             def params(ctx, **kwargs):
                 _add_options("params", kwargs)
@@ -99,9 +151,9 @@ def main():
     @click.option(
         "--input",
         "-i",
-        type=click.Path(exists=True, dir_okay=False, file_okay=True),
-        help="Input configuration file.",
-        required=True,
+        type=click.Path(dir_okay=False, file_okay=True),
+        help="Input configuration file. May be given several times and may be a glob pattern, e.g., 'runs/*.yaml', to build many configuration files at once.",
+        multiple=True,
         callback=input_cb,
     )
     @click.option(
@@ -113,9 +165,71 @@ def main():
         callback=param_cb,
         is_eager=True,
     )
+    @click.option(
+        "--profile",
+        is_flag=True,
+        default=False,
+        help="Time each phase of the build and record its peak memory, and print them as a table. Tracing the memory slows the build down.",
+    )
+    @click.option(
+        "--profile-json",
+        type=click.Path(dir_okay=False, file_okay=True),
+        default=None,
+        help="Write the build profile to this JSON file. Implies --profile.",
+    )
+    @click.option(
+        "--size-manifest",
+        is_flag=True,
+        default=False,
+        help="Print how many bytes of the output each object, track, asset module and the runtime take up. Objects and modules are measured before webpack bundles and minifies them, and the runtime is whatever remains of the bundled output, so it is only an estimate.",
+    )
+    @click.option(
+        "--size-manifest-json",
+        type=click.Path(dir_okay=False, file_okay=True),
+        default=None,
+        help="Write the size manifest to this JSON file. Implies --size-manifest.",
+    )
     @click.pass_context
     def cli(ctx, **kwargs):
-        pass
+        nonlocal profile, profile_json, sizes, sizes_json
+        profile_json = kwargs["profile_json"]
+        profile = kwargs["profile"] or profile_json is not None
+        sizes_json = kwargs["size_manifest_json"]
+        sizes = kwargs["size_manifest"] or sizes_json is not None
+
+    def watch_input_cb(ctx, opt, val) -> None:
+        """
+        Sets the input filename of the watch command.
+        """
+        if cfg_files:
+            raise click.UsageError("Give the input file after watch, e.g., sihm watch -i x.yaml.")
+        input_cb(ctx, opt, val)
+        if len(cfg_files) != 1:
+            raise click.BadParameter("watch needs exactly one input file.", ctx=ctx, param=opt)
+
+    @cli.command
+    @click.option(
+        "--input",
+        "-i",
+        type=click.Path(dir_okay=False, file_okay=True),
+        help="Input configuration file to build and watch.",
+        required=True,
+        callback=lambda ctx, opt, val: watch_input_cb(ctx, opt, (val,)),
+    )
+    @click.option(
+        "--interval",
+        type=click.FloatRange(min=0.0, min_open=True),
+        default=0.5,
+        show_default=True,
+        help="Time in seconds between checks for changed files.",
+    )
+    def watch(**kwargs):
+        """
+        Rebuild the HTML file whenever the config or any file it uses changes.
+        """
+        nonlocal watching
+        watching = True
+        _add_options("watch", kwargs)
 
     run = cli(standalone_mode=False)
     if isinstance(run, int):
@@ -126,108 +240,138 @@ def main():
         default_opts = _get_default(cli)
         options = _merge_dict(default_opts, options)
 
-    def _parse_file(cfg_file: Path, file_name: str) -> Tuple[Set[str], Set[str]]:
-        """
-        Parse the file to create index.js
-
-        Parameters
-        ----------
-        cfg_file : Path
-            Input config file.
-        fileName : str
-            Output file name.
-
-        Returns
-        -------
-        Tuple[Set[str], Set[str]]
-            Extra modules to add to the project and the set of files to transform with glslify.
-        """
-        from sihm.parser import SihmParser
+    if not cfg_files:
+        raise click.UsageError("Missing option '--input' / '-i'.")
 
-        parser = SihmParser(cfg_file, file_name)
-        parser.write_file()
-        return parser.extra_modules, parser.glslify_files
+    if (profile or sizes) and (watching or len(cfg_files) != 1):
+        # Phases of parallel builds overlap, so only single builds are profiled
+        raise click.UsageError(
+            "--profile and --size-manifest need exactly one input file and cannot watch."
+        )
 
-    def _make_project(directory: Path) -> None:
-        """
-        Create project that is ready to compile.
+    if options["params"].get("clear_workspaces", False):
+        from sihm.workspace import clear_workspaces
 
-        directory: Path
-            Directory where the project should be created.
-        """
-        from shutil import copytree
-        import sihm
-
-        if not os.path.exists(directory):
-            os.makedirs(directory)
-        sihm_path = Path(sihm.__file__)
-        template_project = os.path.join(sihm_path.parents[0], "template_project")
-        copytree(template_project, directory.resolve(), dirs_exist_ok=True)
-
-        # Create path/file for index.js
-        file_name = os.path.join(directory.resolve(), "src", "index.js")
-
-        # Parse the cfg_file and create the index.js file
-        extra_modules, glslify_files = _parse_file(Path(cfg_file), file_name)
-
-        # Add extra modules to the CMakeLists file
-        if extra_modules:
-            cmake_file = directory.joinpath("CMakeLists.txt")
-            with open(cmake_file.resolve(), "r") as f:
-                lines = f.readlines()
-            for k, line in enumerate(lines):
-                if "set(EXTRA_MODULES" in line:
-                    ind = k
-                    break
-            lines[k] = 'set(EXTRA_MODULES "' + '" "'.join(extra_modules) + '")\n'
-            with open(cmake_file.resolve(), "w") as f:
-                f.write("".join(lines))
-        
-        # Add glslify files to process to CMakeLists file
-        if glslify_files:
-            cmake_file = directory.joinpath("CMakeLists.txt")
-            with open(cmake_file.resolve(), "r") as f:
-                lines = f.readlines()
-            for k, line in enumerate(lines):
-                if "set(GLSLIFY_FILES" in line:
-                    ind = k
-                    break
-            lines[k] = 'set(GLSLIFY_FILES "' + '" "'.join(glslify_files) + '")\n'
-            with open(cmake_file.resolve(), "w") as f:
-                f.write("".join(lines))
-
-    if output_type == "project":
+        clear_workspaces()
+
+    if profile:
+        from sihm.profile import Profiler
+
+        with Profiler() as profiler:
+            parser = _build(options, output_type, cfg_files, watching)
+        profiler.print_report()
+        if profile_json is not None:
+            profiler.write_json(profile_json)
+    else:
+        parser = _build(options, output_type, cfg_files, watching)
+
+    if sizes and parser is not None:
+        import json
+        from sihm.sizes import print_size_manifest
+
+        # The manifest covers the HTML file, or the sources of the project in project mode
+        if output_type == "project":
+            src_dir = Path(options["params"]["dir"]).joinpath("src")
+            total = sum(os.path.getsize(f) for f in src_dir.glob("*.js"))
+            report = parser.sizes.report(total, src_dir)
+        else:
+            html_file = cfg_files[0].with_suffix(".html").resolve()
+            report = parser.sizes.report(os.path.getsize(html_file), html_file)
+        print_size_manifest(report)
+        if sizes_json is not None:
+            with open(sizes_json, "w") as f:
+                json.dump(report, f, indent=2)
+
+
+def _build(
+    options: Dict[str, Dict[str, Any]], output_type: str, cfg_files: List[Path], watching: bool
+) -> Optional["SihmParser"]:
+    """
+    Build the input files as the command line options request.
+
+    Parameters
+    ----------
+    options : Dict[str, Dict[str, Any]]
+        Options of each command, merged with their defaults.
+    output_type : str
+        Output type, project or html.
+    cfg_files : List[Path]
+        Input config files.
+    watching : bool
+        Whether to rebuild the HTML file whenever its files change.
+
+    Returns
+    -------
+    Optional[SihmParser]
+        The parser of a single build, or None for batch builds and watching.
+    """
+    if watching:
+        # Rebuild the HTML file on every change. In project mode, the project is kept in the
+        # project directory.
+        from sihm.watch import watch
+
+        cfg_file = cfg_files[0]
+        watch(
+            cfg_file,
+            cfg_file.with_suffix(".html").resolve(),
+            project_dir=Path(options["params"]["dir"]) if output_type == "project" else None,
+            jobs=options["params"]["jobs"],
+            interval=options["watch"]["interval"],
+            workspace=options["params"].get("workspace", os.name != "nt"),
+            prebuilt=options["params"].get("prebuilt", True),
+        )
+    elif output_type == "project":
         # If user wants the standalone project only
         project_dir = Path(options["params"]["dir"])
-        _make_project(project_dir)
-    else:
-        import tempfile
-        from shutil import copyfile
+        if len(cfg_files) == 1:
+            from sihm.build import make_project
+
+            return make_project(cfg_files[0], project_dir)
+        else:
+            from sihm.build import make_projects
+
+            # Each project goes in a subdirectory named after its config file
+            stems = [f.stem for f in cfg_files]
+            if len(set(stems)) != len(stems):
+                raise click.UsageError(
+                    "Input files must have unique names to create their projects in one directory."
+                )
+            results = make_projects(
+                cfg_files,
+                [project_dir.joinpath(stem) for stem in stems],
+                jobs=options["params"]["jobs"],
+            )
+            failed = [(cfg, e) for cfg, e in results if isinstance(e, Exception)]
+            for cfg, e in failed:
+                print(f"ERROR: Failed to parse {cfg}: {e}")
+            if failed:
+                import sys
+
+                sys.exit(1)
+    elif len(cfg_files) == 1:
+        from sihm.build import build_html
 
         # Get the name/location of the final HTML file
-        dark = Path(cfg_file)
+        dark = cfg_files[0]
         html_file = dark.with_suffix(".html").resolve()
 
-        # Create temporary directory for the project
-        temp_dir = tempfile.TemporaryDirectory()
-
-        # Create project
-        project_dir = Path(temp_dir.name)
-        _make_project(project_dir)
-
-        # Compile the project
-        curr_dir = os.getcwd()
-        os.chdir(project_dir)
-        os.mkdir("build")
-        os.chdir("build")
-        if os.name == "nt":
-            # Using windows
-            os.system('cmake .. -G "MinGW Makefiles"')
-        else:
-            os.system("cmake ..")
-        os.system(f"make all -j {options['params']['jobs']}")
-
-        # Copy the file to its final location
-        file_to_copy = Path(os.path.join("dist", "index.html"))
-        copyfile(file_to_copy.resolve(), html_file)
-        os.chdir(curr_dir)
+        # Create the project in a temporary directory and compile it
+        return build_html(
+            cfg_files[0],
+            html_file,
+            jobs=options["params"]["jobs"],
+            workspace=options["params"]["workspace"],
+            prebuilt=options["params"]["prebuilt"],
+        )
+    else:
+        from sihm.build import build_html_batch
+
+        # Each HTML file goes next to its config file
+        build_html_batch(
+            cfg_files,
+            [f.with_suffix(".html").resolve() for f in cfg_files],
+            jobs=options["params"]["jobs"],
+            workspace=options["params"]["workspace"],
+            prebuilt=options["params"]["prebuilt"],
+        )
+    return None
@@ -0,0 +1,287 @@
+import re
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple, Union, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from PIL import Image
+
+# Default options of the texture_atlas option in the SIHM section
+DEFAULT_ATLAS_OPTIONS = {"max_size": 2048, "max_texture_size": 256, "padding": 2}
+
+# Location of a texture in an atlas: atlas index, and x and y of its top left corner in pixels
+Placement = Tuple[int, int, int]
+
+# Built-in geometries whose texture coordinates are all in [0, 1], so their maps can be packed.
+# The texture coordinates of others, e.g., ShapeGeometry, are their positions.
+ATLAS_GEOMETRIES = frozenset(
+    [
+        "BoxGeometry",
+        "CircleGeometry",
+        "ConeGeometry",
+        "CylinderGeometry",
+        "PlaneGeometry",
+        "RingGeometry",
+        "SphereGeometry",
+        "TorusGeometry",
+    ]
+)
+
+# Texture coordinate statement of an OBJ file
+_OBJ_UV = re.compile(r"^([ \t]*vt[ \t]+)(\S+)[ \t]+(\S+)", re.M)
+
+
+def atlas_options(options: Any) -> Optional[Dict[str, int]]:
+    """
+    Validate the texture_atlas option of the SIHM section. The options are:
+
+    * max_size: Maximum width and height of an atlas in pixels.
+    * max_texture_size: Textures larger than this in either dimension are not packed.
+    * padding: Number of pixels around each texture that repeat its edge, so neighboring
+      textures do not bleed into each other when the atlas is filtered.
+
+    Parameters
+    ----------
+    options : Any
+        True to use the default options, a dictionary of options, or False to disable atlases.
+
+    Returns
+    -------
+    Optional[Dict[str, int]]
+        Validated options, or None if atlases are disabled.
+    """
+    if isinstance(options, bool) or options is None:
+        return dict(DEFAULT_ATLAS_OPTIONS) if options else None
+    if not isinstance(options, dict):
+        raise ValueError(f"Got texture_atlas {options}, but expected a bool or a dictionary.")
+
+    result = dict(DEFAULT_ATLAS_OPTIONS)
+    for k, v in options.items():
+        if k not in DEFAULT_ATLAS_OPTIONS:
+            raise ValueError(
+                f"Unknown texture_atlas option {k}. Expected one of "
+                + ", ".join(DEFAULT_ATLAS_OPTIONS)
+                + "."
+            )
+        if not isinstance(v, int) or isinstance(v, bool) or v < (0 if k == "padding" else 1):
+            raise ValueError(f"Got texture_atlas option {k} {v}, but expected an integer.")
+        result[k] = v
+    if result["max_texture_size"] + 2 * result["padding"] > result["max_size"]:
+        raise ValueError("The max_texture_size of texture_atlas does not fit in its max_size.")
+    return result
+
+
+def _ceil_power_of_two(n: int) -> int:
+    """
+    Get the smallest power of two that is at least n.
+
+    Parameters
+    ----------
+    n : int
+        Size in pixels.
+
+    Returns
+    -------
+    int
+        Power of two.
+    """
+    return 1 << max(n - 1, 0).bit_length()
+
+
+def pack_shelves(
+    sizes: List[Tuple[int, int]], max_size: int, padding: int
+) -> Tuple[List[Placement], List[Tuple[int, int]]]:
+    """
+    Pack textures into atlases with the shelf algorithm. The textures are sorted by height, and
+    placed from left to right on shelves, starting a new shelf when one is full and a new atlas
+    when the shelves reach the bottom.
+
+    Parameters
+    ----------
+    sizes : List[Tuple[int, int]]
+        Width and height of each texture.
+    max_size : int
+        Maximum width and height of an atlas.
+    padding : int
+        Padding around each texture.
+
+    Returns
+    -------
+    Tuple[List[Placement], List[Tuple[int, int]]]
+        Placement of each texture, and the width and height of each atlas. Atlases are sized to
+        the smallest powers of two that hold their textures.
+    """
+    order = sorted(range(len(sizes)), key=lambda k: (-sizes[k][1], -sizes[k][0]))
+    placements: List[Placement] = [(0, 0, 0)] * len(sizes)
+
+    # Shelves of each atlas as [y, height, used width]
+    atlases: List[List[List[int]]] = []
+    for k in order:
+        w = sizes[k][0] + 2 * padding
+        h = sizes[k][1] + 2 * padding
+        if w > max_size or h > max_size:
+            raise ValueError(f"Texture of size {sizes[k]} does not fit in an atlas.")
+
+        for a, shelves in enumerate(atlases):
+            shelf = next((s for s in shelves if h <= s[1] and s[2] + w <= max_size), None)
+            if shelf is None and shelves[-1][0] + shelves[-1][1] + h <= max_size:
+                shelf = [shelves[-1][0] + shelves[-1][1], h, 0]
+                shelves.append(shelf)
+            if shelf is not None:
+                break
+        else:
+            a = len(atlases)
+            shelf = [0, h, 0]
+            atlases.append([shelf])
+
+        placements[k] = (a, shelf[2] + padding, shelf[0] + padding)
+        shelf[2] += w
+
+    atlas_sizes = [
+        (
+            _ceil_power_of_two(max(s[2] for s in shelves)),
+            _ceil_power_of_two(shelves[-1][0] + shelves[-1][1]),
+        )
+        for shelves in atlases
+    ]
+    return placements, atlas_sizes
+
+
+def uv_rect(
+    placement: Placement, size: Tuple[int, int], atlas_size: Tuple[int, int]
+) -> List[float]:
+    """
+    Get the rectangle a texture occupies in UV space. Textures are flipped vertically when they
+    are uploaded, so v runs from the bottom of the atlas to its top.
+
+    Parameters
+    ----------
+    placement : Placement
+        Placement of the texture.
+    size : Tuple[int, int]
+        Width and height of the texture.
+    atlas_size : Tuple[int, int]
+        Width and height of the atlas.
+
+    Returns
+    -------
+    List[float]
+        Offset and scale of the texture, [u0, v0, su, sv], i.e., uv' = uv * s + uv0.
+    """
+    _, x, y = placement
+    w, h = size
+    width, height = atlas_size
+    return [x / width, (height - y - h) / height, w / width, h / height]
+
+
+def build_atlas(
+    images: List["Image.Image"],
+    placements: List[Placement],
+    atlas_size: Tuple[int, int],
+    padding: int,
+) -> "Image.Image":
+    """
+    Build an atlas image. The edge pixels of each texture are repeated into its padding.
+
+    Parameters
+    ----------
+    images : List[Image.Image]
+        Textures in the atlas.
+    placements : List[Placement]
+        Placement of each texture.
+    atlas_size : Tuple[int, int]
+        Width and height of the atlas.
+    padding : int
+        Padding around each texture.
+
+    Returns
+    -------
+    Image.Image
+        Atlas image.
+    """
+    import numpy as np
+    from PIL import Image
+
+    atlas = Image.new("RGBA", atlas_size, (0, 0, 0, 255))
+    for img, (_, x, y) in zip(images, placements):
+        tile = np.asarray(img.convert("RGBA"))
+        tile = np.pad(tile, ((padding, padding), (padding, padding), (0, 0)), mode="edge")
+        atlas.paste(Image.fromarray(tile), (x - padding, y - padding))
+    return atlas
+
+
+def load_tile(img_file: Path, options: Dict[str, Any]) -> "Image.Image":
+    """
+    Load a texture that is packed into an atlas, downscaled to the max_size of its texture
+    options. The atlas itself has power-of-two sizes, so power_of_two is ignored.
+
+    Parameters
+    ----------
+    img_file : Path
+        Image file of the texture.
+    options : Dict[str, Any]
+        Texture options, see sihm.textures.texture_options.
+
+    Returns
+    -------
+    Image.Image
+        Texture.
+    """
+    from PIL import Image
+    from sihm.textures import normalize_mode, open_image, target_size
+
+    img = open_image(img_file, options)
+    size = target_size(img.size, {k: v for k, v in options.items() if k == "max_size"})
+    if size != img.size:
+        img = normalize_mode(img).resize(size, Image.LANCZOS)
+    return img
+
+
+def obj_uvs_fit(file: Union[str, Path]) -> bool:
+    """
+    Check whether the texture coordinates of an OBJ file are all in [0, 1]. Texture coordinates
+    outside of it would repeat the texture, which would sample the neighbors of the texture in
+    an atlas instead.
+
+    Parameters
+    ----------
+    file : Union[str, Path]
+        OBJ file.
+
+    Returns
+    -------
+    bool
+        True if all texture coordinates are in [0, 1], False otherwise.
+    """
+    import numpy as np
+    from sihm.mesh import _obj_vertices
+
+    with open(file, "r") as f:
+        uv = _obj_vertices(f.read(), "vt", 2)
+    return bool(np.all((uv >= 0.0) & (uv <= 1.0)))
+
+
+def remap_obj_uvs(text: str, rect: List[float]) -> str:
+    """
+    Remap the texture coordinates of an OBJ file into the rectangle a texture occupies in an
+    atlas.
+
+    Parameters
+    ----------
+    text : str
+        Text of the OBJ file.
+    rect : List[float]
+        Offset and scale of the rectangle, see uv_rect.
+
+    Returns
+    -------
+    str
+        Text of the OBJ file with the remapped texture coordinates.
+    """
+    u0, v0, su, sv = rect
+
+    def remap(m: "re.Match[str]") -> str:
+        u = float(m.group(2)) * su + u0
+        v = float(m.group(3)) * sv + v0
+        return f"{m.group(1)}{u:.9g} {v:.9g}"
+
+    return _OBJ_UV.sub(remap, text)
@@ -0,0 +1,449 @@
+import os
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Union, TYPE_CHECKING
+from pathlib import Path
+
+if TYPE_CHECKING:
+    from sihm.parser import SihmParser
+
+# Build stages of a project, as the name of the phase and the make target that runs it, see
+# CMakeLists.txt in the template project
+_PROFILE_TARGETS = [
+    ("yarn add", "base_yarn_pkg"),
+    ("glslify", "yarn_pkg"),
+    ("webpack", "main_js"),
+    ("make_standalone.py", "all"),
+]
+
+
+def parse_file(
+    cfg: Union[Path, Dict[Any, Any]],
+    file_name: str,
+    cfg_path: Optional[Path] = None,
+    previous_modules: Optional[Dict[str, str]] = None,
+) -> "SihmParser":
+    """
+    Parse the config to create index.js
+
+    Parameters
+    ----------
+    cfg : Union[Path, Dict[Any, Any]]
+        Input config file or config data.
+    file_name : str
+        Output file name.
+    cfg_path : Optional[Path]
+        Directory that relative paths in the config are relative to.
+    previous_modules : Optional[Dict[str, str]]
+        Module signatures of a previous parse into the same project. Unchanged modules are not
+        written again.
+
+    Returns
+    -------
+    SihmParser
+        The parser. Its extra_modules and glslify_files are the extra modules to add to the
+        project and the set of files to transform with glslify.
+    """
+    from sihm.parser import SihmParser
+    from sihm.profile import phase
+
+    with phase("parse"):
+        parser = SihmParser(cfg, file_name, cfg_path=cfg_path, previous_modules=previous_modules)
+        parser.write_file()
+    return parser
+
+
+def _set_cmake_list(cmake_file: Path, name: str, values: Sequence[str]) -> None:
+    """
+    Set a list variable in the CMakeLists file of a project. The file is only written if the
+    variable changed, so CMake does not reconfigure the project needlessly.
+
+    Parameters
+    ----------
+    cmake_file : Path
+        CMakeLists file of the project.
+    name : str
+        Name of the variable, e.g., EXTRA_MODULES.
+    values : Sequence[str]
+        Values of the list.
+    """
+    with open(cmake_file, "r") as f:
+        lines = f.readlines()
+    for k, line in enumerate(lines):
+        if f"set({name}" in line:
+            break
+    new_line = f"set({name} " + '"' + '" "'.join(values) + '")\n'
+    if lines[k] != new_line:
+        lines[k] = new_line
+        with open(cmake_file, "w") as f:
+            f.write("".join(lines))
+
+
+def update_project(
+    cfg: Union[Path, Dict[Any, Any]],
+    directory: Path,
+    cfg_path: Optional[Path] = None,
+    previous_modules: Optional[Dict[str, str]] = None,
+) -> "SihmParser":
+    """
+    Parse the config into a project that make_project already created. Only index.js, the
+    SIHM_EXTRA_* modules that changed, and the lists of extra modules and glslify files in
+    CMakeLists.txt are written, so the rest of the project and its build directory stay up to
+    date.
+
+    Parameters
+    ----------
+    cfg : Union[Path, Dict[Any, Any]]
+        Input config file or config data.
+    directory : Path
+        Directory of the project.
+    cfg_path : Optional[Path]
+        Directory that relative paths in the config are relative to.
+    previous_modules : Optional[Dict[str, str]]
+        Module signatures of a previous build of the same project. Unchanged modules are not
+        written again.
+
+    Returns
+    -------
+    SihmParser
+        The parser used to update the project.
+    """
+    # Create path/file for index.js
+    file_name = os.path.join(directory.resolve(), "src", "index.js")
+
+    # Parse the cfg and create the index.js file
+    parser = parse_file(cfg, file_name, cfg_path=cfg_path, previous_modules=previous_modules)
+
+    # Add the extra modules and the glslify files to process to the CMakeLists file
+    cmake_file = directory.joinpath("CMakeLists.txt").resolve()
+    _set_cmake_list(cmake_file, "EXTRA_MODULES", sorted(parser.extra_modules))
+    _set_cmake_list(cmake_file, "GLSLIFY_FILES", sorted(parser.glslify_files))
+
+    return parser
+
+
+def make_project(
+    cfg: Union[Path, Dict[Any, Any]],
+    directory: Path,
+    cfg_path: Optional[Path] = None,
+    previous_modules: Optional[Dict[str, str]] = None,
+) -> "SihmParser":
+    """
+    Create project that is ready to compile.
+
+    Parameters
+    ----------
+    cfg : Union[Path, Dict[Any, Any]]
+        Input config file or config data.
+    directory : Path
+        Directory where the project should be created.
+    cfg_path : Optional[Path]
+        Directory that relative paths in the config are relative to.
+    previous_modules : Optional[Dict[str, str]]
+        Module signatures of a previous build of the same project. Unchanged modules are not
+        written again.
+
+    Returns
+    -------
+    SihmParser
+        The parser used to create the project.
+    """
+    from shutil import copytree
+    import sihm
+    from sihm.profile import phase
+
+    if not os.path.exists(directory):
+        os.makedirs(directory)
+    sihm_path = Path(sihm.__file__)
+    template_project = os.path.join(sihm_path.parents[0], "template_project")
+    with phase("copy template"):
+        copytree(template_project, directory.resolve(), dirs_exist_ok=True)
+
+    return update_project(cfg, directory, cfg_path=cfg_path, previous_modules=previous_modules)
+
+
+def compile_project(
+    directory: Path, html_file: Path, jobs: int = 1, node_workspace: Optional[Path] = None
+) -> None:
+    """
+    Compile a project created by make_project into a standalone HTML file.
+
+    Parameters
+    ----------
+    directory : Path
+        Directory of the project.
+    html_file : Path
+        Location of the final HTML file.
+    jobs : int
+        Number of cores to use when building the project.
+    node_workspace : Optional[Path]
+        Node workspace, see sihm.workspace.node_workspace, whose node modules the project
+        should use. If None, the node modules are installed in the project.
+    """
+    import subprocess
+    from shutil import copyfile
+    from sihm.profile import phase, profiling
+
+    cmake_args = ""
+    if node_workspace is not None:
+        cmake_args = f' -DSIHM_NODE_WORKSPACE="{Path(node_workspace).resolve().as_posix()}"'
+
+    # Compile the project. If the project was compiled before, the build directory is reused,
+    # so only the parts of the project that changed are rebuilt. The working directory is
+    # passed to each command rather than changed, so several projects can be compiled at once.
+    build_dir = Path(directory).resolve().joinpath("build")
+    os.makedirs(build_dir, exist_ok=True)
+    with phase("cmake"):
+        if os.name == "nt":
+            # Using windows
+            subprocess.run(
+                'cmake .. -G "MinGW Makefiles"' + cmake_args,
+                shell=True,
+                check=True,
+                cwd=build_dir,
+            )
+        else:
+            subprocess.run("cmake .." + cmake_args, shell=True, check=True, cwd=build_dir)
+
+    # When profiling, the targets are made one at a time, so each stage is timed on its own.
+    # Each target depends on the previous one, so this does the same work as make all.
+    if profiling():
+        for name, target in _PROFILE_TARGETS:
+            with phase(name):
+                subprocess.run(f"make {target} -j {jobs}", shell=True, check=True, cwd=build_dir)
+    else:
+        subprocess.run(f"make all -j {jobs}", shell=True, check=True, cwd=build_dir)
+
+    # Copy the file to its final location
+    copyfile(build_dir.joinpath("dist", "index.html"), html_file)
+
+
+def build_html(
+    cfg: Union[Path, Dict[Any, Any]],
+    html_file: Path,
+    jobs: int = 1,
+    cfg_path: Optional[Path] = None,
+    workspace: bool = True,
+    prebuilt: bool = True,
+) -> "SihmParser":
+    """
+    Create the standalone HTML file. The associated project is created in a temporary directory.
+
+    Parameters
+    ----------
+    cfg : Union[Path, Dict[Any, Any]]
+        Input config file or config data.
+    html_file : Path
+        Location of the final HTML file.
+    jobs : int
+        Number of cores to use when building the project.
+    cfg_path : Optional[Path]
+        Directory that relative paths in the config are relative to.
+    workspace : bool
+        Whether to use a persistent node workspace, see sihm.workspace.node_workspace, rather
+        than installing the node modules in the temporary project.
+    prebuilt : bool
+        Whether to link the scene against the prebuilt runtime, see sihm.link, when the project
+        needs no extra modules or glslify. This skips node and webpack entirely.
+
+    Returns
+    -------
+    SihmParser
+        The parser used to create the project, e.g., for its size manifest.
+    """
+    import tempfile
+    from sihm.link import can_link, link_html
+    from sihm.profile import phase
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        project_dir = Path(temp_dir)
+        parser = make_project(cfg, project_dir, cfg_path=cfg_path)
+
+        if prebuilt and can_link(parser.extra_modules, parser.glslify_files):
+            with phase("link"):
+                link_html(project_dir, Path(html_file).resolve())
+            return parser
+
+        node_workspace = None
+        if workspace:
+            from sihm.workspace import node_workspace as get_node_workspace
+
+            node_workspace = get_node_workspace(parser.extra_modules)
+
+        compile_project(
+            project_dir, Path(html_file).resolve(), jobs=jobs, node_workspace=node_workspace
+        )
+    return parser
+
+
+def _make_project_modules(
+    cfg: Union[Path, Dict[Any, Any]], directory: Path, cfg_path: Optional[Path] = None
+) -> Tuple[List[str], List[str]]:
+    """
+    Create a project in a worker process. The parser cannot be sent back to the main process,
+    so only the extra modules and glslify files of the project are returned.
+
+    Parameters
+    ----------
+    cfg : Union[Path, Dict[Any, Any]]
+        Input config file or config data.
+    directory : Path
+        Directory where the project should be created.
+    cfg_path : Optional[Path]
+        Directory that relative paths in the config are relative to.
+
+    Returns
+    -------
+    Tuple[List[str], List[str]]
+        Extra modules the project needs and the files to transform with glslify.
+    """
+    parser = make_project(cfg, directory, cfg_path=cfg_path)
+    return sorted(parser.extra_modules), sorted(parser.glslify_files)
+
+
+def make_projects(
+    cfgs: Sequence[Union[Path, Dict[Any, Any]]],
+    directories: Sequence[Path],
+    jobs: int = 1,
+    cfg_path: Optional[Path] = None,
+) -> List[Tuple[Union[Path, Dict[Any, Any]], Union[Tuple[List[str], List[str]], Exception]]]:
+    """
+    Create several projects, parsing up to jobs configs at once in a process pool.
+
+    Parameters
+    ----------
+    cfgs : Sequence[Union[Path, Dict[Any, Any]]]
+        Input config files or config data.
+    directories : Sequence[Path]
+        Directory where the project of each config should be created.
+    jobs : int
+        Number of configs to parse at once.
+    cfg_path : Optional[Path]
+        Directory that relative paths in the configs are relative to.
+
+    Returns
+    -------
+    List[Tuple[Union[Path, Dict[Any, Any]], Union[Tuple[List[str], List[str]], Exception]]]
+        Each config with the extra modules and glslify files of its project, or the error
+        raised while creating its project. An error in one config does not stop the others.
+    """
+    from concurrent.futures import ProcessPoolExecutor
+
+    if len(cfgs) != len(directories):
+        raise ValueError(f"Got {len(cfgs)} configs, but {len(directories)} project directories.")
+
+    workers = min(jobs, len(cfgs))
+    results = []
+    if workers <= 1:
+        for cfg, directory in zip(cfgs, directories):
+            try:
+                results.append((cfg, _make_project_modules(cfg, directory, cfg_path)))
+            except Exception as e:
+                results.append((cfg, e))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [
+                executor.submit(_make_project_modules, cfg, directory, cfg_path)
+                for cfg, directory in zip(cfgs, directories)
+            ]
+            for cfg, future in zip(cfgs, futures):
+                try:
+                    results.append((cfg, future.result()))
+                except Exception as e:
+                    results.append((cfg, e))
+    return results
+
+
+def build_html_batch(
+    cfgs: Sequence[Union[Path, Dict[Any, Any]]],
+    html_files: Sequence[Path],
+    jobs: int = 1,
+    cfg_path: Optional[Path] = None,
+    workspace: bool = True,
+    prebuilt: bool = True,
+) -> None:
+    """
+    Create the standalone HTML files of several configs.
+
+    The configs are parsed in a process pool, and each distinct set of extra modules gets one
+    node workspace that all projects using it share. The jobs budget is split across the
+    projects, e.g., with jobs=8, four projects are compiled at once with two cores each, so
+    the total build time scales with the number of cores rather than the number of configs.
+
+    Parameters
+    ----------
+    cfgs : Sequence[Union[Path, Dict[Any, Any]]]
+        Input config files or config data.
+    html_files : Sequence[Path]
+        Location of the final HTML file of each config.
+    jobs : int
+        Total number of cores to use.
+    cfg_path : Optional[Path]
+        Directory that relative paths in the configs are relative to.
+    workspace : bool
+        Whether to use persistent node workspaces, see sihm.workspace.node_workspace, rather
+        than installing the node modules in every temporary project.
+    prebuilt : bool
+        Whether to link scenes that need no extra modules or glslify against the prebuilt
+        runtime, see sihm.link, rather than compiling them.
+
+    Raises
+    ------
+    RuntimeError
+        If any of the configs failed to build. The others are still built.
+    """
+    import tempfile
+    from concurrent.futures import ThreadPoolExecutor
+    from sihm.link import can_link, link_html
+
+    if len(cfgs) != len(html_files):
+        raise ValueError(f"Got {len(cfgs)} configs, but {len(html_files)} HTML files.")
+
+    failed = 0
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        directories = [Path(temp_dir).joinpath(str(k)) for k in range(len(cfgs))]
+        results = make_projects(cfgs, directories, jobs=jobs, cfg_path=cfg_path)
+
+        # Install each distinct set of extra modules once, before any project is compiled
+        builds = []
+        workspaces: Dict[Tuple[str, ...], Optional[Path]] = {}
+        for (cfg, result), directory, html_file in zip(results, directories, html_files):
+            if isinstance(result, Exception):
+                print(f"ERROR: Failed to parse {cfg}: {result}")
+                failed += 1
+                continue
+            modules, glslify_files = tuple(result[0]), result[1]
+            if prebuilt and can_link(modules, glslify_files):
+                builds.append((cfg, directory, Path(html_file).resolve(), None, True))
+                continue
+            if modules not in workspaces:
+                workspaces[modules] = None
+                if workspace:
+                    from sihm.workspace import node_workspace
+
+                    workspaces[modules] = node_workspace(modules)
+            builds.append((cfg, directory, Path(html_file).resolve(), workspaces[modules], False))
+
+        # Split the jobs between the projects that are compiled at once
+        workers = max(1, min(jobs, len(builds)))
+        jobs_per_build = max(1, jobs // workers)
+
+        def compile_one(build):
+            cfg, directory, html_file, node_workspace, link = build
+            if link:
+                link_html(directory, html_file)
+                return
+            compile_project(
+                directory, html_file, jobs=jobs_per_build, node_workspace=node_workspace
+            )
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(compile_one, build) for build in builds]
+            for build, future in zip(builds, futures):
+                try:
+                    future.result()
+                except Exception as e:
+                    print(f"ERROR: Failed to compile {build[0]}: {e}")
+                    failed += 1
+
+    if failed:
+        raise RuntimeError(f"{failed} of {len(cfgs)} configs failed to build.")
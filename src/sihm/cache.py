@@ -0,0 +1,200 @@
+import os
+import hashlib
+from contextlib import contextmanager
+from pathlib import Path
+from shutil import copyfileobj
+from typing import Iterator, Optional, TextIO, Union
+
+# Default maximum size of the asset cache in MB.
+DEFAULT_MAX_SIZE = 1024
+
+
+def default_cache_dir() -> Path:
+    """
+    Get the default directory sihm uses for caching. This is $SIHM_CACHE_DIR if it is set,
+    otherwise $XDG_CACHE_HOME/sihm, falling back to ~/.cache/sihm.
+
+    Returns
+    -------
+    Path
+        Cache directory.
+    """
+    if cache_dir := os.environ.get("SIHM_CACHE_DIR", None):
+        return Path(cache_dir)
+    cache_home = os.environ.get("XDG_CACHE_HOME", None)
+    if cache_home is None:
+        cache_home = os.path.join(Path.home(), ".cache")
+    return Path(cache_home).joinpath("sihm")
+
+
+class TeeWriter:
+    """
+    Minimal writable file that writes everything it is given to two files.
+    """
+
+    def __init__(self, f1: TextIO, f2: TextIO) -> None:
+        """
+        Initialize the writer.
+
+        Parameters
+        ----------
+        f1 : TextIO
+            First file to write to.
+        f2 : TextIO
+            Second file to write to.
+        """
+        self._f1 = f1
+        self._f2 = f2
+
+    def write(self, text: str) -> None:
+        """
+        Write text to both files.
+
+        Parameters
+        ----------
+        text : str
+            Text to write.
+        """
+        self._f1.write(text)
+        self._f2.write(text)
+
+
+class AssetCache:
+    """
+    On-disk cache of encoded assets, e.g., the base64 text embedded in the SIHM_EXTRA_FILE_*
+    and SIHM_EXTRA_TEXTURE_* modules. Entries are keyed on a hash of the content they were
+    created from, and the least recently used entries are evicted once the cache grows past
+    its maximum size. Entries are written atomically, so the cache can be shared by several
+    sihm processes.
+    """
+
+    def __init__(
+        self, directory: Union[None, str, Path] = None, max_size: float = DEFAULT_MAX_SIZE
+    ) -> None:
+        """
+        Initialize the cache.
+
+        Parameters
+        ----------
+        directory : Union[None, str, Path]
+            Directory of the cache. Defaults to the assets directory in default_cache_dir().
+        max_size : float
+            Maximum size of the cache in MB.
+        """
+        if directory is None:
+            directory = default_cache_dir().joinpath("assets")
+        self._dir = Path(directory)
+        self._dir.mkdir(parents=True, exist_ok=True)
+        self._max_size = int(max_size * 2**20)
+        self._size: Optional[int] = None
+
+    @staticmethod
+    def hash(*items: Union[str, bytes, Path]) -> str:
+        """
+        Create a cache key from strings, bytes, and the content of files.
+
+        Parameters
+        ----------
+        *items : Union[str, bytes, Path]
+            Items to hash. Paths are hashed by their content.
+
+        Returns
+        -------
+        str
+            Cache key.
+        """
+        h = hashlib.sha256()
+        for item in items:
+            if isinstance(item, Path):
+                with open(item, "rb") as f:
+                    while chunk := f.read(2**20):
+                        h.update(chunk)
+            elif isinstance(item, str):
+                h.update(item.encode("utf-8"))
+            else:
+                h.update(item)
+            # Separate items so different splits of the same data give different keys
+            h.update(b"\0")
+        return h.hexdigest()
+
+    def read(self, key: str, f: TextIO) -> bool:
+        """
+        Copy a cache entry into a file.
+
+        Parameters
+        ----------
+        key : str
+            Cache key.
+        f : TextIO
+            File to copy the entry into.
+
+        Returns
+        -------
+        bool
+            True if the entry was in the cache, False otherwise.
+        """
+        entry = self._dir.joinpath(key)
+        try:
+            with open(entry, "r", encoding="utf-8") as cached:
+                # Mark the entry as recently used
+                os.utime(entry)
+                copyfileobj(cached, f)
+        except FileNotFoundError:
+            return False
+        return True
+
+    @contextmanager
+    def writer(self, key: str) -> Iterator[TextIO]:
+        """
+        Context manager that creates a cache entry from the text written to the file it yields.
+        The entry is only added to the cache if the context exits without an error.
+
+        Parameters
+        ----------
+        key : str
+            Cache key.
+
+        Yields
+        ------
+        TextIO
+            File to write the entry to.
+        """
+        import tempfile
+
+        fd, tmp = tempfile.mkstemp(dir=self._dir, prefix=".tmp_")
+        try:
+            with open(fd, "w", encoding="utf-8") as f:
+                yield f
+            os.replace(tmp, self._dir.joinpath(key))
+        except BaseException:
+            os.remove(tmp)
+            raise
+
+        if self._size is not None:
+            self._size += os.path.getsize(self._dir.joinpath(key))
+        self._evict()
+
+    def _evict(self) -> None:
+        """
+        Remove the least recently used entries until the cache fits within its maximum size.
+        """
+        if self._size is not None and self._size <= self._max_size:
+            return
+
+        entries = []
+        for entry in os.scandir(self._dir):
+            if entry.is_file() and not entry.name.startswith(".tmp_"):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        self._size = sum(x[1] for x in entries)
+
+        entries.sort()
+        for _, size, path in entries:
+            if self._size <= self._max_size:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                # Another process got to it first
+                pass
+            self._size -= size
@@ -0,0 +1,103 @@
+import zlib
+from base64 import b64encode
+from typing import Any, Dict, Optional, TextIO, Union
+
+# Default options of the compress option in the SIHM section
+DEFAULT_COMPRESS_OPTIONS = {"min_size": 4096, "level": 9}
+
+
+def compress_options(options: Any) -> Optional[Dict[str, int]]:
+    """
+    Validate the compress option of the SIHM section. The options are:
+
+    * min_size: Assets smaller than this many bytes are embedded as they are, since the
+      decompression is not worth it for them.
+    * level: zlib compression level, from 1 (fastest) to 9 (smallest).
+
+    Parameters
+    ----------
+    options : Any
+        True to use the default options, a dictionary of options, or False to disable
+        compression.
+
+    Returns
+    -------
+    Optional[Dict[str, int]]
+        Validated options, or None if compression is disabled.
+    """
+    if isinstance(options, bool) or options is None:
+        return dict(DEFAULT_COMPRESS_OPTIONS) if options else None
+    if not isinstance(options, dict):
+        raise ValueError(f"Got compress {options}, but expected a bool or a dictionary.")
+
+    result = dict(DEFAULT_COMPRESS_OPTIONS)
+    for k, v in options.items():
+        if k not in DEFAULT_COMPRESS_OPTIONS:
+            raise ValueError(
+                f"Unknown compress option {k}. Expected one of "
+                + ", ".join(DEFAULT_COMPRESS_OPTIONS)
+                + "."
+            )
+        if not isinstance(v, int) or isinstance(v, bool) or v < 0:
+            raise ValueError(f"Got compress option {k} {v}, but expected an integer.")
+        result[k] = v
+    if not 1 <= result["level"] <= 9:
+        raise ValueError(f"Got compress level {result['level']}, but expected 1 to 9.")
+    return result
+
+
+class Base64Deflater:
+    """
+    File-like object that deflates everything written to it, and writes the result to another
+    file as base64. The data is compressed as it is written, so neither it nor its compressed
+    copy has to be held in memory all at once. The output is in the zlib format, which the
+    browser's DecompressionStream decodes as "deflate".
+    """
+
+    def __init__(self, f: TextIO, level: int) -> None:
+        """
+        Initialize the deflater.
+
+        Parameters
+        ----------
+        f : TextIO
+            File to write the base64 encoded, compressed data to.
+        level : int
+            zlib compression level.
+        """
+        self._f = f
+        self._z = zlib.compressobj(level)
+
+        # Compressed bytes that are not written yet. Only multiples of three bytes are encoded,
+        # so the base64 chunks can be concatenated.
+        self._pending = b""
+
+    def write(self, data: Union[str, bytes]) -> int:
+        """
+        Compress data. Text is encoded as UTF-8.
+
+        Parameters
+        ----------
+        data : Union[str, bytes]
+            Data to compress.
+
+        Returns
+        -------
+        int
+            Length of the data.
+        """
+        raw = data.encode("utf-8") if isinstance(data, str) else data
+        self._pending += self._z.compress(raw)
+        n = len(self._pending) - len(self._pending) % 3
+        if n:
+            self._f.write(b64encode(self._pending[:n]).decode("ascii"))
+            self._pending = self._pending[n:]
+        return len(data)
+
+    def close(self) -> None:
+        """
+        Flush the compressor and write the remaining data.
+        """
+        self._pending += self._z.flush()
+        self._f.write(b64encode(self._pending).decode("ascii"))
+        self._pending = b""
@@ -0,0 +1,224 @@
+import re
+from pathlib import Path
+from shutil import copyfileobj
+from typing import Iterable, List, Optional, TextIO
+
+# Import specifiers the prebuilt runtime provides. These must match the keys of SIHM.modules
+# in runtime.ts.
+RUNTIME_MODULES = frozenset(
+    [
+        "three",
+        "three/examples/jsm/controls/OrbitControls",
+        "three/examples/jsm/loaders/OBJLoader",
+        "three/examples/jsm/loaders/MTLLoader",
+        "./animator",
+        "./atlas",
+        "./camera",
+        "./decode",
+        "./gui",
+        "./instancing",
+        "./loader",
+        "./mesh",
+    ]
+)
+
+_IMPORT = re.compile(r"""^\s*import\s+(?P<what>.+?)\s+from\s+(['"])(?P<spec>.+?)\2\s*;?\s*$""")
+_EXPORT = re.compile(r"^export\s+(?:const|let|var|function|class)\s+(?P<name>\w+)")
+
+# Whether can_link has warned that the prebuilt runtime is not installed.
+_warned_missing_runtime = False
+
+
+def runtime_bundle() -> Optional[Path]:
+    """
+    Get the prebuilt runtime bundle. This is built by the runtime target of utils/Makefile.
+
+    Returns
+    -------
+    Optional[Path]
+        Location of the bundle, or None if sihm was installed without it.
+    """
+    bundle = Path(__file__).parent.joinpath("prebuilt", "sihm_runtime.min.js")
+    if bundle.exists():
+        return bundle
+    return None
+
+
+def can_link(extra_modules: Iterable[str], glslify_files: Iterable[str]) -> bool:
+    """
+    Check whether a project can be linked against the prebuilt runtime rather than compiled
+    with webpack. This is the case if the runtime bundle is installed and the project needs no
+    extra node modules and no glslify transforms. If it cannot, the reason is printed.
+
+    Parameters
+    ----------
+    extra_modules : Iterable[str]
+        Extra modules the project needs.
+    glslify_files : Iterable[str]
+        Files of the project to transform with glslify.
+
+    Returns
+    -------
+    bool
+        True if the project can be linked, False otherwise.
+    """
+    global _warned_missing_runtime
+
+    extra_modules = sorted(m for m in extra_modules if m)
+    if extra_modules:
+        print(
+            "Compiling with webpack rather than linking against the prebuilt runtime, since the "
+            f"project needs the extra modules {', '.join(extra_modules)}."
+        )
+        return False
+    if any(glslify_files):
+        print(
+            "Compiling with webpack rather than linking against the prebuilt runtime, since the "
+            "project has shaders to transform with glslify."
+        )
+        return False
+    if runtime_bundle() is None:
+        # Only installs from a wheel have the runtime bundle, so only warn once per process
+        if not _warned_missing_runtime:
+            print(
+                "WARNING: The prebuilt runtime is not installed, so scenes are compiled with "
+                "webpack. Build it with 'make runtime' in the utils directory to link scenes "
+                "against it."
+            )
+            _warned_missing_runtime = True
+        return False
+    return True
+
+
+def _import_to_const(what: str, spec: str) -> str:
+    """
+    Turn an import of a runtime module into a lookup in SIHM.modules.
+
+    Parameters
+    ----------
+    what : str
+        Imported bindings, e.g., "* as THREE" or "{ OBJLoader }".
+    spec : str
+        Import specifier.
+
+    Returns
+    -------
+    str
+        Equivalent const declaration.
+    """
+    if spec not in RUNTIME_MODULES:
+        raise ValueError(f"The prebuilt runtime does not provide '{spec}'.")
+
+    module = f'SIHM.modules["{spec}"]'
+    if what.startswith("*"):
+        return f"const {what.split(' as ')[-1].strip()} = {module};\n"
+    elif what.startswith("{"):
+        names = [re.sub(r"\s+as\s+", ": ", n.strip()) for n in what.strip("{} ").split(",")]
+        return "const { " + ", ".join(n for n in names if n) + " } = " + module + ";\n"
+    else:
+        return f"const {what} = {module}.default;\n"
+
+
+def _link_module(src_dir: Path, name: str, f: TextIO) -> None:
+    """
+    Inline a SIHM_EXTRA_* module. The module is wrapped in a function, so its imports and
+    helper variables do not clash with those of other modules.
+
+    Parameters
+    ----------
+    src_dir : Path
+        Source directory of the project.
+    name : str
+        Name of the module.
+    f : TextIO
+        File to write the module to.
+    """
+    module_file = src_dir.joinpath(name + ".js")
+    if not module_file.exists():
+        raise ValueError(f"Could not find module '{name}' in {src_dir}.")
+
+    exports: List[str] = []
+    lines: List[str] = []
+    is_async = False
+    with open(module_file, "r", encoding="utf8") as module:
+        # Modules start with their imports and helpers and end with a single export, which
+        # holds the, possibly large, asset. Only the lines up to the export are rewritten.
+        while line := module.readline():
+            if m := _IMPORT.match(line):
+                # Compressed assets await their decompression at the top level of the module
+                if m.group("spec") == "./decode" and "decompress" in m.group("what"):
+                    is_async = True
+                lines.append(_import_to_const(m.group("what"), m.group("spec")))
+            elif m := _EXPORT.match(line):
+                exports.append(m.group("name"))
+                lines.append(line[len("export ") :])
+                break
+            else:
+                lines.append(line)
+
+        if is_async:
+            f.write("const { " + name + " } = await (async () => {\n")
+        else:
+            f.write("const { " + name + " } = (() => {\n")
+        f.writelines(lines)
+        copyfileobj(module, f)
+    f.write("\nreturn { " + ", ".join(exports) + " };\n})();\n")
+
+
+def link_scene(src_dir: Path, f: TextIO) -> None:
+    """
+    Link the index.js of a project against the prebuilt runtime. Imports of runtime modules
+    become lookups in the SIHM global, and the SIHM_EXTRA_* modules are inlined.
+
+    Parameters
+    ----------
+    src_dir : Path
+        Source directory of the project.
+    f : TextIO
+        File to write the linked scene to.
+    """
+    # The scene is async, so it can await compressed assets. It still runs synchronously up to
+    # the first of them.
+    f.write("(async () => {\n")
+    with open(src_dir.joinpath("index.js"), "r", encoding="utf8") as index:
+        for line in index:
+            if m := _IMPORT.match(line):
+                spec = m.group("spec")
+                if spec.startswith("./") and spec not in RUNTIME_MODULES:
+                    _link_module(src_dir, spec[2:], f)
+                else:
+                    f.write(_import_to_const(m.group("what"), spec))
+            else:
+                f.write(line)
+    f.write("\n})();\n")
+
+
+def link_html(directory: Path, html_file: Path) -> None:
+    """
+    Create the standalone HTML file of a project from the prebuilt runtime, without webpack.
+    Like dist/make_standalone.py, this splices the scripts into html_dependent_on_java.html.
+
+    Parameters
+    ----------
+    directory : Path
+        Directory of the project.
+    html_file : Path
+        Location of the final HTML file.
+    """
+    bundle = runtime_bundle()
+    if bundle is None:
+        raise ValueError("The prebuilt runtime is not installed.")
+
+    directory = Path(directory)
+    with open(directory.joinpath("dist", "html_dependent_on_java.html"), "r") as f:
+        text = f.read()
+    ind1 = text.find("<script") + 7
+    ind2 = text.find("</script>")
+
+    with open(html_file, "w", encoding="utf8") as index:
+        index.write(text[0:ind1] + ">")
+        with open(bundle, "r", encoding="utf8") as runtime:
+            copyfileobj(runtime, index)
+        index.write("\n")
+        link_scene(directory.joinpath("src"), index)
+        index.write(text[ind2:])
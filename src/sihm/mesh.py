@@ -0,0 +1,473 @@
+import json
+import re
+from base64 import b64encode
+from pathlib import Path
+from typing import Any, Dict, List, Optional, TextIO, Tuple, Union
+import numpy as np
+from numpy.typing import NDArray
+
+# Encodings of OBJ geometries. text embeds the OBJ file, which the OBJ loader parses at page
+# load. quantized embeds the welded and quantized mesh, which is loaded straight into a
+# BufferGeometry.
+MESH_ENCODINGS = ("text", "quantized")
+
+
+# Kinds of OBJ statements read_obj uses, and the patterns that match the rest of their lines.
+# Each pattern is matched across the whole file at once, rather than line by line.
+_OBJ_KINDS = re.compile(r"^[ \t]*(vn|vt|v|f|usemtl|l|p)[ \t]", re.M)
+_OBJ_STATEMENTS = {
+    k: re.compile(rf"^[ \t]*{k}[ \t]([^\r\n]*)", re.M) for k in ("v", "vt", "vn", "f", "usemtl")
+}
+
+# Empty fields of v/vt/vn corners, e.g., the texture coordinate of 1//1
+_OBJ_EMPTY_FIELD = re.compile(r"/(?=/|\s|$)")
+
+
+def _obj_index(ind: NDArray[Any], counts: NDArray[Any]) -> NDArray[Any]:
+    """
+    Convert OBJ indices to zero-based indices. OBJ indices are one-based, and negative indices
+    are relative to the number of elements defined before the face. Missing indices are
+    returned as -1.
+
+    Parameters
+    ----------
+    ind : NDArray[Any]
+        Indices as written in the OBJ file, with 0 for missing indices.
+    counts : NDArray[Any]
+        Number of elements defined before the face of each index.
+
+    Returns
+    -------
+    NDArray[Any]
+        Zero-based indices.
+    """
+    return np.where(ind > 0, ind - 1, np.where(ind < 0, counts + ind, -1))
+
+
+def _obj_vertices(text: str, kind: str, size: int) -> NDArray[Any]:
+    """
+    Read the vertex data of one kind from the text of an OBJ file. Any values after the first
+    size values of a statement, e.g., the w of a position, are ignored.
+
+    Parameters
+    ----------
+    text : str
+        Text of the OBJ file.
+    kind : str
+        v, vt, or vn.
+    size : int
+        Number of values to read per statement.
+
+    Returns
+    -------
+    NDArray[Any]
+        (N, size) array of values.
+    """
+    lines = _OBJ_STATEMENTS[kind].findall(text)
+    if not lines:
+        return np.zeros((0, size))
+    return np.loadtxt(lines, dtype=np.float64, usecols=range(size), ndmin=2)
+
+
+def _obj_corners(faces: List[str]) -> Tuple[NDArray[Any], NDArray[Any]]:
+    """
+    Split the v/vt/vn corners of OBJ faces.
+
+    Parameters
+    ----------
+    faces : List[str]
+        Rest of the line of each f statement.
+
+    Returns
+    -------
+    Tuple[NDArray[Any], NDArray[Any]]
+        (F,) array of the number of corners of each face, and (C, 3) array of the v, vt, and
+        vn index of each corner as written in the OBJ file, with 0 for missing indices.
+    """
+    sizes = np.fromiter(map(len, map(str.split, faces)), dtype=np.int64, count=len(faces))
+    n = int(sizes.sum())
+    if n == 0:
+        return sizes, np.zeros((0, 3), dtype=np.int64)
+
+    # Join the corners with single spaces, and fill empty fields with 0, so every slash is
+    # followed by an index
+    text = _OBJ_EMPTY_FIELD.sub("/0", " ".join(" ".join(faces).split()))
+
+    # Count the fields of every corner from the slashes between the spaces that separate them
+    chars = np.frombuffer(text.encode("utf-8"), dtype=np.uint8)
+    corner = np.cumsum(chars == ord(" "))
+    fields = 1 + np.bincount(corner[chars == ord("/")], minlength=n)
+    if fields.size != n or np.any(fields > 3):
+        raise ValueError("Expected faces of v, v/vt, v/vt/vn, or v//vn corners.")
+
+    values = np.loadtxt([text.replace("/", " ")], dtype=np.int64, ndmin=1)
+    if values.size != fields.sum():
+        raise ValueError("Expected faces of v, v/vt, v/vt/vn, or v//vn corners.")
+    ind = np.zeros((n, 3), dtype=np.int64)
+    start = np.cumsum(fields) - fields
+    ind[np.repeat(np.arange(n), fields), np.arange(values.size) - np.repeat(start, fields)] = values
+    return sizes, ind
+
+
+def read_obj(file: Union[str, Path]) -> Dict[str, Any]:
+    """
+    Read the triangles of an OBJ file. Polygons are triangulated as fans, and the triangles
+    are sorted by material. Lines and points are ignored.
+
+    The statements of the file are matched in bulk, and their values are converted and indexed
+    with NumPy, so there is no Python loop over the vertices or faces.
+
+    Parameters
+    ----------
+    file : Union[str, Path]
+        OBJ file.
+
+    Returns
+    -------
+    Dict[str, Any]
+        Corners of the triangles, i.e., three per triangle:
+
+        * position: (C, 3) positions.
+        * normal: (C, 3) normals. Corners without a normal get the normal of their triangle.
+        * uv: (C, 2) texture coordinates, or None if the file has none.
+        * groups: (start, count, material) of each run of corners that use the same material.
+    """
+    with open(file, "r") as f:
+        text = f.read()
+
+    # Kind of every statement, in order, so faces can be matched with the vertices defined
+    # before them and the material they use
+    kinds = np.array(_OBJ_KINDS.findall(text), dtype="<U6")
+    is_face = kinds == "f"
+    ignored = int(np.count_nonzero((kinds == "l") | (kinds == "p")))
+    if ignored:
+        print(f"WARNING: Ignoring {ignored} lines and points in {file}.")
+
+    try:
+        positions = _obj_vertices(text, "v", 3)
+        uvs = _obj_vertices(text, "vt", 2) if np.any(kinds == "vt") else None
+        normals = _obj_vertices(text, "vn", 3) if np.any(kinds == "vn") else None
+        sizes, ind = _obj_corners(_OBJ_STATEMENTS["f"].findall(text))
+    except ValueError as e:
+        raise ValueError(f"Could not read {file}. {e}")
+
+    # Number of each kind of vertex defined before every face
+    face_counts = np.stack(
+        [np.cumsum(kinds == k)[is_face] for k in ("v", "vt", "vn")], axis=-1
+    ).astype(np.int64)
+
+    # Material of every face, where the faces before the first usemtl get the default material
+    materials: List[str] = [""]
+    usemtl = [0]
+    for name in _OBJ_STATEMENTS["usemtl"].findall(text):
+        name = " ".join(name.split())
+        if name not in materials:
+            materials.append(name)
+        usemtl.append(materials.index(name))
+    face_mats = np.array(usemtl, dtype=np.int64)[np.cumsum(kinds == "usemtl")[is_face]]
+
+    # Triangulate the faces as fans: triangle k of a face uses its corners 0, k + 1, and k + 2
+    n_tris = np.maximum(sizes - 2, 0)
+    if not n_tris.any():
+        raise ValueError(f"{file} does not contain any faces.")
+    tri_face = np.repeat(np.arange(sizes.size), n_tris)
+    k = np.arange(tri_face.size) - np.repeat(np.cumsum(n_tris) - n_tris, n_tris)
+    first = (np.cumsum(sizes) - sizes)[tri_face]
+    corner = np.stack([first, first + k + 1, first + k + 2], axis=-1).reshape(-1)
+    counts = face_counts[np.repeat(tri_face, 3)]
+    vi = _obj_index(ind[corner, 0], counts[:, 0])
+    ti = _obj_index(ind[corner, 1], counts[:, 1])
+    ni = _obj_index(ind[corner, 2], counts[:, 2])
+
+    # Sort the triangles by material, keeping their order otherwise
+    tri_mats_arr = face_mats[tri_face]
+    order = np.argsort(tri_mats_arr, kind="stable")
+    corner_order = (3 * order[:, None] + np.arange(3)).reshape(-1)
+    vi, ti, ni = vi[corner_order], ti[corner_order], ni[corner_order]
+    tri_mats_arr = tri_mats_arr[order]
+
+    position = positions[vi]
+
+    uv = None
+    if uvs is not None and (ti >= 0).any():
+        uv = np.where((ti >= 0)[:, None], uvs[np.maximum(ti, 0)], 0.0)
+
+    # Corners without a normal get the normal of their triangle, which is what the OBJ loader
+    # does for files without normals
+    tri = position.reshape(-1, 3, 3)
+    face_normal = np.cross(tri[:, 1] - tri[:, 0], tri[:, 2] - tri[:, 0])
+    norm = np.linalg.norm(face_normal, axis=1, keepdims=True)
+    face_normal = np.repeat(face_normal / np.where(norm > 0, norm, 1.0), 3, axis=0)
+    if normals is not None and (ni >= 0).any():
+        normal = np.where((ni >= 0)[:, None], normals[np.maximum(ni, 0)], face_normal)
+    else:
+        normal = face_normal
+
+    groups = []
+    for m in np.unique(tri_mats_arr):
+        tris = np.nonzero(tri_mats_arr == m)[0]
+        groups.append((3 * int(tris[0]), 3 * tris.size, materials[m]))
+
+    return {"position": position, "normal": normal, "uv": uv, "groups": groups}
+
+
+def _quantize(x: NDArray[Any]) -> Tuple[NDArray[Any], List[float], List[float]]:
+    """
+    Quantize data to 16 bits per component, using the bounds of each component.
+
+    Parameters
+    ----------
+    x : NDArray[Any]
+        (N, D) data.
+
+    Returns
+    -------
+    Tuple[NDArray[Any], List[float], List[float]]
+        Quantized data, and the offset and scale that decode it, i.e., x = q * scale + offset.
+    """
+    lo = x.min(axis=0)
+    extent = x.max(axis=0) - lo
+    scale = np.where(extent > 0, extent / 65535, 1.0)
+    q = np.rint((x - lo) / scale).astype(np.uint16)
+    return q, lo.tolist(), scale.tolist()
+
+
+def _cluster_triangles(
+    position: NDArray[Any], tri_mats: NDArray[Any], resolution: int
+) -> Tuple[NDArray[Any], NDArray[Any]]:
+    """
+    Cluster the corners of triangles on a uniform grid, and find the triangles that survive
+    when the corners of each cell are merged into one vertex.
+
+    Parameters
+    ----------
+    position : NDArray[Any]
+        (C, 3) positions of the corners, three per triangle.
+    tri_mats : NDArray[Any]
+        (C / 3,) material of each triangle.
+    resolution : int
+        Number of cells along the longest side of the bounding box.
+
+    Returns
+    -------
+    Tuple[NDArray[Any], NDArray[Any]]
+        Cell of each corner, and the sorted indices of the triangles that survive, i.e., those
+        whose corners are in three different cells. Of the triangles that share their cells and
+        material, only the first one survives.
+    """
+    lo = position.min(axis=0)
+    extent = max(float(np.max(position.max(axis=0) - lo)), 1e-12)
+    cells = np.minimum(np.floor((position - lo) * (resolution / extent)), resolution - 1)
+    cells = cells.astype(np.int64)
+    _, cell = np.unique(
+        (cells[:, 0] * resolution + cells[:, 1]) * resolution + cells[:, 2], return_inverse=True
+    )
+    cell = cell.reshape(-1)
+
+    tri = cell.reshape(-1, 3)
+    valid = (tri[:, 0] != tri[:, 1]) & (tri[:, 1] != tri[:, 2]) & (tri[:, 0] != tri[:, 2])
+    candidates = np.flatnonzero(valid)
+    keys = np.concatenate([np.sort(tri[candidates], axis=1), tri_mats[candidates, None]], axis=1)
+    _, first = np.unique(keys, axis=0, return_index=True)
+    return cell, np.sort(candidates[first])
+
+
+def simplify_mesh(mesh: Dict[str, Any], ratio: float) -> Dict[str, Any]:
+    """
+    Simplify a mesh by vertex clustering. The corners are clustered on a uniform grid, every
+    cluster is collapsed to the mean of its positions, and the triangles that collapse to a
+    line or a point are removed. The grid resolution is found by bisection, so the mesh keeps
+    approximately the given fraction of its triangles, and never fewer. Corners keep their own
+    normals and texture coordinates, so seams and material groups are kept.
+
+    Parameters
+    ----------
+    mesh : Dict[str, Any]
+        Mesh as returned by read_obj.
+    ratio : float
+        Fraction of the triangles to keep, between 0 and 1.
+
+    Returns
+    -------
+    Dict[str, Any]
+        Simplified mesh in the same format.
+    """
+    position = mesh["position"]
+    n_tris = position.shape[0] // 3
+    target = max(1, int(round(ratio * n_tris)))
+    if target >= n_tris:
+        return mesh
+
+    tri_mats = np.zeros(n_tris, dtype=np.int64)
+    for k, (start, count, _) in enumerate(mesh["groups"]):
+        tri_mats[start // 3 : (start + count) // 3] = k
+
+    # Find the coarsest grid that keeps at least the target number of triangles
+    lo, hi = 1, 2**20
+    cell, keep = _cluster_triangles(position, tri_mats, hi)
+    while hi - lo > 1:
+        mid = (lo + hi) // 2
+        mid_cell, mid_keep = _cluster_triangles(position, tri_mats, mid)
+        if mid_keep.size >= target:
+            hi, cell, keep = mid, mid_cell, mid_keep
+        else:
+            lo = mid
+
+    counts = np.bincount(cell)
+    mean = np.stack([np.bincount(cell, position[:, d]) for d in range(3)], axis=1)
+    mean /= counts[:, None]
+
+    corners = (3 * keep[:, None] + np.arange(3)).reshape(-1)
+    kept_mats = tri_mats[keep]
+    groups = []
+    for k, (_, _, name) in enumerate(mesh["groups"]):
+        tris = np.flatnonzero(kept_mats == k)
+        if tris.size:
+            groups.append((3 * int(tris[0]), 3 * tris.size, name))
+
+    return {
+        "position": mean[cell[corners]],
+        "normal": mesh["normal"][corners],
+        "uv": None if mesh["uv"] is None else mesh["uv"][corners],
+        "groups": groups,
+    }
+
+
+def encode_mesh(mesh: Dict[str, Any]) -> Tuple[Dict[str, Any], bytes]:
+    """
+    Encode a mesh as a compact binary mesh.
+
+    Positions and texture coordinates are quantized to 16 bits per component with a per-mesh
+    offset and scale, and normals are quantized to normalized 16-bit integers. Corners with
+    the same quantized attributes are then welded into one vertex, and the triangles are stored
+    as an index into the vertices. Vertices are kept in the order they are first used, which
+    keeps the vertex cache of the GPU effective.
+
+    Parameters
+    ----------
+    mesh : Dict[str, Any]
+        Mesh as returned by read_obj.
+
+    Returns
+    -------
+    Tuple[Dict[str, Any], bytes]
+        Header and binary data of the mesh. The header holds the number of vertices, the
+        offset and scale of each quantized attribute, the byte offset of each array in the
+        data, and the material groups.
+    """
+
+    q_position, position_offset, position_scale = _quantize(mesh["position"])
+    n = mesh["normal"]
+    n = n / np.maximum(np.linalg.norm(n, axis=1, keepdims=True), 1e-12)
+    q_normal = np.rint(n * 32767).astype(np.int16)
+    columns = [q_position.astype(np.int64), q_normal.astype(np.int64)]
+    if mesh["uv"] is not None:
+        q_uv, uv_offset, uv_scale = _quantize(mesh["uv"])
+        columns.append(q_uv.astype(np.int64))
+
+    # Weld corners with identical attributes, keeping vertices in order of first use
+    _, first, inverse = np.unique(
+        np.concatenate(columns, axis=1), axis=0, return_index=True, return_inverse=True
+    )
+    inverse = inverse.reshape(-1)
+    order = np.argsort(first)
+    rank = np.empty_like(order)
+    rank[order] = np.arange(order.size)
+    vertices = first[order]
+    index = rank[inverse]
+
+    arrays = [("position", q_position[vertices]), ("normal", q_normal[vertices])]
+    if mesh["uv"] is not None:
+        arrays.append(("uv", q_uv[vertices]))
+    index_type = np.uint16 if vertices.size <= 2**16 else np.uint32
+    arrays.append(("index", index.astype(index_type)))
+
+    header: Dict[str, Any] = {
+        "vertices": int(vertices.size),
+        "indices": int(index.size),
+        "index_type": "uint16" if index_type is np.uint16 else "uint32",
+        "position": {"offset": position_offset, "scale": position_scale},
+        "normal": {},
+        "groups": [list(g) for g in mesh["groups"]],
+    }
+    if mesh["uv"] is not None:
+        header["uv"] = {"offset": uv_offset, "scale": uv_scale}
+
+    # Typed arrays must start at a multiple of their element size, so each array is padded
+    # to a multiple of four bytes
+    data = bytearray()
+    for name, arr in arrays:
+        if name == "index":
+            header["index_byte_offset"] = len(data)
+        else:
+            header[name]["byte_offset"] = len(data)
+        data += arr.astype(arr.dtype.newbyteorder("<"), copy=False).tobytes()
+        data += b"\0" * (-len(data) % 4)
+
+    return header, bytes(data)
+
+
+def encode_obj(file: Union[str, Path]) -> Tuple[Dict[str, Any], bytes]:
+    """
+    Encode the triangles of an OBJ file as a compact binary mesh, see encode_mesh.
+
+    Parameters
+    ----------
+    file : Union[str, Path]
+        OBJ file.
+
+    Returns
+    -------
+    Tuple[Dict[str, Any], bytes]
+        Header and binary data of the mesh.
+    """
+    return encode_mesh(read_obj(file))
+
+
+def write_mesh(
+    f: TextIO,
+    file: Union[str, Path],
+    ratio: Optional[float] = None,
+    level: Optional[int] = None,
+    uv_rect: Optional[List[float]] = None,
+) -> None:
+    """
+    Write the encoded mesh of an OBJ file as a JavaScript object, which the decodeMesh function
+    of the runtime turns into a mesh.
+
+    Parameters
+    ----------
+    f : TextIO
+        File to write to.
+    file : Union[str, Path]
+        OBJ file.
+    ratio : Optional[float]
+        Fraction of the triangles to keep when simplifying the mesh, see simplify_mesh. If
+        None, the mesh is not simplified.
+    level : Optional[int]
+        zlib compression level of the binary data, see sihm.compress. If None, the data is not
+        compressed. Compressed data is decompressed with top-level await when the scene loads.
+    uv_rect : Optional[List[float]]
+        Rectangle of the texture of the mesh in a texture atlas, see sihm.atlas.uv_rect. The
+        texture coordinates are remapped into it. If None, they are kept as they are.
+    """
+    mesh = read_obj(file)
+    if ratio is not None:
+        mesh = simplify_mesh(mesh, ratio)
+    if uv_rect is not None and mesh["uv"] is not None:
+        mesh["uv"] = mesh["uv"] * uv_rect[2:] + uv_rect[:2]
+    header, data = encode_mesh(mesh)
+    f.write("{header: ")
+    f.write(json.dumps(header))
+    if level is None:
+        f.write(', data: "')
+        f.write(b64encode(data).decode("ascii"))
+        f.write('"}')
+    else:
+        from sihm.compress import Base64Deflater
+
+        f.write(', data: await decompress("')
+        deflater = Base64Deflater(f, level)
+        deflater.write(data)
+        deflater.close()
+        f.write('")}')
@@ -1,9 +1,22 @@
 import os
-from typing import Dict, Any, Set, List, Union, Tuple
+from typing import Dict, Any, Callable, Set, List, Optional, Union, Tuple, TextIO, TYPE_CHECKING
 from pathlib import Path
 
+if TYPE_CHECKING:
+    from sihm.cache import AssetCache
+    from numpy.typing import NDArray
+    from sihm.textures import TextureReportEntry
+    from sihm.tracks import DecimationReportEntry
+
+# Version of the asset encoding. This is part of every asset cache key, so it must be changed
+# whenever the text written for an asset changes.
+_ASSET_VERSION = "3"
+
 
 class SihmParser:
+    # Size, in characters, above which the buffered scene body is moved from memory to disk.
+    _body_spool_size = 2**24
+
     _imports = """
 import * as THREE from "three";
 import { OrbitControls } from "three/examples/jsm/controls/OrbitControls";
@@ -114,39 +127,132 @@ controls.update();
 render();
 """
 
-    def __init__(self, cfg_file: Path, fileName: str) -> None:
+    def __init__(
+        self,
+        cfg_file: Union[Path, Dict[Any, Any]],
+        fileName: str,
+        cfg_path: Optional[Path] = None,
+        previous_modules: Optional[Dict[str, str]] = None,
+    ) -> None:
         """
         Initialize the parser.
 
         Parameters
         ----------
-        cfg_file : Path
-            Input config file.
+        cfg_file : Union[Path, Dict[Any, Any]]
+            Input config file, or the config data itself, e.g., as created by sihm.scene.Scene.
         fileName : str
             Output file name.
+        cfg_path : Optional[Path]
+            Directory that relative paths in the config are relative to. Defaults to the
+            directory of the config file, or the current working directory if the config
+            data is given directly.
+        previous_modules : Optional[Dict[str, str]]
+            The module_signatures of a previous parser that wrote to the same project. Modules
+            that are unchanged since then are not written again.
         """
-        self._cfg_path = cfg_file.parents[0]
-        self._readData(cfg_file)
-        self._file = open(fileName, "w+")
+        from tempfile import SpooledTemporaryFile
+        from sihm.profile import phase
+        from sihm.sizes import SizeManifest
+
+        # Files the output depends on
+        self.dependencies: Set[Path] = set()
+
+        if isinstance(cfg_file, dict):
+            self._data = cfg_file
+            self._cfg_path = Path.cwd()
+        else:
+            self._cfg_path = cfg_file.parents[0]
+            with phase("read config"):
+                self._readData(cfg_file)
+            self.dependencies.add(cfg_file)
+        if cfg_path is not None:
+            self._cfg_path = Path(cfg_path)
+        self._file_name = fileName
         self._path = Path(fileName.replace("index.js", ""))
 
+        # The scene body is written before we know which imports and boilerplate it needs, so it
+        # is buffered here (spilling to disk once it gets large) and copied into the output file
+        # after the imports and boilerplate sections in write_file.
+        self._body = SpooledTemporaryFile(max_size=self._body_spool_size, mode="w+")
+
+        # In payload mode, the objects and their tracks are buffered here as JSON, and the
+        # runtime builds them from it in a loop. The materials and geometries they use are
+        # created once each, and referred to by index.
+        self._payload = SpooledTemporaryFile(max_size=self._body_spool_size, mode="w+")
+        self._payload_object_count: int = 0
+        self._payload_materials: Dict[str, int] = {}
+        self._payload_geometries: Dict[str, int] = {}
+
         self._extra_imports: Set[str] = set()
         self._extra_beginning_boilerplate: Set[str] = set()
 
         self._file_dict = {}
         self._extra_file_count: int = 0
+        self._extra_mesh_count: int = 0
 
         self._texture_dict = {}
         self._extra_texture_count: int = 0
 
+        # Options of the texture stage, see sihm.textures.texture_options. Material maps may
+        # override these. The report holds the textures that were optimized in this build.
+        self._texture_options: Dict[str, Any] = {}
+        self.texture_report: List["TextureReportEntry"] = []
+
+        # Signatures of the SIHM_EXTRA_* modules keyed on their file name
+        self.module_signatures: Dict[str, str] = {}
+        self._previous_modules: Dict[str, str] = previous_modules or {}
+
         self._extra_animation_function_updates: Set[str] = set()
 
         self._show_stats: bool = False
+        self._track_encoding: str = "text"
+        self._scene_format: str = "code"
+        self._mesh_encoding: str = "text"
+
+        # Objects that share a geometry and material with at least _instancing - 1 other
+        # objects under the same parent are drawn as instances of one MyInstances group. The
+        # instance keys are keyed on the (parent, name) of the objects.
+        self._instancing: int = 0
+        self._instance_keys: Dict[Tuple[str, str], str] = {}
+        self._instance_counts: Dict[str, int] = {}
+        self._instance_groups: Dict[str, str] = {}
+
+        # Small material maps are packed into texture atlases when the texture_atlas option is
+        # set. The atlas variable and UV rectangle of each packed map are keyed on the map.
+        self._atlas_options: Optional[Dict[str, int]] = None
+        self._atlas_maps: Dict[str, Tuple[str, List[float]]] = {}
+
+        # Keyframe tolerance of the SIHM section, see sihm.tracks.keyframe_tolerance. The report
+        # holds the tracks that were decimated in this build.
+        self._keyframe_tolerance: Union[None, float, Dict[str, float]] = None
+        self.decimation_report: List["DecimationReportEntry"] = []
+
+        # Tracks that span more than this many seconds are split into windows, which the runtime
+        # decodes as the animation reaches them
+        self._track_window: Optional[float] = None
+
+        # Large meshes, tracks, and OBJ and MTL files are deflated when the compress option is
+        # set, and decompressed by the runtime when the scene loads, see sihm.compress
+        self._compress: Optional[Dict[str, int]] = None
+
+        # Bytes of the output attributed to the objects and modules that created them. Modules
+        # are attributed to the object that is being created when they are added. Objects are
+        # keyed on their path from the scene, e.g., "parent/child", since objects under
+        # different parents may share a name.
+        self.sizes = SizeManifest()
+        self._size_object: Optional[str] = None
+        self._size_path: List[str] = []
+
+        self._cache: Optional["AssetCache"] = None
         self.extra_modules: Set[str] = set()
         self.glslify_files: Set[str] = set()
 
     def __del__(self) -> None:
-        self._file.close()
+        # __init__ may have raised before the buffers were created
+        for buffer in (getattr(self, "_body", None), getattr(self, "_payload", None)):
+            if buffer is not None:
+                buffer.close()
 
     def _readData(self, cfg_file: Path) -> None:
         """
@@ -175,26 +281,6 @@ render();
             with open(cfg_file, "r") as f:
                 self._data = yaml.load(f, Loader=yaml.FullLoader)
 
-    def _append_to_file(self, pos: int, text: str) -> None:
-        """
-        Append text to position in self._file.
-
-        Parameters
-        ----------
-        pos : int
-            Position in file.
-        text : str
-            Text to append.
-        """
-
-        curr_pos = self._file.tell()
-        self._file.seek(pos)
-        old_text = self._file.readlines()
-        self._file.seek(pos)
-        self._file.write(text)
-        self._file.writelines(old_text)
-        self._file.seek(curr_pos)
-
     def _getThreeJSColor(
         self, color: Union[str, int, Tuple[float, float, float], List[float]]
     ) -> str:
@@ -229,7 +315,7 @@ render();
             else:
                 return '"' + str(color) + '"'
 
-    def _getImageURI(self, img_file: Path) -> str:
+    def _getImageURI(self, img_file: Path, options: Optional[Dict[str, Any]] = None) -> str:
         """
         Reads the data from an image file and returns the associated URI.
 
@@ -237,6 +323,9 @@ render();
         ----------
         img_file : Path
             Path to the image file
+        options : Optional[Dict[str, Any]]
+            Texture options used to resize and re-encode the image, see
+            sihm.textures.texture_options. Defaults to the texture options of the SIHM section.
 
         Returns
         -------
@@ -246,12 +335,22 @@ render();
 
         import base64
 
-        suffix = img_file.suffix[1:]
-        with open(img_file, "rb") as f:
-            encoded_string = base64.b64encode(f.read())
+        if options is None:
+            options = self._texture_options
+
+        if options:
+            from sihm.textures import encode_texture
+
+            data, suffix, entry = encode_texture(img_file, options)
+            self.texture_report.append(entry)
+        else:
+            suffix = img_file.suffix[1:]
+            with open(img_file, "rb") as f:
+                data = f.read()
+        encoded_string = base64.b64encode(data)
         return "data:image/" + suffix + ";base64," + encoded_string.decode("utf-8")
 
-    def _readMtlFile(self, file: str) -> str:
+    def _readMtlFile(self, file: str, options: Dict[str, Any]) -> str:
         """
         Reads the data of an MTL file, and embeds any images as base64.
 
@@ -259,6 +358,8 @@ render();
         ----------
         file : str
             Name of the file to read.
+        options : Dict[str, Any]
+            Texture options of the images, see sihm.textures.texture_options.
 
         Returns
         -------
@@ -270,12 +371,105 @@ render();
             text = f.readlines()
         for k, line in enumerate(text):
             if "map_" in line:
-                pieces = line.split(" ")
+                pieces = line.split()
                 img_file = Path(os.path.join(base, pieces[1]))
-                text[k] = pieces[0] + " " + self._getImageURI(img_file)
+                text[k] = pieces[0] + " " + self._getImageURI(img_file, options) + "\n"
 
         return "".join(text)
 
+    def _mtlImages(self, file: Union[str, Path]) -> List[Path]:
+        """
+        Get the images an MTL file refers to.
+
+        Parameters
+        ----------
+        file : Union[str, Path]
+            Name of the MTL file.
+
+        Returns
+        -------
+        List[Path]
+            Image files, in the order they appear in the MTL file.
+        """
+        base = Path(file).parents[0]
+        with open(file, "r") as f:
+            return [Path(os.path.join(base, line.split()[1])) for line in f if "map_" in line]
+
+    def _writeModule(
+        self,
+        new_file: str,
+        header: str,
+        key: Callable[[], List[Union[str, bytes, Path]]],
+        payload: Callable[[TextIO], None],
+    ) -> None:
+        """
+        Write a SIHM_EXTRA_* module. The module consists of a header, which holds the imports and
+        the start of the export statement, followed by the payload, which is the encoded asset.
+        When the asset cache is enabled, the payload is copied from the cache if it is there, and
+        added to the cache otherwise. If the module is unchanged since the previous build of the
+        project, it is not written at all.
+
+        Parameters
+        ----------
+        new_file : str
+            Name of the module file.
+        header : str
+            Header of the module.
+        key : Callable[[], List[Union[str, bytes, Path]]]
+            Function that returns the items the payload is created from. These are hashed,
+            along with the header, to create the cache key; paths are hashed by their content.
+        payload : Callable[[TextIO], None]
+            Function that writes the payload to the given file.
+        """
+        from sihm.cache import AssetCache
+
+        # Modules whose header and sources are unchanged since the previous build of this project
+        # are left as they are. This also leaves their modification time untouched, so the
+        # build system does not redo any work for them.
+        items = key()
+        sources = [x for x in items if isinstance(x, Path)]
+        self.dependencies.update(sources)
+        signature = AssetCache.hash(
+            _ASSET_VERSION,
+            header,
+            *[x for x in items if not isinstance(x, Path)],
+            *[f"{x.resolve()}:{x.stat().st_mtime_ns}:{x.stat().st_size}" for x in sources],
+        )
+        self.module_signatures[new_file] = signature
+        if self._previous_modules.get(new_file, None) != signature or not os.path.exists(new_file):
+            with open(new_file, "w") as f:
+                f.write(header)
+                if self._cache is None:
+                    payload(f)
+                else:
+                    from sihm.cache import TeeWriter
+
+                    # The header is part of the key, since it determines how the payload is
+                    # encoded, e.g., whether it is compressed
+                    cache_key = self._cache.hash(_ASSET_VERSION, header, *items)
+                    if not self._cache.read(cache_key, f):
+                        with self._cache.writer(cache_key) as cached:
+                            payload(TeeWriter(f, cached))
+
+        self.sizes.add_module(Path(new_file).stem, os.path.getsize(new_file))
+
+    def _useModule(self, name: str) -> str:
+        """
+        Record that the object being created uses a SIHM_EXTRA_* module, see sizes.
+
+        Parameters
+        ----------
+        name : str
+            Name of the module.
+
+        Returns
+        -------
+        str
+            Name of the module.
+        """
+        self.sizes.use(name, self._size_object)
+        return name
+
     def _hashTexture(
         self, file: Union[str, Path, List[str], Tuple[str, ...], List[Path], Tuple[Path, ...]]
     ) -> str:
@@ -311,28 +505,43 @@ render();
             return "".join(files)
 
     def _addTexture(
-        self, file: Union[str, Path, List[str], Tuple[str, ...], List[Path], Tuple[Path, ...]]
+        self,
+        file: Union[
+            str, Path, List[str], Tuple[str, ...], List[Path], Tuple[Path, ...], Dict[str, Any]
+        ],
     ) -> str:
         """
         Add texture to scene. This supports regular textures and cube textures.
 
         Parameters
         ----------
-        file : Union[str, Path, List[str], Tuple[str, ...], List[Path], Tuple[Path, ...]]
-            File(s) that make up the texture.
+        file : Union[str, Path, List[str], Tuple[str, ...], List[Path], Tuple[Path, ...], Dict]
+            File(s) that make up the texture. A texture may also be given as a dictionary, e.g.,
+            {"FILE": "label.png", "MAX_SIZE": 256, "FORMAT": "webp"}, whose other keys override
+            the texture options of the SIHM section for this texture.
 
         Returns
         -------
         str:
             Name of the JavaScript variable that holds the texture.
         """
+        import json
+
+        options = self._texture_options
+        if isinstance(file, dict):
+            from sihm.textures import texture_options
+
+            overrides = {k: v for k, v in file.items() if k != "FILE"}
+            options = {**options, **texture_options(overrides)}
+            file = file["FILE"]
+        options_key = json.dumps(options, sort_keys=True)
 
         # Get unique str hash for this texture
-        texture_hash = self._hashTexture(file)
+        texture_hash = self._hashTexture(file) + options_key
 
         # Return if we have already turned this into a texture
         if texture_hash in self._texture_dict:
-            return self._texture_dict[texture_hash]
+            return self._useModule(self._texture_dict[texture_hash])
 
         # Create texture if it does not exist
         name = f"SIHM_EXTRA_TEXTURE_{self._extra_texture_count}"
@@ -341,32 +550,172 @@ render();
 
         if isinstance(file, str) or isinstance(file, Path):
             # Single texture
-            with open(new_file, "w") as f:
-                f.write("import { TextureLoader } from 'three';\n")
-                f.write("const TEXTURE_LOADER = new TextureLoader();\n")
-                img_file = self._cfg_path.joinpath(Path(file))
-                f.write(
-                    f'export const {name} = TEXTURE_LOADER.load("{self._getImageURI(img_file)}");\n'
-                )
+            img_file = self._cfg_path.joinpath(Path(file))
+
+            def payload(f: TextIO) -> None:
+                f.write(f'TEXTURE_LOADER.load("{self._getImageURI(img_file, options)}");\n')
+
+            self._writeModule(
+                new_file,
+                "import { TextureLoader } from 'three';\n"
+                + "const TEXTURE_LOADER = new TextureLoader();\n"
+                + f"export const {name} = ",
+                lambda: ["texture", options_key, img_file.suffix, img_file],
+                payload,
+            )
         else:
             # Cube texture
             if len(file) != 6:
                 raise ValueError(f"Got {len(file)} texture files, but I expected 1 or 6.")
-            with open(new_file, "w") as f:
-                f.write("import { CubeTextureLoader } from 'three';\n")
-                f.write("const CUBE_TEXTURE_LOADER = new CubeTextureLoader();\n")
-                f.write(f"export const {name} = CUBE_TEXTURE_LOADER.load( [\n")
-                for dark in file:
-                    img_file = self._cfg_path.joinpath(Path(dark))
-                    f.write(f'"{self._getImageURI(img_file)}", \n')
+            img_files = [self._cfg_path.joinpath(Path(dark)) for dark in file]
+
+            def payload(f: TextIO) -> None:
+                f.write("CUBE_TEXTURE_LOADER.load( [\n")
+                for img_file in img_files:
+                    f.write(f'"{self._getImageURI(img_file, options)}", \n')
                 f.write("] );\n")
 
+            self._writeModule(
+                new_file,
+                "import { CubeTextureLoader } from 'three';\n"
+                + "const CUBE_TEXTURE_LOADER = new CubeTextureLoader();\n"
+                + f"export const {name} = ",
+                lambda: ["cube_texture", options_key]
+                + [x for img in img_files for x in (img.suffix, img)],
+                payload,
+            )
+
         self._extra_imports.add("import { " + name + " } from './" + name + "';\n")
         self._texture_dict[texture_hash] = name
         self._extra_texture_count += 1
-        return name
+        return self._useModule(name)
 
-    def _addExtraFile(self, file: Union[str, Path]) -> str:
+    def _addSkybox(self, data: Dict[str, Any]) -> str:
+        """
+        Add a cube texture whose faces are created from a single image. The image is either a
+        cross, e.g.,
+        {"FILE": "sky.png", "LAYOUT": {"l": 4, "r": 6, "f": 5, "b": 7, "u": 1, "d": 9}}, where
+        the layout is an ImageLoc, see sihm.utils.crop_skybox, and may be null to use the
+        default layout, or an equirectangular panorama, e.g.,
+        {"FILE": "sky.jpg", "PROJECTION": "equirectangular", "FACE_SIZE": 1024}, see
+        sihm.utils.equirect_to_cubemap. The faces are created and encoded in memory, and the
+        other keys override the texture options of the SIHM section for the faces.
+
+        Parameters
+        ----------
+        data : Dict[str, Any]
+            Skybox data.
+
+        Returns
+        -------
+        str
+            Name of the JavaScript variable that holds the texture.
+        """
+        import json
+        from sihm.textures import texture_options
+        from sihm.utils import img_loc_default
+
+        projection = data.get("PROJECTION", "cross")
+        face_size = data.get("FACE_SIZE", None)
+        layout = data.get("LAYOUT", None) or img_loc_default
+        if projection not in ("cross", "equirectangular"):
+            raise ValueError(
+                f"Unknown skybox PROJECTION {projection}. Expected one of cross, equirectangular."
+            )
+        if sorted(layout) != ["b", "d", "f", "l", "r", "u"]:
+            raise ValueError(f"Got skybox LAYOUT {layout}, but expected the keys l, r, f, b, u, d.")
+        if face_size is not None and (not isinstance(face_size, int) or face_size < 1):
+            raise ValueError(f"Got skybox FACE_SIZE {face_size}, but expected a positive integer.")
+        overrides = {
+            k: v for k, v in data.items() if k not in ("FILE", "LAYOUT", "PROJECTION", "FACE_SIZE")
+        }
+        options = {**self._texture_options, **texture_options(overrides)}
+        img_file = self._cfg_path.joinpath(Path(data["FILE"]))
+        if projection == "cross":
+            options_key = json.dumps([layout, options], sort_keys=True)
+        else:
+            options_key = json.dumps([projection, face_size, options], sort_keys=True)
+
+        texture_hash = self._hashTexture(str(img_file.resolve())) + options_key
+        if texture_hash in self._texture_dict:
+            return self._useModule(self._texture_dict[texture_hash])
+
+        name = f"SIHM_EXTRA_TEXTURE_{self._extra_texture_count}"
+        new_file = os.path.join(self._path, f"{name}.js")
+
+        def payload(f: TextIO) -> None:
+            import base64
+            from PIL import Image
+            from sihm.textures import (
+                DEFAULT_QUALITY,
+                TEXTURE_FORMATS,
+                encode_image,
+                normalize_mode,
+                open_image,
+                target_size,
+            )
+            from sihm.utils import CUBE_FACES, crop_skybox, equirect_to_cubemap
+
+            img = open_image(img_file, options)
+            fmt = options.get("format", (img.format or "").lower())
+            fmt = fmt if fmt in TEXTURE_FORMATS else "png"
+            if projection == "cross":
+                faces = crop_skybox(img, layout)
+            else:
+                faces = equirect_to_cubemap(img, face_size)
+
+            f.write("CUBE_TEXTURE_LOADER.load( [\n")
+            for k in CUBE_FACES:
+                face = faces[k]
+                if (size := target_size(face.size, options)) != face.size:
+                    face = normalize_mode(face).resize(size, Image.LANCZOS)
+                data, face_fmt = encode_image(
+                    face, fmt, options.get("quality", DEFAULT_QUALITY), f"{img_file} ({k})"
+                )
+                uri = f"data:image/{face_fmt};base64," + base64.b64encode(data).decode("utf-8")
+                f.write(f'"{uri}", \n')
+            f.write("] );\n")
+
+        self._writeModule(
+            new_file,
+            "import { CubeTextureLoader } from 'three';\n"
+            + "const CUBE_TEXTURE_LOADER = new CubeTextureLoader();\n"
+            + f"export const {name} = ",
+            lambda: ["cube_" + projection, options_key, img_file.suffix, img_file],
+            payload,
+        )
+
+        self._extra_imports.add("import { " + name + " } from './" + name + "';\n")
+        self._texture_dict[texture_hash] = name
+        self._extra_texture_count += 1
+        return self._useModule(name)
+
+    def _compressLevel(self, size: int) -> Optional[int]:
+        """
+        Get the zlib compression level of an asset, see the compress option. Compressed assets
+        import their decompression function from the decode module of the runtime, and await it
+        at the top level.
+
+        Parameters
+        ----------
+        size : int
+            Size of the asset in bytes.
+
+        Returns
+        -------
+        Optional[int]
+            Compression level, or None if the asset is not compressed.
+        """
+        if self._compress is None or size < self._compress["min_size"]:
+            return None
+        return self._compress["level"]
+
+    def _addExtraFile(
+        self,
+        file: Union[str, Path],
+        texture_overrides: Optional[Dict[str, Any]] = None,
+        uv_rect: Optional[List[float]] = None,
+    ) -> str:
         """
         Adds file to _file_dict if it does not exist. This entails
         creating a SIHM_EXTRA_FILE_*.js file that contains a single string
@@ -379,6 +728,12 @@ render();
         ----------
         file : str
             Name of the file to add.
+        texture_overrides : Optional[Dict[str, Any]]
+            Texture options of the images of an MTL file, which override the texture options of
+            the SIHM section, see sihm.textures.texture_options.
+        uv_rect : Optional[List[float]]
+            Rectangle of the texture of an OBJ file in a texture atlas, see sihm.atlas.uv_rect.
+            The texture coordinates of the file are remapped into it.
 
         Returns
         -------
@@ -386,28 +741,227 @@ render();
             Name of the SIHM_EXTRA_FILE_* variable name.
         """
 
-        if file not in self._file_dict:
+        import json
+
+        texture_options = {**self._texture_options, **(texture_overrides or {})}
+        file_key = file
+        if texture_overrides:
+            # The same MTL file may be used with different texture options
+            file_key = (file, json.dumps(texture_options, sort_keys=True))
+        elif uv_rect is not None:
+            # The same OBJ file may be used with different atlas rectangles
+            file_key = (file, tuple(uv_rect))
+
+        if file_key not in self._file_dict:
             name = f"SIHM_EXTRA_FILE_{self._extra_file_count}"
             name_js = f"{name}.js"
             new_file = os.path.join(self._path, name_js)
-            self._file_dict[file] = name
-            if Path(file).suffix[1:] == "mtl":
-                # Handle material files seperately, as we may need to
-                # embed images into them.
-                text = self._readMtlFile(file)
-            else:
-                with open(file, "r") as f:
-                    text = f.read()
-            with open(new_file, "w") as f:
-                f.write(f"export const {name} = `\n")
-                f.write(text)
-                f.write("\n`;")
+            self._file_dict[file_key] = name
+            is_mtl = Path(file).suffix[1:] == "mtl"
+
+            # OBJ and MTL files can be compressed. Other files, e.g., shaders, are small, and
+            # may be transformed by glslify.
+            level = None
+            if Path(file).suffix[1:] in ("obj", "mtl"):
+                size = os.path.getsize(file)
+                if is_mtl:
+                    size += sum(os.path.getsize(img) for img in self._mtlImages(file))
+                level = self._compressLevel(size)
+
+            def key() -> List[Union[str, bytes, Path]]:
+                if is_mtl:
+                    images = self._mtlImages(file)
+                    return [
+                        "mtl",
+                        Path(file),
+                        json.dumps(texture_options, sort_keys=True),
+                        f"level {level}",
+                    ] + [x for img in images for x in (img.suffix, img)]
+                else:
+                    return ["file", f"level {level}", f"uv {uv_rect}", Path(file)]
+
+            def payload(f: TextIO) -> None:
+                if is_mtl:
+                    # Handle material files seperately, as we may need to
+                    # embed images into them.
+                    text = self._readMtlFile(file, texture_options)
+                else:
+                    with open(file, "r") as g:
+                        text = g.read()
+                    if uv_rect is not None:
+                        from sihm.atlas import remap_obj_uvs
+
+                        text = remap_obj_uvs(text, uv_rect)
+                if level is None:
+                    f.write("`\n")
+                    f.write(text)
+                    f.write("\n`;")
+                else:
+                    from sihm.compress import Base64Deflater
+
+                    deflater = Base64Deflater(f, level)
+                    deflater.write("\n" + text + "\n")
+                    deflater.close()
+                    f.write('");')
+
+            header = f"export const {name} = "
+            if level is not None:
+                header = (
+                    'import { decompressText } from "./decode";\n'
+                    + f'{header}await decompressText("'
+                )
+            self._writeModule(new_file, header, key, payload)
 
             self._extra_file_count += 1
 
-            return name
+            return self._useModule(name)
         else:
-            return self._file_dict[file]
+            return self._useModule(self._file_dict[file_key])
+
+    def _addMeshFile(
+        self,
+        file: Union[str, Path],
+        ratio: Optional[float] = None,
+        uv_rect: Optional[List[float]] = None,
+    ) -> str:
+        """
+        Adds an OBJ file as a quantized mesh, see sihm.mesh. This creates a SIHM_EXTRA_MESH_*.js
+        file that exports the encoded mesh. If the file was already added, the name of its
+        existing variable is returned.
+
+        Parameters
+        ----------
+        file : Union[str, Path]
+            OBJ file to add.
+        ratio : Optional[float]
+            Fraction of the triangles to keep when simplifying the mesh for a level of detail,
+            or None to keep the full mesh.
+        uv_rect : Optional[List[float]]
+            Rectangle of the texture of the mesh in a texture atlas, see sihm.atlas.uv_rect.
+            The texture coordinates of the mesh are remapped into it.
+
+        Returns
+        -------
+        str
+            Name of the SIHM_EXTRA_MESH_* variable.
+        """
+        from sihm.mesh import write_mesh
+
+        key = ("mesh", str(file), ratio, None if uv_rect is None else tuple(uv_rect))
+        if key not in self._file_dict:
+            name = f"SIHM_EXTRA_MESH_{self._extra_mesh_count}"
+            new_file = os.path.join(self._path, f"{name}.js")
+            self._file_dict[key] = name
+
+            level = self._compressLevel(os.path.getsize(file))
+
+            def payload(f: TextIO) -> None:
+                write_mesh(f, file, ratio, level, uv_rect)
+                f.write(";\n")
+
+            header = f"export const {name} = "
+            if level is not None:
+                header = 'import { decompress } from "./decode";\n' + header
+            kind = "mesh" if ratio is None else f"mesh_lod_{ratio}"
+            self._writeModule(
+                new_file,
+                header,
+                lambda: [kind, f"level {level}", f"uv {uv_rect}", Path(file)],
+                payload,
+            )
+            self._extra_mesh_count += 1
+        return self._useModule(self._file_dict[key])
+
+    @staticmethod
+    def _lodLevels(lod: Any) -> List[Tuple[float, float]]:
+        """
+        Validate the LOD setting of an OBJ geometry. This is a dictionary with the keys:
+
+        * RATIOS - Fraction of the triangles each simplified level keeps, between 0 and 1.
+        * DISTANCES - Camera distance from which each simplified level is shown. The full mesh
+          is shown below the first distance.
+
+        Parameters
+        ----------
+        lod : Any
+            LOD setting.
+
+        Returns
+        -------
+        List[Tuple[float, float]]
+            Ratio and distance of each simplified level.
+        """
+        if not isinstance(lod, dict) or "RATIOS" not in lod or "DISTANCES" not in lod:
+            raise ValueError(f"Got LOD {lod}, but expected a dictionary with RATIOS and DISTANCES.")
+        ratios = lod["RATIOS"]
+        distances = lod["DISTANCES"]
+        if not isinstance(ratios, list) or not isinstance(distances, list):
+            raise ValueError(f"The RATIOS and DISTANCES of LOD {lod} must be lists.")
+        if len(ratios) != len(distances):
+            raise ValueError(f"LOD {lod} must give as many RATIOS as DISTANCES.")
+        for ratio in ratios:
+            if not isinstance(ratio, (int, float)) or not 0.0 < ratio < 1.0:
+                raise ValueError(f"Got LOD ratio {ratio}, but expected a number between 0 and 1.")
+        for d0, d1 in zip([0.0] + distances, distances):
+            if not isinstance(d1, (int, float)) or d1 <= d0:
+                raise ValueError(f"The DISTANCES of LOD {lod} must be positive and increasing.")
+        return [(float(r), float(d)) for r, d in zip(ratios, distances)]
+
+    def _objTemplate(
+        self, geo: Dict[Any, Any], has_mtl: bool, uv_rect: Optional[List[float]] = None
+    ) -> str:
+        """
+        Get the JavaScript expression that creates the object of an OBJ geometry. Depending on the
+        mesh_encoding option, this either parses the embedded OBJ file with the OBJ loader, or
+        decodes the embedded quantized mesh.
+
+        If the geometry has an LOD setting, see _lodLevels, the object is a THREE.LOD that holds
+        the full mesh and its simplified levels. The simplified levels are always embedded as
+        quantized meshes, since they are created by sihm rather than read from a file.
+
+        Parameters
+        ----------
+        geo : Dict[Any, Any]
+            Geometry data. This must be given as a file.
+        has_mtl : bool
+            Whether the object uses the materials of an MTL file, which were set on the OBJ
+            loader before.
+        uv_rect : Optional[List[float]]
+            Rectangle of the map of the object in a texture atlas, see _atlasRect. The texture
+            coordinates are remapped into it when the mesh is embedded.
+
+        Returns
+        -------
+        str
+            Expression that creates the object.
+        """
+        file = self._cfg_path.joinpath(Path(geo["FILE"])).resolve()
+        materials = "OBJ_LOADER.materials" if has_mtl else "null"
+        if self._mesh_encoding == "quantized":
+            js_name = self._addMeshFile(file, uv_rect=uv_rect)
+            self._extra_imports.add('import { decodeMesh } from "./mesh";\n')
+            self._extra_imports.add("import { " + js_name + " } from './" + js_name + "';\n")
+            template = f"decodeMesh({js_name}, {materials})"
+        else:
+            js_name = self._addExtraFile(file, uv_rect=uv_rect)
+            self._extra_imports.add(
+                "import { OBJLoader } from 'three/examples/jsm/loaders/OBJLoader';\n"
+            )
+            self._extra_imports.add("import { " + js_name + " } from './" + js_name + "';\n")
+            self._extra_beginning_boilerplate.add("const OBJ_LOADER = new OBJLoader();\n")
+            template = f"OBJ_LOADER.parse({js_name})"
+
+        if geo.get("LOD", None) is None:
+            return template
+
+        # addLevel returns the LOD, so the levels are added in one expression
+        template = f"new THREE.LOD().addLevel({template}, 0)"
+        for ratio, distance in self._lodLevels(geo["LOD"]):
+            js_name = self._addMeshFile(file, ratio, uv_rect)
+            self._extra_imports.add('import { decodeMesh } from "./mesh";\n')
+            self._extra_imports.add("import { " + js_name + " } from './" + js_name + "';\n")
+            template += f".addLevel(decodeMesh({js_name}, {materials}), {distance})"
+        return template
 
     def _writeMaterialFile(self):
         pass
@@ -443,6 +997,74 @@ render();
                     self.extra_modules.add(v)
                 else:
                     raise ValueError(f"Not sure what to do with extra_modules argument {v}")
+            elif k == "track_encoding":
+                from sihm.tracks import TRACK_ENCODINGS
+
+                if v != "text" and v not in TRACK_ENCODINGS:
+                    raise ValueError(
+                        f"Unknown track_encoding {v}. Expected one of text, "
+                        + ", ".join(TRACK_ENCODINGS)
+                        + "."
+                    )
+                self._track_encoding = v
+            elif k == "scene_format":
+                if v not in ("code", "payload"):
+                    raise ValueError(f"Unknown scene_format {v}. Expected one of code, payload.")
+                self._scene_format = v
+            elif k == "mesh_encoding":
+                from sihm.mesh import MESH_ENCODINGS
+
+                if v not in MESH_ENCODINGS:
+                    raise ValueError(
+                        f"Unknown mesh_encoding {v}. Expected one of "
+                        + ", ".join(MESH_ENCODINGS)
+                        + "."
+                    )
+                self._mesh_encoding = v
+            elif k == "instancing":
+                if isinstance(v, bool) or v is None:
+                    self._instancing = 2 if v else 0
+                elif isinstance(v, int) and v >= 2:
+                    self._instancing = v
+                else:
+                    raise ValueError(
+                        f"Got instancing {v}, but expected a bool or a minimum group size >= 2."
+                    )
+            elif k == "texture_atlas":
+                from sihm.atlas import atlas_options
+
+                self._atlas_options = atlas_options(v)
+            elif k == "textures":
+                from sihm.textures import texture_options
+
+                if not isinstance(v, dict):
+                    raise ValueError(
+                        f"Got textures {v}, but expected a dictionary of texture options."
+                    )
+                self._texture_options = texture_options(v)
+            elif k == "keyframe_tolerance":
+                from sihm.tracks import keyframe_tolerance
+
+                self._keyframe_tolerance = keyframe_tolerance(
+                    v, self._trackNames(self._data.get("OBJECTS", {}))
+                )
+            elif k == "compress":
+                from sihm.compress import compress_options
+
+                self._compress = compress_options(v)
+            elif k == "track_window":
+                if isinstance(v, bool) or not isinstance(v, (int, float)) or v <= 0:
+                    raise ValueError(
+                        f"Got track_window {v}, but expected a positive duration in seconds."
+                    )
+                self._track_window = float(v)
+            elif k == "asset_cache":
+                from sihm.cache import AssetCache
+
+                if isinstance(v, dict):
+                    self._cache = AssetCache(**v)
+                elif v:
+                    self._cache = AssetCache()
             else:
                 print(f"WARNING: Encountered unknown option {k} in the SIHM section.")
 
@@ -460,280 +1082,1190 @@ render();
                 if len(data) == 6:
                     # Cube texture
                     texture_name = self._addTexture(data)
-                    self._file.write(f"scene.{prop} = {texture_name};\n")
+                    self._body.write(f"scene.{prop} = {texture_name};\n")
                 else:
                     # Color
                     color = self._getThreeJSColor(data)
-                    self._file.write(f"scene.{prop} = new THREE.Color({color});\n")
+                    self._body.write(f"scene.{prop} = new THREE.Color({color});\n")
+            elif isinstance(data, dict) and ("LAYOUT" in data or "PROJECTION" in data):
+                # Cube texture created from a single image
+                texture_name = self._addSkybox(data)
+                self._body.write(f"scene.{prop} = {texture_name};\n")
             elif "." in str(data):
                 # Texture
                 texture_name = self._addTexture(data)
-                self._file.write(f"scene.{prop} = {texture_name};\n")
+                self._body.write(f"scene.{prop} = {texture_name};\n")
             else:
                 # Color
                 color = self._getThreeJSColor(data)
-                self._file.write(f"scene.{prop} = new THREE.Color({color});\n")
+                self._body.write(f"scene.{prop} = new THREE.Color({color});\n")
         else:
             # All other properties
-            self._file.write(f"scene.{prop} = {data};\n")
+            self._body.write(f"scene.{prop} = {data};\n")
 
     def _createLight(self, name: str, light: Dict[Any, Any], parent="scene") -> None:
         if light.get("FUNCTION", None):
             light_args = self._processArgs(light["ARGS"])
-            self._file.write(f"var {name}_light = new THREE.{light['FUNCTION']}({light_args});\n")
-            self._file.write(f"{parent}.add({name}_light);\n")
+            self._body.write(f"var {name}_light = new THREE.{light['FUNCTION']}({light_args});\n")
+            self._body.write(f"{parent}.add({name}_light);\n")
 
             if light.get("POSITION", None):
                 pos = self._processArgs(light["POSITION"])
-                self._file.write(f"{name}_light.position.set({pos});\n")
+                self._body.write(f"{name}_light.position.set({pos});\n")
 
-    def _createObject(self, name: str, obj: Dict[Any, Any], parent="scene") -> None:
+    @staticmethod
+    def _trackNames(objects: Dict[str, Dict[Any, Any]]) -> Set[str]:
         """
-        Creates object and children.
+        Get the names of the tracks of a set of objects and their children.
+
+        Parameters
+        ----------
+        objects : Dict[str, Dict[Any, Any]]
+            Objects keyed on their name.
+
+        Returns
+        -------
+        Set[str]
+            Names of the tracks.
+        """
+        names: Set[str] = set()
+        for obj in objects.values():
+            names.update(obj.get("ANIMATIONS", None) or {})
+            names.update(SihmParser._trackNames(obj.get("CHILDREN", None) or {}))
+        return names
+
+    def _getKeyframeTolerance(
+        self, tolerance: Union[None, float, Dict[str, float]], track: str
+    ) -> Union[None, float]:
+        """
+        Get the keyframe tolerance of a track.
+
+        Parameters
+        ----------
+        tolerance : Union[None, float, Dict[str, float]]
+            Keyframe tolerance given in the config. This is either a single tolerance used for all
+            tracks or a dictionary of tolerances keyed on the track name.
+        track : str
+            Name of the track.
+
+        Returns
+        -------
+        Union[None, float]
+            Keyframe tolerance of the track, or None if the track should not be decimated.
+        """
+        if isinstance(tolerance, dict):
+            return tolerance.get(track, None)
+        return tolerance
+
+    def _trackArrays(
+        self, name: str, track: str, args: List[Any], tolerance: Union[None, float]
+    ) -> Tuple[Any, Any]:
+        """
+        Get the times and values of a keyframe track as flat arrays, decimating them if a
+        keyframe tolerance is given.
+
+        Parameters
+        ----------
+        name : str
+            Name of the object the track belongs to.
+        track : str
+            Name of the track.
+        args : List[Any]
+            Track arguments. The first two are the times and values of the track.
+        tolerance : Union[None, float]
+            Keyframe tolerance used to decimate the track. If None, all keyframes are kept.
+
+        Returns
+        -------
+        Tuple[Any, Any]
+            Times and values of the track.
+        """
+        from sihm.tracks import track_to_array
+
+        times = track_to_array(args[0])
+        values = track_to_array(args[1])
+
+        if tolerance is not None:
+            if len(args) > 2:
+                print(
+                    f"WARNING: Not decimating {name}.{track}, since it does not use the default interpolation."
+                )
+            else:
+                from sihm.tracks import decimate_track
+
+                n = times.size
+                ind = decimate_track(
+                    times, values.reshape(n, -1), tolerance, quaternion=track == "quaternion"
+                )
+                times = times[ind]
+                values = values.reshape(n, -1)[ind].reshape(-1)
+                self.decimation_report.append((name, track, times.size, n))
+
+        return times, values
+
+    def _trackWindows(self, times: "NDArray[Any]") -> Optional[List[Tuple[float, float, int, int]]]:
+        """
+        Get the windows a keyframe track is split into, see the track_window option.
+
+        Parameters
+        ----------
+        times : NDArray[Any]
+            Keyframe times of the track.
+
+        Returns
+        -------
+        Optional[List[Tuple[float, float, int, int]]]
+            Windows of the track, see sihm.tracks.track_windows, or None if the track is not
+            split.
+        """
+        from sihm.tracks import track_windows
+
+        if self._track_window is None or times.size < 2:
+            return None
+        windows = track_windows(times, self._track_window)
+        return windows if len(windows) > 1 else None
+
+    def _writeTrackWindows(
+        self,
+        f: TextIO,
+        name: str,
+        track: str,
+        times: "NDArray[Any]",
+        values: "NDArray[Any]",
+        windows: List[Tuple[float, float, int, int]],
+        quote_text: bool,
+    ) -> None:
+        """
+        Write the windows of a keyframe track, see sihm.tracks.write_track_windows.
+
+        Parameters
+        ----------
+        f : TextIO
+            File to write to.
+        name : str
+            Name of the object the track belongs to.
+        track : str
+            Name of the track.
+        times : NDArray[Any]
+            Keyframe times of the track.
+        values : NDArray[Any]
+            Keyframe values of the track.
+        windows : List[Tuple[float, float, int, int]]
+            Windows of the track.
+        quote_text : bool
+            Whether to quote the windows' array literals when the track encoding is text.
+        """
+        from sihm.tracks import write_track_windows
+
+        try:
+            write_track_windows(f, times, values, windows, self._track_encoding, quote_text)
+        except ValueError:
+            raise ValueError(
+                f"Track {name}.{track} has non-finite values, which track windows cannot hold "
+                + "as text. Use a binary track_encoding instead."
+            )
+
+    def _writeTrackArray(self, arr: "NDArray[Any]") -> None:
+        """
+        Write the times or values of a keyframe track as a JavaScript expression, compressing
+        them if they are large enough, see the compress option.
+
+        Parameters
+        ----------
+        arr : NDArray[Any]
+            Flat array of times or values.
+        """
+        import numpy as np
+        from sihm.tracks import (
+            TRACK_ENCODINGS,
+            write_compressed_array,
+            write_decoded_array,
+            write_text_array,
+        )
+
+        # Text is compressed as JSON, which cannot hold non-finite values
+        itemsize = np.dtype(TRACK_ENCODINGS.get(self._track_encoding, "<f8")).itemsize
+        level = self._compressLevel(arr.size * itemsize)
+        if level is not None and self._track_encoding == "text" and not np.all(np.isfinite(arr)):
+            level = None
+
+        if level is not None:
+            decompress = "decompressText" if self._track_encoding == "text" else "decompress"
+            self._extra_imports.add("import { " + decompress + ' } from "./decode";\n')
+            write_compressed_array(self._body, arr, self._track_encoding, level)
+        elif self._track_encoding == "text":
+            write_text_array(self._body, arr)
+        else:
+            write_decoded_array(self._body, arr, self._track_encoding)
+
+    def _writeTrackArgs(
+        self, name: str, track: str, args: List[Any], tolerance: Union[None, float]
+    ) -> None:
+        """
+        Write the arguments of a keyframe track, i.e., everything after the track name.
+
+        Parameters
+        ----------
+        name : str
+            Name of the object the track belongs to.
+        track : str
+            Name of the track.
+        args : List[Any]
+            Track arguments. The first two are the times and values of the track. Any others,
+            e.g., the interpolation, are passed through as is.
+        tolerance : Union[None, float]
+            Keyframe tolerance used to decimate the track. If None, all keyframes are kept.
+        """
+        if (
+            self._track_encoding == "text"
+            and tolerance is None
+            and all(isinstance(x, (str, list)) for x in args[:2])
+            and self._compress is None
+        ):
+            self._body.write(",".join([str(x) for x in args]))
+            return
+
+        times, values = self._trackArrays(name, track, args, tolerance)
+
+        self._writeTrackArray(times)
+        self._body.write("," if self._track_encoding == "text" else ", ")
+        self._writeTrackArray(values)
+        for x in args[2:]:
+            self._body.write(f", {x}")
+
+    def _addAnimations(
+        self,
+        name: str,
+        anim: Dict[str, Union[List[Any], Dict[str, Any]]],
+        tolerance: Union[None, float, Dict[str, float]] = None,
+    ) -> None:
+        """
+        Add the keyframe tracks of an object to the mixer.
 
         Parameters
         ----------
         name : str
             Name of the object.
+        anim : Dict[str, Union[List[Any], Dict[str, Any]]]
+            Dictionary of keyframe tracks keyed on the property they animate. Each track is
+            either a list of track arguments or a description of the npy/npz files that hold
+            the track.
+        tolerance : Union[None, float, Dict[str, float]]
+            Keyframe tolerance of the object. Tracks without a tolerance here fall back to the
+            global keyframe tolerance.
+        """
+        if tolerance is not None:
+            from sihm.tracks import keyframe_tolerance
+
+            tolerance = keyframe_tolerance(tolerance, anim)
+
+        # Chunked tracks are decoded with this when they are played. Text is kept as a JSON
+        # string until then.
+        decoder = "JSON.parse"
+        if self._track_encoding != "text":
+            from sihm.tracks import TRACK_DECODERS
+
+            decoder = TRACK_DECODERS[self._track_encoding]
+            self._extra_imports.add("import { " + decoder + ' } from "./decode";\n')
+
+        self._body.write(f"// {name} animations\n")
+        for track, args in anim.items():
+            start = self._body.tell()
+            if isinstance(args, dict):
+                # Track is stored in npy/npz files
+                from sihm.tracks import load_track_file, track_files
+
+                self.dependencies.update(track_files(args, self._cfg_path))
+                args = load_track_file(args, self._cfg_path)
+            if track == "quaternion":
+                track_type = "QuaternionKeyframeTrack"
+            else:
+                track_type = "VectorKeyframeTrack"
+            track_tolerance = self._getKeyframeTolerance(tolerance, track)
+            if track_tolerance is None:
+                track_tolerance = self._getKeyframeTolerance(self._keyframe_tolerance, track)
+
+            if self._track_window is not None:
+                times, values = self._trackArrays(name, track, args, track_tolerance)
+                if (windows := self._trackWindows(times)) is not None:
+                    self._body.write(
+                        f"mixer.addChunkedTrack(THREE.{track_type}, {name}_uuid + '.{track}', "
+                    )
+                    self._writeTrackWindows(
+                        self._body, name, track, times, values, windows, quote_text=True
+                    )
+                    self._body.write(f", {decoder}")
+                    for x in args[2:]:
+                        self._body.write(f", {x}")
+                    self._body.write(");\n")
+                    self.sizes.add(self._size_object, f"track {track}", self._body.tell() - start)
+                    continue
+
+                # The track was decimated already
+                args = [times, values] + list(args[2:])
+                track_tolerance = None
+
+            self._body.write(
+                f"mixer.addKeyframeTrack(new THREE.{track_type}({name}_uuid + '.{track}', "
+            )
+            self._writeTrackArgs(name, track, args, track_tolerance)
+            self._body.write("));\n")
+            self.sizes.add(self._size_object, f"track {track}", self._body.tell() - start)
+        self._body.write("\n")
+
+    def _createMaterial(self, name: str, mat: Dict[Any, Any]) -> None:
+        """
+        Creates the material of an object. Materials given as a function are stored in the
+        {name}_material variable. Materials given as an MTL file are set on the OBJ loader.
+
+        Parameters
+        ----------
+        name : str
+            Name of the object.
+        mat : Dict[Any, Any]
+            Material data.
+        """
+        if mat.get("FILE", None):
+            overrides = mat.get("TEXTURES", None)
+            if overrides is not None:
+                from sihm.textures import texture_options
+
+                if not isinstance(overrides, dict):
+                    raise ValueError(
+                        f"Got TEXTURES {overrides}, but expected a dictionary of texture options."
+                    )
+                overrides = texture_options(overrides)
+            js_name = self._addExtraFile(
+                self._cfg_path.joinpath(Path(mat["FILE"])).resolve(), overrides
+            )
+            self._extra_imports.add(
+                "import { OBJLoader } from 'three/examples/jsm/loaders/OBJLoader';\n"
+            )
+            self._extra_imports.add(
+                "import { MTLLoader } from 'three/examples/jsm/loaders/MTLLoader';\n"
+            )
+            self._extra_imports.add("import { " + js_name + " } from './" + js_name + "';\n")
+            self._extra_beginning_boilerplate.add("const OBJ_LOADER = new OBJLoader();\n")
+            self._extra_beginning_boilerplate.add("const MTL_LOADER = new MTLLoader();\n")
+            self._body.write(f"OBJ_LOADER.setMaterials(MTL_LOADER.parse({js_name}));\n")
+
+        elif mat.get("FUNCTION", None):
+            material_extra_lines: List[str] = []
+
+            # Setup function arguments
+            if mat["FUNCTION"] == "ShaderMaterial":
+                # ShaderMaterial is a special case, since the user may point to files that store
+                # the vertex and fragment shader rather than passing in strings.
+                args = mat["ARGS"]
+
+                # Add glslify transform if necessray
+                if mat.get("USES_GLSLIFY", False):
+                    self.extra_modules.add("glslify")
+                    uses_glslify = True
+                else:
+                    uses_glslify = False
+
+                if isinstance(args, dict):
+                    vs = args.get("vertexShader", None)
+                    fs = args.get("fragmentShader", None)
+                    if vs is not None:
+                        if "main()" not in vs:
+                            # User has given vertex shader as a file
+                            # Add this to the list of known files and save as a java variable.
+                            js_name = self._addExtraFile(
+                                self._cfg_path.joinpath(Path(vs)).resolve()
+                            )
+                            self._extra_imports.add(
+                                "import { " + js_name + " } from './" + js_name + "';\n"
+                            )
+                            args["vertexShader"] = js_name
+
+                            if uses_glslify:
+                                self.glslify_files.add(js_name + ".js")
+
+                    if fs is not None:
+                        if "main()" not in fs:
+                            # User has given fragment shader as a file
+                            # Add this to the list of known files and save as a java variable.
+                            js_name = self._addExtraFile(
+                                self._cfg_path.joinpath(Path(fs)).resolve()
+                            )
+                            self._extra_imports.add(
+                                "import { " + js_name + " } from './" + js_name + "';\n"
+                            )
+                            args["fragmentShader"] = js_name
+
+                            if uses_glslify:
+                                self.glslify_files.add(js_name + ".js")
+
+                    if uniforms := args.get("uniforms", {}):
+                        for uniform, val in uniforms.items():
+                            if uniform == "time" and val is None:
+                                # Time is a special case. We will update time from the GUI.
+                                self._extra_animation_function_updates.add(
+                                    f"        {name}_material.uniforms.time.value = gui.clip_action.time;"
+                                )
+                                uniforms[uniform] = 0.0
+                            elif (im_path := self._cfg_path.joinpath(Path(val))).exists():
+                                if im_path.suffix in (
+                                    ".png",
+                                    ".jpg",
+                                    ".jpeg",
+                                    ".tiff",
+                                    ".bmp",
+                                    ".gif",
+                                ):
+                                    # If this is an image file, we assume the user is setting a texture.
+                                    # Add this to the list of textures and set as uniform.
+                                    texture_name = self._addTexture(str(im_path.resolve()))
+                                    uniforms[uniform] = texture_name
+
+                        def uniform_formatter(k: str, v: str) -> str:
+                            return k + ": {value: " + v + "}"
+
+                        dark = [uniform_formatter(str(k), str(v)) for k, v in uniforms.items()]
+                        args["uniforms"] = "{" + ",".join(dark) + "}"
+
+                    if extensions := args.pop("extensions", {}):
+                        for k, v in extensions.items():
+                            material_extra_lines.append(
+                                f"{name}_material.extensions.{k} = {str(v).lower()};\n"
+                            )
+
+                else:
+                    raise ValueError("Arguments to ShaderMaterial must be given as a dictionary.")
+
+                mat_args = "{" + self._processArgs(args) + "}"
+
+            elif mat["FUNCTION"] in [
+                "Material",
+                "MeshPhongMaterial",
+                "MeshLambertMaterial",
+                "MeshStandardMaterial",
+                "MeshPhysicalMaterial",
+            ]:
+                args = mat["ARGS"]
+
+                textures = []
+                colors = []
+
+                if mat["FUNCTION"] == "MeshLambertMaterial":
+                    textures += [
+                        "alphaMap",
+                        "aoMap",
+                        "bumpMap",
+                        "displacementMap",
+                        "emissiveMap",
+                        "envMap",
+                        "lightMap",
+                        "map",
+                        "normalMap",
+                        "specularMap",
+                    ]
+                    colors += ["color", "emissive"]
+
+                if mat["FUNCTION"] == "MeshPhongMaterial":
+                    textures += [
+                        "alphaMap",
+                        "aoMap",
+                        "bumpMap",
+                        "displacementMap",
+                        "emissiveMap",
+                        "envMap",
+                        "lightMap",
+                        "map",
+                        "normalMap",
+                        "specularMap",
+                    ]
+                    colors += ["color", "emissive"]
+
+                if mat["FUNCTION"] in ["MeshStandardMaterial", "MeshPhysicalMaterial"]:
+                    textures += [
+                        "alphaMap",
+                        "aoMap",
+                        "bumpMap",
+                        "dislacementMap",
+                        "emissiveMap",
+                        "envMap",
+                        "lightMap",
+                        "map",
+                        "metalnessMap",
+                        "normalMap",
+                        "roughnessMap",
+                        "specularMap",
+                    ]
+                    colors += ["color", "emissive"]
+
+                if mat["FUNCTION"] == "MeshPhysicalMaterial":
+                    textures += [
+                        "clearcoatMap",
+                        "clearcoatNormalMap",
+                        "clearcoatRoughnessMap",
+                        "sheenRoughnessMap",
+                        "sheenColorMap",
+                        "specularIntensityMap",
+                        "specularColorMap",
+                        "thicknessMap",
+                        "transmissionMap",
+                    ]
+                    colors += ["attenuationColor", "sheenColor", "specularColor"]
+
+                atlas = self._atlas_maps.get(self._atlasKey(mat), None)
+                for k in args:
+                    if k == "map" and atlas is not None:
+                        # The map is packed into a texture atlas
+                        args[k] = self._useModule(atlas[0])
+                        self._extra_imports.add(
+                            "import { " + atlas[0] + " } from './" + atlas[0] + "';\n"
+                        )
+                    elif k in textures:
+                        args[k] = self._addTexture(args[k])
+                    elif k in colors:
+                        args[k] = self._getThreeJSColor(args[k])
+
+                mat_args = "{" + self._processArgs(args) + "}"
+
+            else:
+                mat_args = self._processArgs(mat["ARGS"])
+
+            # Create material
+            self._body.write(f"var {name}_material = new THREE.{mat['FUNCTION']}({mat_args});\n")
+
+            for line in material_extra_lines:
+                self._body.write(line)
+
+    def _atlasKey(self, mat: Optional[Dict[Any, Any]]) -> Optional[str]:
+        """
+        Get the key of the map of a material that may be packed into a texture atlas. This is
+        the case for the built-in mesh materials whose only texture is a single map.
+
+        Parameters
+        ----------
+        mat : Optional[Dict[Any, Any]]
+            Material data.
+
+        Returns
+        -------
+        Optional[str]
+            Key of the map, or None if it cannot be packed.
+        """
+        import json
+
+        if not mat or mat.get("FUNCTION", None) not in (
+            "MeshPhongMaterial",
+            "MeshLambertMaterial",
+            "MeshStandardMaterial",
+            "MeshPhysicalMaterial",
+        ):
+            return None
+        args = mat.get("ARGS", None)
+        if not isinstance(args, dict) or "map" not in args:
+            return None
+        if any(k != "map" and k.endswith("Map") for k in args):
+            # All maps share the texture coordinates, so the other maps would be misplaced
+            return None
+        tex = args["map"]
+        if not isinstance(tex, (str, dict)) or (isinstance(tex, dict) and "FILE" not in tex):
+            return None
+        return json.dumps(tex, sort_keys=True)
+
+    def _atlasRect(self, mat: Optional[Dict[Any, Any]]) -> Optional[List[float]]:
+        """
+        Get the UV rectangle of the map of a material in its texture atlas.
+
+        Parameters
+        ----------
+        mat : Optional[Dict[Any, Any]]
+            Material data.
+
+        Returns
+        -------
+        Optional[List[float]]
+            Rectangle, see sihm.atlas.uv_rect, or None if the map is not packed.
+        """
+        if (atlas := self._atlas_maps.get(self._atlasKey(mat), None)) is None:
+            return None
+        return atlas[1]
+
+    def _remapUVs(self, expr: str, rect: Optional[List[float]]) -> str:
+        """
+        Wrap a JavaScript expression that creates a built-in geometry, so its texture
+        coordinates are remapped into a texture atlas. Built-in geometries create their texture
+        coordinates when the scene loads, so they are remapped then. The texture coordinates of
+        OBJ geometries are remapped when they are embedded instead, see _objTemplate.
+
+        Parameters
+        ----------
+        expr : str
+            Expression that creates the geometry.
+        rect : Optional[List[float]]
+            UV rectangle of the map in its atlas, see _atlasRect. If None, the expression is
+            returned as is.
+
+        Returns
+        -------
+        str
+            Wrapped expression.
+        """
+        if rect is None:
+            return expr
+        self._extra_imports.add('import { remapUVs } from "./atlas";\n')
+        return f"remapUVs({expr}, [{', '.join(str(x) for x in rect)}])"
+
+    def _findAtlasTextures(self, objects: Dict[str, Dict[Any, Any]]) -> None:
+        """
+        Pack the small maps of the objects into texture atlases. This creates a
+        SIHM_EXTRA_ATLAS_*.js file for each atlas, and fills _atlas_maps. Maps larger than the
+        max_texture_size of the texture_atlas option are not packed, and neither is an atlas
+        that would only hold one map. Maps used by a geometry whose texture coordinates may be
+        outside [0, 1] are not packed either, since they would repeat into their neighbors.
+
+        Parameters
+        ----------
+        objects : Dict[str, Dict[Any, Any]]
+            Objects keyed on their name.
+        """
+        import json
+        from sihm.atlas import (
+            ATLAS_GEOMETRIES,
+            build_atlas,
+            load_tile,
+            obj_uvs_fit,
+            pack_shelves,
+            uv_rect,
+        )
+        from sihm.textures import (
+            DEFAULT_QUALITY,
+            encode_image,
+            open_image,
+            target_size,
+            texture_options,
+        )
+
+        maps: Dict[str, Any] = {}
+        excluded = set()
+        uvs_fit: Dict[Path, bool] = {}
+
+        def fits(geo: Dict[Any, Any]) -> bool:
+            # Texture coordinates outside [0, 1] would sample the neighbors of a packed map
+            if geo.get("FUNCTION", None):
+                return geo["FUNCTION"] in ATLAS_GEOMETRIES
+            if not geo.get("FILE", None):
+                return False
+            file = self._cfg_path.joinpath(Path(geo["FILE"])).resolve()
+            if file not in uvs_fit:
+                uvs_fit[file] = obj_uvs_fit(file)
+            return uvs_fit[file]
+
+        def find(objects: Dict[str, Dict[Any, Any]]) -> None:
+            for obj in objects.values():
+                geo = obj.get("GEOMETRY", None)
+                if geo and (key := self._atlasKey(obj.get("MATERIAL"))):
+                    maps[key] = obj["MATERIAL"]["ARGS"]["map"]
+                    if not fits(geo):
+                        excluded.add(key)
+                find(obj.get("CHILDREN", {}))
+
+        find(objects)
+        for key in excluded:
+            del maps[key]
+
+        # Texture file, options, and size of each map that is small enough
+        options = self._atlas_options
+        tiles = []
+        for key, tex in maps.items():
+            tex_options = self._texture_options
+            if isinstance(tex, dict):
+                overrides = {k: v for k, v in tex.items() if k != "FILE"}
+                tex_options = {**tex_options, **texture_options(overrides)}
+                tex = tex["FILE"]
+            img_file = self._cfg_path.joinpath(Path(tex))
+            with open_image(img_file, tex_options) as img:
+                size = target_size(img.size, {"max_size": tex_options.get("max_size", None)})
+            if max(size) <= options["max_texture_size"]:
+                tiles.append((key, img_file, tex_options, size))
+
+        atlas_count = 0
+        placements, atlas_sizes = pack_shelves(
+            [tile[3] for tile in tiles], options["max_size"], options["padding"]
+        )
+        for a, atlas_size in enumerate(atlas_sizes):
+            atlas_tiles = [(t, p) for t, p in zip(tiles, placements) if p[0] == a]
+            if len(atlas_tiles) < 2:
+                continue
+
+            name = f"SIHM_EXTRA_ATLAS_{atlas_count}"
+            atlas_count += 1
+            new_file = os.path.join(self._path, f"{name}.js")
+
+            def key() -> List[Union[str, bytes, Path]]:
+                items: List[Union[str, bytes, Path]] = [
+                    "atlas",
+                    json.dumps([options, self._texture_options, atlas_size], sort_keys=True),
+                ]
+                for (_, img_file, tex_options, size), placement in atlas_tiles:
+                    items += [json.dumps([tex_options, size, placement], sort_keys=True)]
+                    items += [img_file.suffix, img_file]
+                return items
+
+            def payload(f: TextIO) -> None:
+                import base64
+
+                image = build_atlas(
+                    [load_tile(t[1], t[2]) for t, _ in atlas_tiles],
+                    [p for _, p in atlas_tiles],
+                    atlas_size,
+                    options["padding"],
+                )
+                data, fmt = encode_image(
+                    image,
+                    self._texture_options.get("format", "png"),
+                    self._texture_options.get("quality", DEFAULT_QUALITY),
+                    name,
+                )
+                uri = f"data:image/{fmt};base64," + base64.b64encode(data).decode("utf-8")
+                f.write(f'TEXTURE_LOADER.load("{uri}");\n')
+
+            self._writeModule(
+                new_file,
+                "import { TextureLoader } from 'three';\n"
+                + "const TEXTURE_LOADER = new TextureLoader();\n"
+                + f"export const {name} = ",
+                key,
+                payload,
+            )
+            for (map_key, _, _, size), placement in atlas_tiles:
+                self._atlas_maps[map_key] = (name, uv_rect(placement, size, atlas_size))
+
+    def _instanceKey(self, parent: str, obj: Dict[Any, Any]) -> Optional[str]:
+        """
+        Get the key that identifies the instances group of an object. Objects with the same
+        key share a parent, geometry, and material.
+
+        Parameters
+        ----------
+        parent : str
+            Name of the object's parent.
         obj : Dict[Any, Any]
             Object data.
-        parent : str
-            Name of the object's parent in the scene graph.
+
+        Returns
+        -------
+        Optional[str]
+            Instance key, or None if the object cannot be instanced.
         """
+        import json
 
-        self._file.write(f"// {name} object\n")
         geo = obj.get("GEOMETRY", None)
         mat = obj.get("MATERIAL", None)
+        if not geo or not (geo.get("FUNCTION", None) or geo.get("FILE", None)):
+            return None
+        if geo.get("LOD", None) is not None:
+            # Instanced meshes cannot switch their level of detail per instance
+            return None
+        if mat:
+            if mat.get("FUNCTION", None) in ("ShaderMaterial", "RawShaderMaterial"):
+                # Custom shaders do not apply the instance matrices
+                return None
+            if mat.get("FILE", None) and not geo.get("FILE", None):
+                return None
+        return json.dumps([parent, geo, mat], sort_keys=True, default=str)
+
+    def _findInstances(self, objects: Dict[str, Dict[Any, Any]], parent: str) -> None:
+        """
+        Find the objects that are drawn as instances, i.e., those that share their instance key
+        with at least as many objects as the instancing option requires.
 
-        # Material
+        Parameters
+        ----------
+        objects : Dict[str, Dict[Any, Any]]
+            Objects keyed on their name.
+        parent : str
+            Name of the objects' parent.
+        """
+        for name, obj in objects.items():
+            if (key := self._instanceKey(parent, obj)) is not None:
+                self._instance_counts[key] = self._instance_counts.get(key, 0) + 1
+                self._instance_keys[(parent, name)] = key
+            if obj.get("CHILDREN", None):
+                self._findInstances(obj["CHILDREN"], name)
+
+        if parent == "scene":
+            self._instance_keys = {
+                k: v
+                for k, v in self._instance_keys.items()
+                if self._instance_counts[v] >= self._instancing
+            }
+
+    def _createInstances(
+        self, var: str, key: str, geo: Dict[Any, Any], mat: Optional[Dict[Any, Any]]
+    ) -> None:
+        """
+        Create a MyInstances group that draws all objects with the given instance key.
+
+        Parameters
+        ----------
+        var : str
+            Name of the variable that holds the group.
+        key : str
+            Instance key of the objects.
+        geo : Dict[Any, Any]
+            Geometry data of the objects.
+        mat : Optional[Dict[Any, Any]]
+            Material data of the objects.
+        """
+        from copy import deepcopy
+
+        self._extra_imports.add('import { MyInstances } from "./instancing";\n')
+        rect = self._atlasRect(mat)
+
+        # Creating the geometry and material modifies their arguments, which the other objects
+        # in the group still use to look up their key
+        geo = deepcopy(geo)
+        material = "null"
         if mat:
-            if mat.get("FILE", None):
-                js_name = self._addExtraFile(
-                    self._cfg_path.joinpath(Path(obj["MATERIAL"]["FILE"])).resolve()
-                )
-                self._extra_imports.add(
-                    "import { OBJLoader } from 'three/examples/jsm/loaders/OBJLoader';\n"
-                )
-                self._extra_imports.add(
-                    "import { MTLLoader } from 'three/examples/jsm/loaders/MTLLoader';\n"
-                )
-                self._extra_imports.add("import { " + js_name + " } from './" + js_name + "';\n")
-                self._extra_beginning_boilerplate.add("const OBJ_LOADER = new OBJLoader();\n")
-                self._extra_beginning_boilerplate.add("const MTL_LOADER = new MTLLoader();\n")
-                self._file.write(f"OBJ_LOADER.setMaterials(MTL_LOADER.parse({js_name}));\n")
-
-            elif mat.get("FUNCTION", None):
-                material_extra_lines: List[str] = []
-
-                # Setup function arguments
-                if mat["FUNCTION"] == "ShaderMaterial":
-                    # ShaderMaterial is a special case, since the user may point to files that store
-                    # the vertex and fragment shader rather than passing in strings.
-                    args = mat["ARGS"]
-
-                    # Add glslify transform if necessray
-                    if mat.get("USES_GLSLIFY", False):
-                        self.extra_modules.add("glslify")
-                        uses_glslify = True
-                    else:
-                        uses_glslify = False
-
-                    if isinstance(args, dict):
-                        vs = args.get("vertexShader", None)
-                        fs = args.get("fragmentShader", None)
-                        if vs is not None:
-                            if "main()" not in vs:
-                                # User has given vertex shader as a file
-                                # Add this to the list of known files and save as a java variable.
-                                js_name = self._addExtraFile(
-                                    self._cfg_path.joinpath(Path(vs)).resolve()
-                                )
-                                self._extra_imports.add(
-                                    "import { " + js_name + " } from './" + js_name + "';\n"
-                                )
-                                args["vertexShader"] = js_name
+            self._createMaterial(var, deepcopy(mat))
+            if mat.get("FUNCTION", None):
+                material = f"{var}_material"
 
-                                if uses_glslify:
-                                    self.glslify_files.add(js_name + ".js")
+        if geo.get("FUNCTION", None):
+            template = f"new THREE.{geo['FUNCTION']}({self._processArgs(geo['ARGS'])})"
+            template = self._remapUVs(template, rect)
+        else:
+            template = self._objTemplate(geo, bool(mat and mat.get("FILE", None)), rect)
 
-                        if fs is not None:
-                            if "main()" not in fs:
-                                # User has given fragment shader as a file
-                                # Add this to the list of known files and save as a java variable.
-                                js_name = self._addExtraFile(
-                                    self._cfg_path.joinpath(Path(fs)).resolve()
-                                )
-                                self._extra_imports.add(
-                                    "import { " + js_name + " } from './" + js_name + "';\n"
-                                )
-                                args["fragmentShader"] = js_name
-
-                                if uses_glslify:
-                                    self.glslify_files.add(js_name + ".js")
-
-                        if uniforms := args.get("uniforms", {}):
-                            for uniform, val in uniforms.items():
-                                if uniform == "time" and val is None:
-                                    # Time is a special case. We will update time from the GUI.
-                                    self._extra_animation_function_updates.add(
-                                        f"        {name}_material.uniforms.time.value = gui.clip_action.time;"
-                                    )
-                                    uniforms[uniform] = 0.0
-                                elif (im_path := self._cfg_path.joinpath(Path(val))).exists():
-                                    if im_path.suffix in (
-                                        ".png",
-                                        ".jpg",
-                                        ".jpeg",
-                                        ".tiff",
-                                        ".bmp",
-                                        ".gif",
-                                    ):
-                                        # If this is an image file, we assume the user is setting a texture.
-                                        # Add this to the list of textures and set as uniform.
-                                        texture_name = self._addTexture(str(im_path.resolve()))
-                                        uniforms[uniform] = texture_name
-
-                            def uniform_formatter(k: str, v: str) -> str:
-                                return k + ": {value: " + v + "}"
-
-                            dark = [uniform_formatter(str(k), str(v)) for k, v in uniforms.items()]
-                            args["uniforms"] = "{" + ",".join(dark) + "}"
-
-                        if extensions := args.pop("extensions", {}):
-                            for k, v in extensions.items():
-                                material_extra_lines.append(
-                                    f"{name}_material.extensions.{k} = {str(v).lower()};\n"
-                                )
+        count = self._instance_counts[key]
+        self._body.write(f"var {var} = new MyInstances({template}, {material}, {count});\n")
+
+    @staticmethod
+    def _payloadJSON(data: Any) -> str:
+        """
+        Serialize data as JSON that can be placed in a single-quoted JavaScript string.
 
-                    else:
+        Parameters
+        ----------
+        data : Any
+            Data to serialize.
+
+        Returns
+        -------
+        str
+            Escaped JSON.
+        """
+        import json
+
+        return json.dumps(data).replace("\\", "\\\\").replace("'", "\\'")
+
+    def _payloadMaterial(self, mat: Dict[Any, Any]) -> int:
+        """
+        Get the index of a material in payload mode, creating the material if no identical
+        material has been created yet.
+
+        Parameters
+        ----------
+        mat : Dict[Any, Any]
+            Material data. This must be given as a function.
+
+        Returns
+        -------
+        int
+            Index of the material.
+        """
+        import json
+        from copy import deepcopy
+
+        key = json.dumps(mat, sort_keys=True, default=str)
+        if (index := self._payload_materials.get(key, None)) is None:
+            index = len(self._payload_materials)
+            self._payload_materials[key] = index
+            # _createMaterial modifies the arguments, so the key must be computed first
+            self._createMaterial(f"SIHM_MATERIAL_{index}", deepcopy(mat))
+        return index
+
+    def _payloadGeometry(
+        self, geo: Dict[Any, Any], mtl: Optional[Dict[Any, Any]], rect: Optional[str] = None
+    ) -> int:
+        """
+        Get the index of a geometry in payload mode, creating the geometry if no identical
+        geometry has been created yet. Geometries given as a function are stored as a
+        BufferGeometry. Geometries given as an OBJ file are stored as the object the OBJ loader
+        creates, which the runtime clones.
+
+        Parameters
+        ----------
+        geo : Dict[Any, Any]
+            Geometry data.
+        mtl : Optional[Dict[Any, Any]]
+            Material data of an OBJ geometry that uses an MTL file.
+        rect : Optional[List[float]]
+            UV rectangle the texture coordinates are remapped to, see _atlasRect.
+
+        Returns
+        -------
+        int
+            Index of the geometry.
+        """
+        import json
+        from copy import deepcopy
+
+        key = json.dumps([geo, mtl, rect], sort_keys=True, default=str)
+        if (index := self._payload_geometries.get(key, None)) is not None:
+            return index
+
+        index = len(self._payload_geometries)
+        self._payload_geometries[key] = index
+        if geo.get("FUNCTION", None):
+            geo_args = self._processArgs(deepcopy(geo["ARGS"]))
+            template = self._remapUVs(f"new THREE.{geo['FUNCTION']}({geo_args})", rect)
+            self._body.write(f"var SIHM_GEOMETRY_{index} = {template};\n")
+        elif geo.get("FILE", None):
+            if mtl:
+                self._createMaterial(f"SIHM_GEOMETRY_{index}", mtl)
+            template = self._objTemplate(geo, bool(mtl), rect)
+            self._body.write(f"var SIHM_GEOMETRY_{index} = {template};\n")
+        return index
+
+    def _addPayloadObject(
+        self, name: str, obj: Dict[Any, Any], parent: int, parent_name: str = "scene"
+    ) -> None:
+        """
+        Add an object and its children to the payload.
+
+        Each object is written as [name, parent, geometry, material, tracks], where parent,
+        geometry, and material are indices, or -1 for none, and each track is
+        [property, times, values, ...extra arguments]. Times and values are arrays, or base64
+        strings when the track encoding is binary.
+
+        Parameters
+        ----------
+        name : str
+            Name of the object.
+        obj : Dict[Any, Any]
+            Object data.
+        parent : int
+            Index of the object's parent, or -1 if the parent is the scene.
+        parent_name : str
+            Name of the object's parent.
+        """
+        from sihm.tracks import write_base64, write_text_array
+
+        geo = obj.get("GEOMETRY", None)
+        mat = obj.get("MATERIAL", None)
+
+        # Geometries and materials are created in the body, and only when no other object
+        # created them first
+        self._size_path.append(name)
+        self._size_object = "/".join(self._size_path)
+        start = self._body.tell()
+
+        mat_index = -1
+        geo_index = -1
+        if (key := self._instance_keys.get((parent_name, name), None)) is not None:
+            # Instanced object. The MyInstances group takes the place of the geometry, and
+            # holds the material.
+            geo_index = self._payload_geometries.get("instances" + key, None)
+            if geo_index is None:
+                geo_index = len(self._payload_geometries)
+                self._payload_geometries["instances" + key] = geo_index
+                self._createInstances(f"SIHM_GEOMETRY_{geo_index}", key, geo, mat)
+        elif mat and mat.get("FUNCTION", None):
+            mat_index = self._payloadMaterial(mat)
+            self.sizes.add(self._size_object, "material", self._body.tell() - start)
+            start = self._body.tell()
+
+        if geo and key is None:
+            mtl = mat if mat and mat.get("FILE", None) and geo.get("FILE", None) else None
+            geo_index = self._payloadGeometry(geo, mtl, self._atlasRect(mat))
+        self.sizes.add(self._size_object, "geometry", self._body.tell() - start)
+
+        index = self._payload_object_count
+        self._payload_object_count += 1
+        if index:
+            self._payload.write(",")
+        self._payload.write(self._payloadJSON([name, parent, geo_index, mat_index])[:-1] + ",[")
+
+        tolerance = obj.get("KEYFRAME_TOLERANCE", None)
+        if tolerance is not None:
+            from sihm.tracks import keyframe_tolerance
+
+            tolerance = keyframe_tolerance(tolerance, obj.get("ANIMATIONS", {}))
+        for k, (track, args) in enumerate(obj.get("ANIMATIONS", {}).items()):
+            if isinstance(args, dict):
+                # Track is stored in npy/npz files
+                from sihm.tracks import load_track_file, track_files
+
+                self.dependencies.update(track_files(args, self._cfg_path))
+                args = load_track_file(args, self._cfg_path)
+
+            track_tolerance = self._getKeyframeTolerance(tolerance, track)
+            if track_tolerance is None:
+                track_tolerance = self._getKeyframeTolerance(self._keyframe_tolerance, track)
+            times, values = self._trackArrays(name, track, args, track_tolerance)
+
+            start = self._payload.tell()
+            self._payload.write(("," if k else "") + "[" + self._payloadJSON(track))
+            if (windows := self._trackWindows(times)) is not None:
+                # Chunked track, which is written as [property, windows, null, ...]
+                self._payload.write(",")
+                self._writeTrackWindows(
+                    self._payload, name, track, times, values, windows, quote_text=False
+                )
+                self._payload.write(",null")
+                for x in args[2:]:
+                    self._payload.write("," + self._payloadJSON(x))
+                self._payload.write("]")
+                self.sizes.add(
+                    self._size_object, f"track {track}", self._payload.tell() - start, payload=True
+                )
+                continue
+
+            for arr in (times, values):
+                self._payload.write(",")
+                if self._track_encoding == "text":
+                    try:
+                        write_text_array(self._payload, arr, allow_nan=False)
+                    except ValueError:
                         raise ValueError(
-                            "Arguments to ShaderMaterial must be given as a dictionary."
+                            f"Track {name}.{track} has non-finite values, which the payload "
+                            + "cannot hold as text. Use a binary track_encoding instead."
                         )
+                else:
+                    self._payload.write('"')
+                    write_base64(self._payload, arr, self._track_encoding)
+                    self._payload.write('"')
+            for x in args[2:]:
+                self._payload.write("," + self._payloadJSON(x))
+            self._payload.write("]")
+            self.sizes.add(
+                self._size_object, f"track {track}", self._payload.tell() - start, payload=True
+            )
+        self._payload.write("]]")
 
-                    mat_args = "{" + self._processArgs(args) + "}"
-
-                elif mat["FUNCTION"] in [
-                    "Material",
-                    "MeshPhongMaterial",
-                    "MeshLambertMaterial",
-                    "MeshStandardMaterial",
-                    "MeshPhysicalMaterial",
-                ]:
-                    args = mat["ARGS"]
-
-                    textures = []
-                    colors = []
-
-                    if mat["FUNCTION"] == "MeshLambertMaterial":
-                        textures += [
-                            "alphaMap",
-                            "aoMap",
-                            "bumpMap",
-                            "displacementMap",
-                            "emissiveMap",
-                            "envMap",
-                            "lightMap",
-                            "map",
-                            "normalMap",
-                            "specularMap",
-                        ]
-                        colors += ["color", "emissive"]
-
-                    if mat["FUNCTION"] == "MeshPhongMaterial":
-                        textures += [
-                            "alphaMap",
-                            "aoMap",
-                            "bumpMap",
-                            "displacementMap",
-                            "emissiveMap",
-                            "envMap",
-                            "lightMap",
-                            "map",
-                            "normalMap",
-                            "specularMap",
-                        ]
-                        colors += ["color", "emissive"]
-
-                    if mat["FUNCTION"] in ["MeshStandardMaterial", "MeshPhysicalMaterial"]:
-                        textures += [
-                            "alphaMap",
-                            "aoMap",
-                            "bumpMap",
-                            "dislacementMap",
-                            "emissiveMap",
-                            "envMap",
-                            "lightMap",
-                            "map",
-                            "metalnessMap",
-                            "normalMap",
-                            "roughnessMap",
-                            "specularMap",
-                        ]
-                        colors += ["color", "emissive"]
-
-                    if mat["FUNCTION"] == "MeshPhysicalMaterial":
-                        textures += [
-                            "clearcoatMap",
-                            "clearcoatNormalMap",
-                            "clearcoatRoughnessMap",
-                            "sheenRoughnessMap",
-                            "sheenColorMap",
-                            "specularIntensityMap",
-                            "specularColorMap",
-                            "thicknessMap",
-                            "transmissionMap",
-                        ]
-                        colors += ["attenuationColor", "sheenColor", "specularColor"]
-
-                    for k in args:
-                        if k in textures:
-                            args[k] = self._addTexture(args[k])
-                        elif k in colors:
-                            args[k] = self._getThreeJSColor(args[k])
-
-                    mat_args = "{" + self._processArgs(args) + "}"
+        # Add children
+        for child_name, child_obj in obj.get("CHILDREN", {}).items():
+            self._addPayloadObject(child_name, child_obj, index, name)
+        self._size_path.pop()
 
-                else:
-                    mat_args = self._processArgs(mat["ARGS"])
+    def _writePayload(self) -> None:
+        """
+        Write the code that builds the objects in the payload.
+        """
+        from shutil import copyfileobj
+
+        self._extra_imports.add('import { buildScene } from "./loader";\n')
+        self._body.write("// Objects\n")
+        head = self._payloadJSON({"encoding": self._track_encoding})[:-1] + ', "objects": ['
+        self._payload.seek(0, os.SEEK_END)
+        size = self._payload.tell()
+        level = self._compressLevel(size)
+        self._payload.seek(0)
+        if level is None:
+            self._body.write("buildScene(scene, mixer, followable_objects, JSON.parse('" + head)
+            copyfileobj(self._payload, self._body)
+            self._body.write("]}'),\n")
+        else:
+            import re
+            from sihm.compress import Base64Deflater
 
-                # Create material
-                self._file.write(
-                    f"var {name}_material = new THREE.{mat['FUNCTION']}({mat_args});\n"
-                )
+            # The payload is escaped for a single-quoted string, which the compressed JSON is not
+            self._extra_imports.add('import { decompressText } from "./decode";\n')
+            self._body.write(
+                "buildScene(scene, mixer, followable_objects, "
+                + 'JSON.parse(await decompressText("'
+            )
+            start = self._body.tell()
+            deflater = Base64Deflater(self._body, level)
+            unescape = re.compile(r"\\(.)", flags=re.S)
+            text = head
+            while chunk := self._payload.read(2**20):
+                text += chunk
+
+                # A trailing escape character is kept until the character it escapes is read
+                n = len(text) - (len(text) - len(text.rstrip("\\"))) % 2
+                deflater.write(unescape.sub(r"\1", text[:n]))
+                text = text[n:]
+            deflater.write(unescape.sub(r"\1", text) + "]}")
+            deflater.close()
+            self.sizes.payload_scale = (self._body.tell() - start) / max(size, 1)
+            self._body.write('")),\n')
+        geometries = [f"SIHM_GEOMETRY_{k}" for k in range(len(self._payload_geometries))]
+        materials = [f"SIHM_MATERIAL_{k}_material" for k in range(len(self._payload_materials))]
+        self._body.write("[" + ", ".join(geometries) + "],\n")
+        self._body.write("[" + ", ".join(materials) + "]);\n\n")
+
+    def _createObject(self, name: str, obj: Dict[Any, Any], parent="scene") -> None:
+        """
+        Creates object and children.
+
+        Parameters
+        ----------
+        name : str
+            Name of the object.
+        obj : Dict[Any, Any]
+            Object data.
+        parent : str
+            Name of the object's parent in the scene graph.
+        """
+
+        if self._scene_format == "payload":
+            self._addPayloadObject(name, obj, -1)
+            return
+
+        self._size_path.append(name)
+        self._size_object = "/".join(self._size_path)
+        start = self._body.tell()
+        self._body.write(f"// {name} object\n")
+        geo = obj.get("GEOMETRY", None)
+        mat = obj.get("MATERIAL", None)
+
+        # Instanced objects get their material from their MyInstances group
+        key = self._instance_keys.get((parent, name), None)
 
-                for line in material_extra_lines:
-                    self._file.write(line)
+        # Creating the material replaces its map, so the atlas rectangle is looked up first
+        rect = self._atlasRect(mat)
+
+        # Material
+        if mat and key is None:
+            self._createMaterial(name, mat)
+            self.sizes.add(self._size_object, "material", self._body.tell() - start)
+            start = self._body.tell()
 
         # Geometry
         if geo:
-            if geo.get("FUNCTION", None):
+            if key is not None:
+                if (group := self._instance_groups.get(key, None)) is None:
+                    group = f"SIHM_INSTANCES_{len(self._instance_groups)}"
+                    self._instance_groups[key] = group
+                    self._createInstances(group, key, geo, mat)
+                    self._body.write(f"{parent}.add({group});\n")
+
+                # Object
+                self._body.write(f"var {name} = {group}.addInstance();\n")
+
+            elif geo.get("FUNCTION", None):
                 geo_args = self._processArgs(geo["ARGS"])
-                self._file.write(
+                self._body.write(
                     f"var {name}_geometry = new THREE.{geo['FUNCTION']}({geo_args});\n"
                 )
+                if rect is not None:
+                    self._body.write(self._remapUVs(f"{name}_geometry", rect) + ";\n")
 
                 # Object
                 if mat:
-                    self._file.write(
+                    self._body.write(
                         f"var {name} = new THREE.Mesh({name}_geometry, {name}_material);\n"
                     )
                 else:
-                    self._file.write(f"var {name} = new THREE.Mesh({name}_geometry);\n")
+                    self._body.write(f"var {name} = new THREE.Mesh({name}_geometry);\n")
 
             elif geo.get("FILE", None):
-                js_name = self._addExtraFile(self._cfg_path.joinpath(Path(geo["FILE"])).resolve())
-                self._extra_imports.add(
-                    "import { OBJLoader } from 'three/examples/jsm/loaders/OBJLoader';\n"
-                )
-                self._extra_imports.add("import { " + js_name + " } from './" + js_name + "';\n")
-                self._extra_beginning_boilerplate.add("const OBJ_LOADER = new OBJLoader();\n")
-
                 # Object
-                self._file.write(f"var {name} = OBJ_LOADER.parse({js_name});\n")
+                template = self._objTemplate(geo, bool(mat and mat.get("FILE", None)), rect)
+                self._body.write(f"var {name} = {template};\n")
 
                 # Apply material manually if it was not applied via an MTL file
                 if mat and mat.get("FILE", None) is None:
-                    self._file.write(
+                    self._body.write(
                         f"{name}.traverse( function( child )"
                         + "{\n\tif ( child instanceof THREE.Mesh ) {\n\t\tchild.material = "
                         + f"{name}"
@@ -741,69 +2273,94 @@ render();
                     )
 
             # Add object to parent and get uuid
-            self._file.write(f'{name}.name = "{name}"\n')
-            self._file.write(f"{parent}.add({name});\n")
-            self._file.write(f"var {name}_uuid = {name}.uuid;\n\n")
+            self._body.write(f'{name}.name = "{name}"\n')
+            self._body.write(f"{parent}.add({name});\n")
+            self._body.write(f"var {name}_uuid = {name}.uuid;\n\n")
 
             # Add object to followable objects
-            self._file.write(f"followable_objects.push({name});\n\n")
+            self._body.write(f"followable_objects.push({name});\n\n")
+            self.sizes.add(self._size_object, "geometry", self._body.tell() - start)
 
             # Create animations
             anim = obj.get("ANIMATIONS", None)
             if anim:
-                self._file.write(f"// {name} animations\n")
-                for track, args in anim.items():
-                    dark = ",".join([str(x) for x in args])
-                    if track == "quaternion":
-                        self._file.write(
-                            f"mixer.addKeyframeTrack(new THREE.QuaternionKeyframeTrack({name}_uuid + '.{track}', {dark}));\n"
-                        )
-                    else:
-                        self._file.write(
-                            f"mixer.addKeyframeTrack(new THREE.VectorKeyframeTrack({name}_uuid + '.{track}', {dark}));\n"
-                        )
-                self._file.write("\n")
+                self._addAnimations(name, anim, obj.get("KEYFRAME_TOLERANCE", None))
 
         # Add children
         if obj.get("CHILDREN", None):
             for child_name, child_obj in obj["CHILDREN"].items():
                 self._createObject(child_name, child_obj, parent=f"{name}")
+        self._size_path.pop()
 
     def write_file(self):
         """
         Write the JavaScript ThreeJS file.
+
+        The file is written in a single pass: the imports and boilerplate sections are written
+        first, followed by the buffered scene body and the ending boilerplate.
         """
-        from io import SEEK_END
+        from shutil import copyfileobj
+        from sihm.profile import phase
 
         # Process sihm options
         self._processSihmOptions()
 
-        # Write beginning boilerplate
-        self._file.write(self._imports)
-        loc = self._file.tell()
-        self._file.write(self._beginning_boilerplate)
-
         # Set scene properties
-        for prop, data in self._data.get("SCENE", {}).items():
-            self._addSceneProp(prop, data)
-
-        # Create objects and animations
-        for name, obj in self._data.get("OBJECTS", {}).items():
-            self._createObject(name, obj, parent="scene")
+        with phase("scene"):
+            for prop, data in self._data.get("SCENE", {}).items():
+                self._addSceneProp(prop, data)
+
+        # Pack small material maps into texture atlases
+        if self._atlas_options is not None:
+            with phase("texture atlases"):
+                self._findAtlasTextures(self._data.get("OBJECTS", {}))
+
+        # Find the objects to instance
+        if self._instancing:
+            self._findInstances(self._data.get("OBJECTS", {}), "scene")
+
+        # Create objects and animations. This is where most assets are encoded.
+        with phase("objects"):
+            for name, obj in self._data.get("OBJECTS", {}).items():
+                self._createObject(name, obj, parent="scene")
+            self._size_object = None
+
+        # Build the objects in payload mode
+        if self._payload_object_count:
+            with phase("payload"):
+                self._writePayload()
 
         # Create lights
         for name, light in self._data.get("LIGHTS", {}).items():
             self._createLight(name, light, parent="scene")
 
-        # Add in extra beginning boilerplate.
-        # this must be done after calling _createObject, since
-        # that is the function that adds this boilerplate.
-        lines = "".join(self._extra_imports) + "".join(self._extra_beginning_boilerplate)
-        self._append_to_file(loc, lines)
-        self._file.seek(0, SEEK_END)
+        with phase("write index.js"), open(self._file_name, "w") as f:
+            # Write imports and beginning boilerplate. The extra imports and boilerplate
+            # must be written after calling _createObject, since that is the function that
+            # adds them.
+            f.write(self._imports)
+            f.write("".join(self._extra_imports))
+            f.write("".join(self._extra_beginning_boilerplate))
+            f.write(self._beginning_boilerplate)
+
+            # Write the scene body
+            self._body.seek(0)
+            copyfileobj(self._body, f)
+
+            # Write ending boilerplate
+            f.write(self.ending_boilerplate)
+
+        self._body.close()
+        self._payload.close()
+
+        if self.texture_report:
+            from sihm.textures import print_texture_report
+
+            print_texture_report(self.texture_report)
+        if self.decimation_report:
+            from sihm.tracks import print_decimation_report
 
-        # Write ending boilerplate
-        self._file.write(self.ending_boilerplate)
+            print_decimation_report(self.decimation_report)
 
     @property
     def ending_boilerplate(self) -> str:
@@ -0,0 +1,307 @@
+import os
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Union
+
+# Profiler that phase records to, see Profiler.__enter__
+_active: Optional["Profiler"] = None
+
+# Whether the note that the resident set size cannot be sampled has been printed
+_noted_no_rss = False
+
+
+def _tree_rss(pid: int) -> Optional[int]:
+    """
+    Get the resident set size of a process and all of its descendants, e.g., the cmake, yarn
+    and webpack processes a build launches. This reads /proc, so it only works on Linux.
+
+    Parameters
+    ----------
+    pid : int
+        Process ID.
+
+    Returns
+    -------
+    Optional[int]
+        Resident set size in bytes, or None if it cannot be read on this platform.
+    """
+    if not os.path.exists(f"/proc/{pid}/statm"):
+        return None
+
+    page_size = os.sysconf("SC_PAGE_SIZE")
+    total = 0
+    pids = [pid]
+    while pids:
+        p = pids.pop()
+        try:
+            with open(f"/proc/{p}/statm", "r") as f:
+                total += int(f.read().split()[1]) * page_size
+            for task in os.listdir(f"/proc/{p}/task"):
+                with open(f"/proc/{p}/task/{task}/children", "r") as f:
+                    pids += [int(c) for c in f.read().split()]
+        except (OSError, ValueError):
+            # The process exited while it was being read
+            continue
+    return total
+
+
+class ProfilePhase:
+    """
+    Phase of a build, e.g., parsing the config or running webpack.
+    """
+
+    def __init__(self, name: str, depth: int) -> None:
+        """
+        Initialize the phase.
+
+        Parameters
+        ----------
+        name : str
+            Name of the phase.
+        depth : int
+            Number of phases this phase is nested in.
+        """
+        self.name = name
+        self.depth = depth
+
+        # Wall time in seconds
+        self.seconds: float = 0.0
+
+        # Peak memory allocated by Python, as traced by tracemalloc, and peak resident set size
+        # of sihm and the processes it launched, in bytes
+        self.python_peak: int = 0
+        self.rss_peak: Optional[int] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        """
+        Get the phase as a dictionary that can be serialized as JSON.
+
+        Returns
+        -------
+        Dict[str, Any]
+            Name, depth, seconds, python_peak and rss_peak of the phase.
+        """
+        return {
+            "name": self.name,
+            "depth": self.depth,
+            "seconds": self.seconds,
+            "python_peak": self.python_peak,
+            "rss_peak": self.rss_peak,
+        }
+
+
+class Profiler:
+    """
+    Records the wall time and peak memory of each phase of a build. Phases are marked with
+    sihm.profile.phase, which does nothing unless a profiler is active, and may be nested.
+
+    Python allocations are traced with tracemalloc, which slows the Python parts of the build
+    down. On Linux, the resident set size of sihm and every process it launches is sampled in a
+    background thread, so short phases may miss their true peak. On other platforms, only
+    Python allocations are recorded.
+    """
+
+    def __init__(self, interval: float = 0.05) -> None:
+        """
+        Initialize the profiler.
+
+        Parameters
+        ----------
+        interval : float
+            Time in seconds between resident set size samples.
+        """
+        self.phases: List[ProfilePhase] = []
+        self.seconds: float = 0.0
+        self._interval = interval
+
+        # Phases that are running, from the outermost to the innermost
+        self._stack: List[ProfilePhase] = []
+        self._start: float = 0.0
+        self._tracing: bool = False
+        self._rss: bool = False
+        self._sampler: Any = None
+        self._stop: Any = None
+
+    def _sample(self) -> None:
+        """
+        Sample the resident set size into the running phases.
+        """
+        if not self._rss:
+            return
+        rss = _tree_rss(os.getpid())
+        if rss is None:
+            return
+        for p in list(self._stack):
+            p.rss_peak = max(p.rss_peak or 0, rss)
+
+    def _sample_loop(self) -> None:
+        """
+        Sample the resident set size until the profiler stops.
+        """
+        while not self._stop.wait(self._interval):
+            self._sample()
+
+    def _take_peak(self) -> int:
+        """
+        Get the peak traced memory since the last call, and reset it.
+
+        Returns
+        -------
+        int
+            Peak traced memory in bytes.
+        """
+        import tracemalloc
+
+        peak = tracemalloc.get_traced_memory()[1]
+        if hasattr(tracemalloc, "reset_peak"):
+            tracemalloc.reset_peak()
+        return peak
+
+    def __enter__(self) -> "Profiler":
+        import threading
+        import tracemalloc
+
+        global _active, _noted_no_rss
+        if _active is not None:
+            raise ValueError("Another profiler is already active.")
+        _active = self
+
+        self._tracing = not tracemalloc.is_tracing()
+        if self._tracing:
+            tracemalloc.start()
+        self._rss = _tree_rss(os.getpid()) is not None
+        if self._rss:
+            self._stop = threading.Event()
+            self._sampler = threading.Thread(target=self._sample_loop, daemon=True)
+            self._sampler.start()
+        elif not _noted_no_rss:
+            print(
+                "NOTE: The resident set size can only be sampled on Linux. Only Python allocations "
+                + "are profiled."
+            )
+            _noted_no_rss = True
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *args: Any) -> None:
+        import tracemalloc
+
+        global _active
+        self.seconds = time.perf_counter() - self._start
+        if self._sampler is not None:
+            self._stop.set()
+            self._sampler.join()
+            self._sampler = None
+        if self._tracing:
+            tracemalloc.stop()
+        _active = None
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[ProfilePhase]:
+        """
+        Record a phase. The peaks of a phase include those of the phases nested in it.
+
+        Parameters
+        ----------
+        name : str
+            Name of the phase.
+
+        Yields
+        ------
+        ProfilePhase
+            The phase, which is filled in when it ends.
+        """
+        p = ProfilePhase(name, len(self._stack))
+        self.phases.append(p)
+        if self._stack:
+            parent = self._stack[-1]
+            parent.python_peak = max(parent.python_peak, self._take_peak())
+        else:
+            self._take_peak()
+        self._stack.append(p)
+        self._sample()
+
+        start = time.perf_counter()
+        try:
+            yield p
+        finally:
+            p.seconds = time.perf_counter() - start
+            self._sample()
+            self._stack.pop()
+            p.python_peak = max(p.python_peak, self._take_peak())
+            if self._stack:
+                parent = self._stack[-1]
+                parent.python_peak = max(parent.python_peak, p.python_peak)
+                if p.rss_peak is not None:
+                    parent.rss_peak = max(parent.rss_peak or 0, p.rss_peak)
+
+    def print_report(self) -> None:
+        """
+        Print a table of the phases.
+        """
+
+        def size_str(n: Optional[int]) -> str:
+            if n is None:
+                return "-"
+            return f"{n / 1024:.1f} KB" if n < 1024**2 else f"{n / 1024**2:.1f} MB"
+
+        width = max([len("Total")] + [2 * p.depth + len(p.name) for p in self.phases])
+        print("Build profile:")
+        print(f"  {'Phase':<{width}}  {'Time':>10}  {'Python peak':>12}  {'RSS peak':>12}")
+        for p in self.phases:
+            name = "  " * p.depth + p.name
+            print(
+                f"  {name:<{width}}  {p.seconds:>8.3f} s  {size_str(p.python_peak):>12}  "
+                + f"{size_str(p.rss_peak):>12}"
+            )
+        print(f"  {'Total':<{width}}  {self.seconds:>8.3f} s")
+
+    def write_json(self, file: Union[str, Path]) -> None:
+        """
+        Write the phases as JSON, e.g., for a dashboard. Times are in seconds and peaks in
+        bytes. The rss_peak of a phase is null if it cannot be measured on this platform.
+
+        Parameters
+        ----------
+        file : Union[str, Path]
+            JSON file to write.
+        """
+        import json
+
+        with open(file, "w") as f:
+            json.dump(
+                {"seconds": self.seconds, "phases": [p.to_dict() for p in self.phases]},
+                f,
+                indent=2,
+            )
+
+
+@contextmanager
+def phase(name: str) -> Iterator[None]:
+    """
+    Mark a phase of the build for the active profiler, see Profiler. This does nothing if no
+    profiler is active.
+
+    Parameters
+    ----------
+    name : str
+        Name of the phase.
+    """
+    if _active is None:
+        yield
+    else:
+        with _active.phase(name):
+            yield
+
+
+def profiling() -> bool:
+    """
+    Check whether a profiler is active.
+
+    Returns
+    -------
+    bool
+        True if phases are being recorded, False otherwise.
+    """
+    return _active is not None
@@ -0,0 +1,106 @@
+from typing import Any
+import numpy as np
+from numpy.typing import NDArray
+from sihm.utils import inv_lerp, lerp, quat_slerp
+
+
+def uniform_times(times: NDArray[Any], rate: float) -> NDArray[Any]:
+    """
+    Create a time grid with a fixed rate that spans all given times, e.g., to resample the
+    output of a variable-step integrator at the display rate.
+
+    Parameters
+    ----------
+    times : NDArray[Any]
+        (T,) or (N, T) array of sample times.
+    rate : float
+        Samples per second.
+
+    Returns
+    -------
+    NDArray[Any]
+        (S,) array of times from the first to the last sample time. The last time is included
+        if it falls on the grid.
+    """
+    if rate <= 0.0:
+        raise ValueError(f"Got rate {rate}, but expected a positive number.")
+    times = np.asarray(times, dtype=np.float64)
+    start = np.min(times)
+    stop = np.max(times)
+    n = int(np.floor((stop - start) * rate + 1e-9)) + 1
+    return start + np.arange(n) / rate
+
+
+def resample(
+    times: NDArray[Any], values: NDArray[Any], new_times: NDArray[Any], quaternion: bool = False
+) -> NDArray[Any]:
+    """
+    Resample the tracks of many objects onto new times in one vectorized pass. Vectors are
+    interpolated linearly, and quaternions with slerp, like ThreeJS does. Times before the first
+    or after the last sample of a track hold the first or last value.
+
+    Parameters
+    ----------
+    times : NDArray[Any]
+        (T,) array of sample times shared by all tracks, or (N, T) array of the sample times of
+        each track. The times of each track must be sorted, but need not be evenly spaced.
+    values : NDArray[Any]
+        (T, D) array of the values of one track, or (N, T, D) array of the values of N tracks.
+        Quaternions are in xyzw order.
+    new_times : NDArray[Any]
+        (S,) array of times shared by all tracks, or (N, S) array of the times of each track.
+    quaternion : bool
+        Whether the values are quaternions.
+
+    Returns
+    -------
+    NDArray[Any]
+        (S, D) or (N, S, D) array of resampled values, matching the shape of values.
+    """
+    times = np.asarray(times, dtype=np.float64)
+    values = np.asarray(values, dtype=np.float64)
+    new_times = np.asarray(new_times, dtype=np.float64)
+
+    single = values.ndim == 2
+    if single:
+        values = values[None]
+    if values.ndim != 3:
+        raise ValueError(f"Expected values of shape (T, D) or (N, T, D), but got {values.shape}.")
+    n, t, d = values.shape
+    if quaternion and d != 4:
+        raise ValueError(f"Expected quaternions of size 4, but got {d}.")
+
+    times = np.broadcast_to(times, (n, t)) if times.ndim == 1 else times
+    if times.shape != (n, t):
+        raise ValueError(f"Got times of shape {times.shape} for values of shape {values.shape}.")
+    if np.any(np.diff(times, axis=1) < 0.0):
+        raise ValueError("The sample times of each track must be sorted.")
+    new_times = np.broadcast_to(new_times, (n, new_times.shape[-1]))
+
+    if t == 1:
+        out = np.broadcast_to(values, (n, new_times.shape[1], d)).copy()
+        return out[0] if single else out
+
+    # Locate all new times with a single search. Each track's times are mapped onto [2k, 2k + 1]
+    # with inv_lerp, so the tracks do not overlap when they are flattened.
+    t0 = times[:, :1]
+    t1 = np.where(times[:, -1:] > t0, times[:, -1:], t0 + 1.0)
+    offset = 2.0 * np.arange(n)[:, None]
+    keys = offset + inv_lerp(t0, t1, times)
+    queries = offset + np.clip(inv_lerp(t0, t1, new_times), 0.0, 1.0)
+    ind = np.searchsorted(keys.ravel(), queries.ravel(), side="right").reshape(queries.shape)
+    i0 = np.clip(ind - 1 - t * np.arange(n)[:, None], 0, t - 2)
+    i1 = i0 + 1
+
+    ta = np.take_along_axis(times, i0, axis=1)
+    tb = np.take_along_axis(times, i1, axis=1)
+    dt = tb - ta
+    u = np.divide(np.clip(new_times, ta, tb) - ta, dt, out=np.zeros_like(dt), where=dt > 0.0)
+
+    v0 = np.take_along_axis(values, i0[..., None], axis=1)
+    v1 = np.take_along_axis(values, i1[..., None], axis=1)
+    if quaternion:
+        out = quat_slerp(v0, v1, u)
+    else:
+        out = lerp(v0, v1, u[..., None])
+    return out[0] if single else out
@@ -0,0 +1,350 @@
+from copy import deepcopy
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Union
+
+# Geometry and material definitions use the same form as the GEOMETRY and MATERIAL sections
+# of a config file, e.g., {"FUNCTION": "SphereGeometry", "ARGS": [1, 30, 30]}. A path is
+# shorthand for {"FILE": path}.
+Definition = Union[str, Path, Dict[str, Any]]
+
+
+def _definition(definition: Optional[Definition]) -> Optional[Dict[str, Any]]:
+    """
+    Turn a geometry or material definition into its config form.
+
+    The parser modifies the arguments of some definitions in place, so a copy is returned.
+
+    Parameters
+    ----------
+    definition : Optional[Definition]
+        Geometry or material definition.
+
+    Returns
+    -------
+    Optional[Dict[str, Any]]
+        Definition in config form.
+    """
+    if definition is None:
+        return None
+    elif isinstance(definition, (str, Path)):
+        return {"FILE": str(definition)}
+    else:
+        return deepcopy(definition)
+
+
+class Track:
+    """
+    Keyframe track that animates a property of an object.
+
+    The times and values are kept by reference, so NumPy arrays are passed to the code
+    generator without being copied or converted to text first.
+    """
+
+    def __init__(
+        self, prop: str, times: Any, values: Any, interpolation: Optional[str] = None
+    ) -> None:
+        """
+        Create a keyframe track.
+
+        Parameters
+        ----------
+        prop : str
+            Property of the object to animate, e.g., "position" or "quaternion".
+        times : Any
+            (T,) array of keyframe times.
+        values : Any
+            (T, D) or flattened array of keyframe values. Quaternions are in xyzw order.
+        interpolation : Optional[str]
+            ThreeJS interpolation of the track, e.g., "THREE.InterpolateDiscrete". Defaults
+            to the ThreeJS default.
+        """
+        self.prop = prop
+        self.times = times
+        self.values = values
+        self.interpolation = interpolation
+
+    def to_config(self) -> List[Any]:
+        """
+        Get the track in config form.
+
+        Returns
+        -------
+        List[Any]
+            Track arguments.
+        """
+        args = [self.times, self.values]
+        if self.interpolation is not None:
+            args.append(self.interpolation)
+        return args
+
+
+class Object:
+    """
+    Object in the scene, i.e., an entry in the OBJECTS section of a config file.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        geometry: Optional[Definition] = None,
+        material: Optional[Definition] = None,
+        keyframe_tolerance: Union[None, float, Dict[str, float]] = None,
+    ) -> None:
+        """
+        Create an object.
+
+        Parameters
+        ----------
+        name : str
+            Name of the object. This must be a valid JavaScript variable name.
+        geometry : Optional[Definition]
+            Geometry of the object.
+        material : Optional[Definition]
+            Material of the object.
+        keyframe_tolerance : Union[None, float, Dict[str, float]]
+            Keyframe tolerance used to decimate the tracks of this object.
+        """
+        self.name = name
+        self.geometry = geometry
+        self.material = material
+        self.keyframe_tolerance = keyframe_tolerance
+        self.tracks: List[Track] = []
+        self.children: List["Object"] = []
+
+    def add_track(
+        self, prop: str, times: Any, values: Any, interpolation: Optional[str] = None
+    ) -> Track:
+        """
+        Add a keyframe track to the object.
+
+        Parameters
+        ----------
+        prop : str
+            Property of the object to animate, e.g., "position" or "quaternion".
+        times : Any
+            (T,) array of keyframe times.
+        values : Any
+            (T, D) or flattened array of keyframe values.
+        interpolation : Optional[str]
+            ThreeJS interpolation of the track.
+
+        Returns
+        -------
+        Track
+            The track that was added.
+        """
+        track = Track(prop, times, values, interpolation=interpolation)
+        self.tracks.append(track)
+        return track
+
+    def add_child(self, child: "Object") -> "Object":
+        """
+        Add a child to the object.
+
+        Parameters
+        ----------
+        child : Object
+            Child object. Its tracks are relative to this object.
+
+        Returns
+        -------
+        Object
+            The child that was added.
+        """
+        self.children.append(child)
+        return child
+
+    def to_config(self) -> Dict[str, Any]:
+        """
+        Get the object in config form.
+
+        Returns
+        -------
+        Dict[str, Any]
+            Object data.
+        """
+        obj: Dict[str, Any] = {}
+        if self.geometry is not None:
+            obj["GEOMETRY"] = _definition(self.geometry)
+        if self.material is not None:
+            obj["MATERIAL"] = _definition(self.material)
+        if self.keyframe_tolerance is not None:
+            obj["KEYFRAME_TOLERANCE"] = self.keyframe_tolerance
+        if self.tracks:
+            obj["ANIMATIONS"] = {track.prop: track.to_config() for track in self.tracks}
+        if self.children:
+            obj["CHILDREN"] = {child.name: child.to_config() for child in self.children}
+        return obj
+
+
+class Light:
+    """
+    Light in the scene, i.e., an entry in the LIGHTS section of a config file.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        function: str,
+        args: Optional[List[Any]] = None,
+        position: Optional[List[float]] = None,
+    ) -> None:
+        """
+        Create a light.
+
+        Parameters
+        ----------
+        name : str
+            Name of the light.
+        function : str
+            ThreeJS light class, e.g., "HemisphereLight".
+        args : Optional[List[Any]]
+            Arguments of the light class.
+        position : Optional[List[float]]
+            Position of the light.
+        """
+        self.name = name
+        self.function = function
+        self.args = args if args is not None else []
+        self.position = position
+
+    def to_config(self) -> Dict[str, Any]:
+        """
+        Get the light in config form.
+
+        Returns
+        -------
+        Dict[str, Any]
+            Light data.
+        """
+        light: Dict[str, Any] = {"FUNCTION": self.function, "ARGS": list(self.args)}
+        if self.position is not None:
+            light["POSITION"] = list(self.position)
+        return light
+
+
+class Scene:
+    """
+    Programmatic alternative to a config file.
+
+    The scene is handed to the code generator directly, so there is no need to write the
+    data to a config file and parse it back.
+
+    Examples
+    --------
+    >>> scene = Scene(background="rgb(167, 199, 231)", track_encoding="float32")
+    >>> scene.add(Light("l1", "HemisphereLight", [0xFFFFFF, 0x444444], position=[0, 20, 0]))
+    >>> ball = scene.add(Object("ball", geometry="sphere.obj", material="sphere.mtl"))
+    >>> ball.add_track("position", time, pos)
+    >>> scene.write_html("ball.html")
+    """
+
+    def __init__(
+        self,
+        base_dir: Union[None, str, Path] = None,
+        background: Any = None,
+        **options: Any,
+    ) -> None:
+        """
+        Create a scene.
+
+        Parameters
+        ----------
+        base_dir : Union[None, str, Path]
+            Directory that relative file paths are relative to. Defaults to the current
+            working directory.
+        background : Any
+            Background of the scene. See the background property of the SCENE section.
+        **options : Any
+            Options of the SIHM section, e.g., show_stats=True.
+        """
+        self.base_dir = Path(base_dir) if base_dir is not None else Path.cwd()
+        self.properties: Dict[str, Any] = {}
+        if background is not None:
+            self.properties["background"] = background
+        self.options: Dict[str, Any] = options
+        self.objects: List[Object] = []
+        self.lights: List[Light] = []
+
+    def add(self, item: Union[Object, Light]) -> Union[Object, Light]:
+        """
+        Add an object or light to the scene.
+
+        Parameters
+        ----------
+        item : Union[Object, Light]
+            Object or light to add.
+
+        Returns
+        -------
+        Union[Object, Light]
+            The object or light that was added.
+        """
+        if isinstance(item, Light):
+            self.lights.append(item)
+        elif isinstance(item, Object):
+            self.objects.append(item)
+        else:
+            raise TypeError(f"Expected an Object or Light, but got {type(item)}.")
+        return item
+
+    def to_config(self) -> Dict[str, Any]:
+        """
+        Get the scene in config form. Track data is not copied.
+
+        Returns
+        -------
+        Dict[str, Any]
+            Config data.
+        """
+        return {
+            "SIHM": dict(self.options),
+            "SCENE": dict(self.properties),
+            "OBJECTS": {obj.name: obj.to_config() for obj in self.objects},
+            "LIGHTS": {light.name: light.to_config() for light in self.lights},
+        }
+
+    def write_project(self, directory: Union[str, Path]) -> None:
+        """
+        Create the yarn project used to compile the standalone HTML.
+
+        Parameters
+        ----------
+        directory : Union[str, Path]
+            Directory where the project should be created.
+        """
+        from sihm.build import make_project
+
+        make_project(self.to_config(), Path(directory), cfg_path=self.base_dir)
+
+    def write_html(
+        self,
+        html_file: Union[str, Path],
+        jobs: int = 1,
+        workspace: bool = True,
+        prebuilt: bool = True,
+    ) -> None:
+        """
+        Create the standalone HTML file.
+
+        Parameters
+        ----------
+        html_file : Union[str, Path]
+            Location of the HTML file.
+        jobs : int
+            Number of cores to use when building the project.
+        workspace : bool
+            Whether to reuse a persistent node workspace, see sihm.workspace.node_workspace.
+        prebuilt : bool
+            Whether to link the scene against the prebuilt runtime when possible, see sihm.link.
+        """
+        from sihm.build import build_html
+
+        build_html(
+            self.to_config(),
+            Path(html_file).resolve(),
+            jobs=jobs,
+            cfg_path=self.base_dir,
+            workspace=workspace,
+            prebuilt=prebuilt,
+        )
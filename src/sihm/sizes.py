@@ -0,0 +1,179 @@
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Union
+
+
+def _size_str(n: float) -> str:
+    """
+    Format a size in bytes.
+
+    Parameters
+    ----------
+    n : float
+        Size in bytes.
+
+    Returns
+    -------
+    str
+        Size in B, KB or MB.
+    """
+    if n < 1024:
+        return f"{n:.0f} B"
+    return f"{n / 1024:.1f} KB" if n < 1024**2 else f"{n / 1024**2:.1f} MB"
+
+
+class SizeManifest:
+    """
+    Bytes of a scene attributed to the parts that created them. The parser adds the code of each
+    object's geometry, material and keyframe tracks, and each SIHM_EXTRA_* module along with
+    the objects that use it. Objects are keyed on their path from the scene, e.g.,
+    "parent/child". Whatever is left of the output, e.g., the runtime, boilerplate and lights,
+    is attributed to the runtime.
+
+    Sizes are measured before webpack bundles and minifies the scene, while the total is the
+    size of the bundled output. The code of small objects is therefore overestimated, and the
+    runtime underestimated. Encoded assets, which make up most of a large scene, are kept as
+    they are.
+    """
+
+    def __init__(self) -> None:
+        """
+        Initialize the manifest.
+        """
+        # Bytes of the parts of each object keyed on the path of the object and the part, e.g.,
+        # "geometry" or "track position"
+        self.objects: Dict[str, Dict[str, float]] = {}
+
+        # Bytes of each module and the objects that use it keyed on the module name
+        self.modules: Dict[str, int] = {}
+        self.module_objects: Dict[str, List[str]] = {}
+
+        # Parts that are written to the payload of a payload scene, which may be compressed as a
+        # whole. These are scaled by payload_scale.
+        self._payload_parts: List[List[Any]] = []
+        self.payload_scale: float = 1.0
+
+    def add(self, obj: str, part: str, size: int, payload: bool = False) -> None:
+        """
+        Add bytes to a part of an object.
+
+        Parameters
+        ----------
+        obj : str
+            Path of the object, e.g., "parent/child".
+        part : str
+            Name of the part.
+        size : int
+            Number of bytes.
+        payload : bool
+            Whether the bytes are written to the payload of a payload scene.
+        """
+        if size <= 0:
+            return
+        if payload:
+            self._payload_parts.append([obj, part, size])
+            return
+        parts = self.objects.setdefault(obj, {})
+        parts[part] = parts.get(part, 0) + size
+
+    def add_module(self, name: str, size: int) -> None:
+        """
+        Add a SIHM_EXTRA_* module.
+
+        Parameters
+        ----------
+        name : str
+            Name of the module.
+        size : int
+            Size of the module file in bytes.
+        """
+        self.modules[name] = size
+        self.module_objects.setdefault(name, [])
+
+    def use(self, name: str, obj: Optional[str]) -> None:
+        """
+        Record that an object uses a module.
+
+        Parameters
+        ----------
+        name : str
+            Name of the module.
+        obj : Optional[str]
+            Path of the object, or None for the scene itself, e.g., its background.
+        """
+        users = self.module_objects.setdefault(name, [])
+        obj = "SCENE" if obj is None else obj
+        if obj not in users:
+            users.append(obj)
+
+    def report(self, total: int, file: Optional[Union[str, Path]] = None) -> Dict[str, Any]:
+        """
+        Create the report of the manifest. The objects and modules are sorted by size, largest
+        first, so the report starts with what to decimate or compress.
+
+        Parameters
+        ----------
+        total : int
+            Size of the output in bytes.
+        file : Optional[Union[str, Path]]
+            Output file, which is only recorded in the report.
+
+        Returns
+        -------
+        Dict[str, Any]
+            Report that can be serialized as JSON. Sizes are in bytes.
+        """
+        objects: Dict[str, Dict[str, float]] = {k: dict(parts) for k, parts in self.objects.items()}
+        for obj, part, size in self._payload_parts:
+            parts = objects.setdefault(obj, {})
+            parts[part] = parts.get(part, 0) + size * self.payload_scale
+
+        object_report = {
+            k: {
+                "total": round(sum(parts.values())),
+                "parts": {p: round(v) for p, v in parts.items()},
+            }
+            for k, parts in objects.items()
+        }
+        module_report = {
+            k: {"total": size, "objects": self.module_objects[k]}
+            for k, size in self.modules.items()
+        }
+        attributed = sum(v["total"] for v in object_report.values()) + sum(self.modules.values())
+        return {
+            "file": None if file is None else str(file),
+            "total": total,
+            "runtime": max(total - attributed, 0),
+            "objects": dict(sorted(object_report.items(), key=lambda x: -x[1]["total"])),
+            "modules": dict(sorted(module_report.items(), key=lambda x: -x[1]["total"])),
+        }
+
+
+def print_size_manifest(report: Dict[str, Any]) -> None:
+    """
+    Print a size manifest report.
+
+    Parameters
+    ----------
+    report : Dict[str, Any]
+        Report, see SizeManifest.report.
+    """
+    total = report["total"]
+
+    def row(name: str, size: float, extra: str = "") -> str:
+        percent = 100.0 * size / total if total else 0.0
+        return f"  {name:<40} {_size_str(size):>10} {percent:>6.1f}%{extra}"
+
+    name = "" if report["file"] is None else f" of {Path(report['file']).name}"
+    print(f"Size manifest{name} ({_size_str(total)}):")
+    if report["objects"]:
+        print("  Objects:")
+        for obj, entry in report["objects"].items():
+            print(row("  " + obj, entry["total"]))
+            for part, size in sorted(entry["parts"].items(), key=lambda x: -x[1]):
+                print(row("    " + part, size))
+    if report["modules"]:
+        print("  Modules:")
+        for module, entry in report["modules"].items():
+            users = ", ".join(entry["objects"])
+            print(row("  " + module, entry["total"], f"  ({users})" if users else ""))
+    print(row("Runtime and boilerplate", report["runtime"]))
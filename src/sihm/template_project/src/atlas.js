@@ -0,0 +1,19 @@
+/**
+ * Remaps the texture coordinates of a built-in geometry into the rectangle a texture occupies
+ * in a texture atlas. The texture coordinates of OBJ geometries are remapped by sihm when they
+ * are embedded, so only the geometries three.js creates are remapped when the scene loads.
+ * Texture coordinates outside [0, 1] would end up outside the rectangle, so sihm does not pack
+ * the maps of geometries that have them.
+ * @param geometry {THREE.BufferGeometry} - Geometry to remap.
+ * @param rect {number[]} - Offset and scale of the rectangle, [u0, v0, su, sv].
+ */
+export function remapUVs(geometry, rect) {
+    const uv = geometry.getAttribute("uv");
+    if (uv !== undefined) {
+        for (let k = 0; k < uv.count; k++) {
+            uv.setXY(k, uv.getX(k) * rect[2] + rect[0], uv.getY(k) * rect[3] + rect[1]);
+        }
+        uv.needsUpdate = true;
+    }
+    return geometry;
+}
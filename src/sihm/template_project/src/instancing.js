@@ -0,0 +1,69 @@
+import * as THREE from "three";
+/**
+ * Group of instanced meshes that draws many objects sharing a geometry and material in one draw
+ * call per mesh. Each instance is represented by a plain Object3D, which is added to the scene
+ * graph like any other object, so it can be animated by the mixer and followed by the camera.
+ * The instance matrices are synced with these objects right before the meshes are rendered.
+ */
+export class MyInstances extends THREE.Group {
+    /** Class constructor
+     * @param template {THREE.BufferGeometry | THREE.Object3D} Geometry of the instances, or an
+     * object, e.g., created by the OBJ loader, whose meshes are instanced.
+     * @param material {THREE.Material | null} Material of the instances. If null, the materials
+     * of the template are used.
+     * @param count {number} Maximum number of instances.
+     */
+    constructor(template, material, count) {
+        super();
+        /** Objects whose transforms drive the instances. */
+        this.instances = [];
+        /** Instanced meshes, one for each mesh of the template. */
+        this.meshes = [];
+        if (template instanceof THREE.Object3D) {
+            template.updateMatrixWorld(true);
+            template.traverse((child) => {
+                if (child instanceof THREE.Mesh) {
+                    this.addMesh(child.geometry, material !== null && material !== void 0 ? material : child.material, child.matrixWorld, count);
+                }
+            });
+        }
+        else {
+            this.addMesh(template, material !== null && material !== void 0 ? material : new THREE.MeshBasicMaterial(), new THREE.Matrix4(), count);
+        }
+    }
+    /** Adds an instanced mesh to the group.
+     * @param geometry {THREE.BufferGeometry} Geometry of the mesh.
+     * @param material {THREE.Material | THREE.Material[]} Material of the mesh.
+     * @param matrix {THREE.Matrix4} Transform of the mesh relative to the instances.
+     * @param count {number} Maximum number of instances.
+     */
+    addMesh(geometry, material, matrix, count) {
+        const mesh = new THREE.InstancedMesh(geometry, material, count);
+        const local = matrix.clone();
+        const instance_matrix = new THREE.Matrix4();
+        // The instances move independently, so the bounds of the mesh change every frame
+        mesh.frustumCulled = false;
+        mesh.instanceMatrix.setUsage(THREE.DynamicDrawUsage);
+        mesh.count = 0;
+        // The instances are siblings of this group, which has an identity transform, so their
+        // local matrices are the instance matrices. These are up to date by the time the mesh is
+        // rendered, since the renderer updates the world matrices of the scene first.
+        mesh.onBeforeRender = () => {
+            mesh.count = this.instances.length;
+            for (let k = 0; k < this.instances.length; k++) {
+                mesh.setMatrixAt(k, instance_matrix.multiplyMatrices(this.instances[k].matrix, local));
+            }
+            mesh.instanceMatrix.needsUpdate = true;
+        };
+        this.meshes.push(mesh);
+        this.add(mesh);
+    }
+    /** Adds an instance. The instance must be added to the same parent as this group.
+     * @returns {THREE.Object3D} Object whose transform drives the instance.
+     */
+    addInstance() {
+        const instance = new THREE.Object3D();
+        this.instances.push(instance);
+        return instance;
+    }
+}
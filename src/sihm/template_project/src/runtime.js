@@ -0,0 +1,34 @@
+import * as THREE from "three";
+import { OrbitControls } from "three/examples/jsm/controls/OrbitControls";
+import { OBJLoader } from "three/examples/jsm/loaders/OBJLoader";
+import { MTLLoader } from "three/examples/jsm/loaders/MTLLoader";
+import * as animator from "./animator";
+import * as atlas from "./atlas";
+import * as camera from "./camera";
+import * as decode from "./decode";
+import * as gui from "./gui";
+import * as instancing from "./instancing";
+import * as loader from "./loader";
+import * as mesh from "./mesh";
+/**
+ * Entry point of the prebuilt runtime. This bundles everything a scene without extra modules
+ * needs, and exposes it as the SIHM global. When sihm links a scene against the prebuilt
+ * runtime, each import in the scene is replaced by a lookup in SIHM.modules, so the keys
+ * must match the specifiers the scene imports with, see RUNTIME_MODULES in sihm/link.py.
+ */
+window.SIHM = {
+    modules: {
+        three: THREE,
+        "three/examples/jsm/controls/OrbitControls": { OrbitControls },
+        "three/examples/jsm/loaders/OBJLoader": { OBJLoader },
+        "three/examples/jsm/loaders/MTLLoader": { MTLLoader },
+        "./animator": animator,
+        "./atlas": atlas,
+        "./camera": camera,
+        "./decode": decode,
+        "./gui": gui,
+        "./instancing": instancing,
+        "./loader": loader,
+        "./mesh": mesh,
+    },
+};
@@ -0,0 +1,313 @@
+from io import BytesIO
+from pathlib import Path
+from threading import Lock
+from typing import Any, Dict, List, Tuple, Union, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from PIL import Image
+
+# Formats textures can be re-encoded to
+TEXTURE_FORMATS = ("png", "jpeg", "webp")
+
+# Quality used for JPEG and WebP when none is given
+DEFAULT_QUALITY = 85
+
+# Maximum number of pixels of a texture when none is given. This is the size above which Pillow
+# refuses to open images, since they may be decompression bombs.
+DEFAULT_MAX_PIXELS = 2 * (1024**3 // 4 // 3)
+
+# Guards Pillow's global limit on the number of pixels while open_image replaces it
+_PIXEL_LIMIT_LOCK = Lock()
+
+# Report entry of an optimized texture: file, original and new size in pixels, and original and
+# new size in bytes
+TextureReportEntry = Tuple[str, Tuple[int, int], Tuple[int, int], int, int]
+
+
+def texture_options(options: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Validate texture options. The options are:
+
+    * max_size: Maximum width and height in pixels. Larger textures are downscaled, keeping
+      their aspect ratio.
+    * power_of_two: Whether to snap the width and height to the nearest power of two that does
+      not exceed max_size.
+    * format: Format to re-encode to, one of TEXTURE_FORMATS. Defaults to the original format.
+    * quality: Quality of JPEG and WebP, from 1 to 100.
+    * max_pixels: Maximum number of pixels of an image sihm opens. Defaults to
+      DEFAULT_MAX_PIXELS, which guards against decompression bombs. Raise it for larger images
+      that are trusted.
+
+    Keys are case-insensitive, so the options of a material map can be given in upper case like
+    the rest of the OBJECTS section.
+
+    Parameters
+    ----------
+    options : Dict[str, Any]
+        Texture options.
+
+    Returns
+    -------
+    Dict[str, Any]
+        Validated options with lower case keys.
+    """
+    result = {}
+    for k, v in options.items():
+        k = k.lower()
+        if k == "max_size":
+            if not isinstance(v, int) or isinstance(v, bool) or v < 1:
+                raise ValueError(f"Got max_size {v}, but expected a positive integer.")
+        elif k == "power_of_two":
+            v = bool(v)
+        elif k == "format":
+            v = "jpeg" if v == "jpg" else v
+            if v not in TEXTURE_FORMATS:
+                raise ValueError(
+                    f"Unknown texture format {v}. Expected one of "
+                    + ", ".join(TEXTURE_FORMATS)
+                    + "."
+                )
+        elif k == "quality":
+            if not isinstance(v, int) or isinstance(v, bool) or not 1 <= v <= 100:
+                raise ValueError(f"Got quality {v}, but expected an integer from 1 to 100.")
+        elif k == "max_pixels":
+            if not isinstance(v, int) or isinstance(v, bool) or v < 1:
+                raise ValueError(f"Got max_pixels {v}, but expected a positive integer.")
+        else:
+            raise ValueError(
+                f"Unknown texture option {k}. Expected one of max_size, power_of_two, format, "
+                + "quality, max_pixels."
+            )
+        result[k] = v
+    return result
+
+
+def _snap_power_of_two(n: int, max_size: int) -> int:
+    """
+    Snap a size to the nearest power of two that does not exceed the maximum size.
+
+    Parameters
+    ----------
+    n : int
+        Size in pixels.
+    max_size : int
+        Maximum size in pixels.
+
+    Returns
+    -------
+    int
+        Snapped size.
+    """
+    lower = 1 << (n.bit_length() - 1)
+    snapped = lower if n - lower < 2 * lower - n else 2 * lower
+    while snapped > max(max_size, 1) and snapped > 1:
+        snapped //= 2
+    return snapped
+
+
+def target_size(size: Tuple[int, int], options: Dict[str, Any]) -> Tuple[int, int]:
+    """
+    Get the size a texture is resized to.
+
+    Parameters
+    ----------
+    size : Tuple[int, int]
+        Width and height of the texture.
+    options : Dict[str, Any]
+        Texture options, see texture_options.
+
+    Returns
+    -------
+    Tuple[int, int]
+        New width and height.
+    """
+    width, height = size
+    max_size = options.get("max_size", None)
+    if max_size is not None and max(width, height) > max_size:
+        scale = max_size / max(width, height)
+        width = max(1, round(width * scale))
+        height = max(1, round(height * scale))
+    if options.get("power_of_two", False):
+        limit = max_size if max_size is not None else max(width, height) * 2
+        width = _snap_power_of_two(width, limit)
+        height = _snap_power_of_two(height, limit)
+    return width, height
+
+
+def open_image(
+    img_file: Union[Path, BytesIO], options: Dict[str, Any], name: str = ""
+) -> "Image.Image":
+    """
+    Open an image, refusing images with more pixels than the max_pixels option allows. This
+    replaces Pillow's own limit, so trusted images can be larger than Pillow allows by default.
+
+    Parameters
+    ----------
+    img_file : Union[Path, BytesIO]
+        Image file, or its data.
+    options : Dict[str, Any]
+        Texture options, see texture_options.
+    name : str
+        Name of the image used in errors. Defaults to img_file.
+
+    Returns
+    -------
+    Image.Image
+        PIL image. Its pixels are loaded lazily.
+    """
+    from PIL import Image
+
+    with _PIXEL_LIMIT_LOCK:
+        limit = Image.MAX_IMAGE_PIXELS
+        Image.MAX_IMAGE_PIXELS = None
+        try:
+            img = Image.open(img_file)
+        finally:
+            Image.MAX_IMAGE_PIXELS = limit
+
+    max_pixels = options.get("max_pixels", DEFAULT_MAX_PIXELS)
+    if img.width * img.height > max_pixels:
+        img.close()
+        raise ValueError(
+            f"{name or img_file} is {img.width}x{img.height} pixels, which is more than the "
+            + f"{max_pixels} pixels the max_pixels texture option allows. Images this large may be "
+            + "decompression bombs. If the image is trusted, raise max_pixels."
+        )
+    return img
+
+
+def normalize_mode(img: "Image.Image") -> "Image.Image":
+    """
+    Convert an image to RGB, or to RGBA if it has transparency, so it can be resized smoothly
+    and encoded in any of TEXTURE_FORMATS. Grayscale images without transparency are kept.
+
+    Parameters
+    ----------
+    img : Image.Image
+        PIL image.
+
+    Returns
+    -------
+    Image.Image
+        Converted image.
+    """
+    if img.mode in ("RGB", "RGBA", "L"):
+        return img
+    has_alpha = img.mode in ("LA", "PA") or "transparency" in img.info
+    return img.convert("RGBA" if has_alpha else "RGB")
+
+
+def encode_image(img: "Image.Image", fmt: str, quality: int, name: str) -> Tuple[bytes, str]:
+    """
+    Encode an image. Images with transparent pixels are encoded as PNG rather than JPEG, since
+    JPEG cannot hold an alpha channel.
+
+    Parameters
+    ----------
+    img : Image.Image
+        PIL image.
+    fmt : str
+        Format to encode to, one of TEXTURE_FORMATS.
+    quality : int
+        Quality of JPEG and WebP, from 1 to 100.
+    name : str
+        Name of the image used in warnings.
+
+    Returns
+    -------
+    Tuple[bytes, str]
+        Encoded image and its format.
+    """
+    img = normalize_mode(img)
+    if fmt == "jpeg" and img.mode == "RGBA":
+        if img.getchannel("A").getextrema()[0] < 255:
+            print(
+                f"WARNING: {name} has an alpha channel, which JPEG cannot hold. Using PNG instead."
+            )
+            fmt = "png"
+        else:
+            img = img.convert("RGB")
+
+    out = BytesIO()
+    if fmt == "png":
+        img.save(out, format="PNG", optimize=True)
+    else:
+        img.save(out, format=fmt.upper(), quality=quality)
+    return out.getvalue(), fmt
+
+
+def encode_texture(
+    img_file: Path, options: Dict[str, Any]
+) -> Tuple[bytes, str, TextureReportEntry]:
+    """
+    Resize and re-encode a texture. The original file is returned as is if the options do not
+    change it, or if re-encoding it in its own format at its own size does not make it smaller.
+
+    Parameters
+    ----------
+    img_file : Path
+        Image file of the texture.
+    options : Dict[str, Any]
+        Texture options, see texture_options.
+
+    Returns
+    -------
+    Tuple[bytes, str, TextureReportEntry]
+        Encoded image, its format as used in the MIME type, and the report entry of the texture.
+    """
+    from PIL import Image
+
+    with open(img_file, "rb") as f:
+        original = f.read()
+    original_format = img_file.suffix[1:]
+
+    img = open_image(BytesIO(original), options, str(img_file))
+    size = img.size
+    new_size = target_size(size, options)
+    fmt = options.get("format", None)
+    if fmt is None:
+        fmt = (img.format or original_format).lower()
+        if fmt not in TEXTURE_FORMATS:
+            # Formats sihm does not re-encode are only resized, and stored as PNG
+            fmt = "png" if new_size != size else None
+
+    same_format = fmt is None or fmt == (img.format or "").lower()
+    if fmt is None or (new_size == size and same_format and "quality" not in options):
+        return original, original_format, (str(img_file), size, size, len(original), len(original))
+
+    if new_size != size:
+        img = normalize_mode(img).resize(new_size, Image.LANCZOS)
+    data, fmt = encode_image(img, fmt, options.get("quality", DEFAULT_QUALITY), str(img_file))
+
+    if new_size == size and same_format and len(data) >= len(original):
+        return original, original_format, (str(img_file), size, size, len(original), len(original))
+    return data, fmt, (str(img_file), size, new_size, len(original), len(data))
+
+
+def print_texture_report(entries: List[TextureReportEntry]) -> None:
+    """
+    Print the bytes saved by optimizing textures.
+
+    Parameters
+    ----------
+    entries : List[TextureReportEntry]
+        Report entries of the optimized textures.
+    """
+    if not entries:
+        return
+
+    def size_str(n: int) -> str:
+        return f"{n / 1024:.1f} KB" if n < 1024**2 else f"{n / 1024**2:.1f} MB"
+
+    print("Texture optimization:")
+    for file, size, new_size, n_bytes, new_bytes in entries:
+        saved = size_str(n_bytes - new_bytes)
+        print(
+            f"  {Path(file).name}: {size[0]}x{size[1]} -> {new_size[0]}x{new_size[1]}, "
+            + f"{size_str(n_bytes)} -> {size_str(new_bytes)} (saved {saved})"
+        )
+    total = sum(e[3] for e in entries)
+    new_total = sum(e[4] for e in entries)
+    print(
+        f"  Total: {size_str(total)} -> {size_str(new_total)} (saved {size_str(total - new_total)})"
+    )
@@ -0,0 +1,503 @@
+import json
+from base64 import b64encode
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, TextIO, Tuple, Union
+import numpy as np
+from numpy.typing import NDArray
+from sihm.utils import lerp, quat_slerp
+
+# Map from the track_encoding option to the little-endian dtype and JS decoder function.
+TRACK_ENCODINGS: Dict[str, str] = {"float32": "<f4", "float64": "<f8"}
+TRACK_DECODERS: Dict[str, str] = {"float32": "decodeFloat32Array", "float64": "decodeFloat64Array"}
+
+# Number of array elements encoded per chunk when streaming data to a file. This is a
+# multiple of 3 so that each chunk of float32/float64 bytes encodes to whole base64 groups.
+CHUNK_SIZE = 3 * 2**16
+
+
+def track_to_array(data: Any) -> NDArray[Any]:
+    """
+    Convert the times or values of a keyframe track into a flat array.
+
+    Parameters
+    ----------
+    data : Any
+        Track data. This can be a list of numbers, a string holding a JavaScript array
+        literal, e.g., "[0.0, 1.0, 2.0]", or an array. Floating point arrays are used as is, so
+        no copy is made if they are C-contiguous, e.g., memory-mapped npy files written from
+        C-ordered arrays. Other arrays are copied into row-major order.
+
+    Returns
+    -------
+    NDArray[Any]
+        Flattened track data.
+    """
+    if isinstance(data, str):
+        data = json.loads(data)
+    arr = np.asarray(data)
+    if arr.dtype.kind != "f":
+        arr = arr.astype(np.float64)
+    return arr.reshape(-1)
+
+
+def _load_npz_member(file: Path, key: str) -> NDArray[Any]:
+    """
+    Load an array from an npz file.
+
+    NumPy does not memory map arrays stored in npz files. However, npz files written with
+    np.savez store their arrays uncompressed, so those arrays are memory mapped here directly
+    from their location in the zip file. Arrays from compressed files are loaded into memory.
+
+    Parameters
+    ----------
+    file : Path
+        npz file.
+    key : str
+        Name of the array in the npz file.
+
+    Returns
+    -------
+    NDArray[Any]
+        Memory-mapped or loaded array.
+    """
+    import struct
+    import zipfile
+
+    with zipfile.ZipFile(file) as z:
+        try:
+            info = z.getinfo(key + ".npy")
+        except KeyError:
+            raise ValueError(f"Array {key} not found in {file}.")
+        if info.compress_type != zipfile.ZIP_STORED:
+            with z.open(info) as f:
+                return np.lib.format.read_array(f)
+
+    with open(file, "rb") as f:
+        # Skip the local file header of the zip entry to get to the npy data
+        f.seek(info.header_offset)
+        header = f.read(30)
+        name_len, extra_len = struct.unpack("<HH", header[26:30])
+        f.seek(info.header_offset + 30 + name_len + extra_len)
+        version = np.lib.format.read_magic(f)
+        if version == (1, 0):
+            shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(f)
+        else:
+            shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(f)
+        offset = f.tell()
+
+    return np.memmap(
+        file, dtype=dtype, mode="r", shape=shape, order="F" if fortran_order else "C", offset=offset
+    )
+
+
+def track_files(track: Dict[str, Any], cfg_path: Path) -> List[Path]:
+    """
+    Get the files a keyframe track stored in npy or npz files is read from.
+
+    Parameters
+    ----------
+    track : Dict[str, Any]
+        Track description, see load_track_file.
+    cfg_path : Path
+        Directory that relative file paths are relative to.
+
+    Returns
+    -------
+    List[Path]
+        Files of the track.
+    """
+    if track.get("FILE", None):
+        return [cfg_path.joinpath(Path(track["FILE"]))]
+    else:
+        return [cfg_path.joinpath(Path(track[k])) for k in ("TIME", "VALUES") if k in track]
+
+
+def load_track_file(track: Dict[str, Any], cfg_path: Path) -> List[Any]:
+    """
+    Load a keyframe track that is stored in npy or npz files.
+
+    The track is given as a dictionary with the keys:
+    * FILE - npz file that holds the arrays. If omitted, TIME and VALUES are npy files.
+    * TIME - Name of the (T,) array of times in the npz file, or npy file of times.
+    * VALUES - Name of the (T, D) array of values in the npz file, or npy file of values.
+    * INTERPOLATION - Optional ThreeJS interpolation of the track.
+    Arrays are memory mapped where possible, so they are only read as they are written out.
+
+    Parameters
+    ----------
+    track : Dict[str, Any]
+        Track description.
+    cfg_path : Path
+        Directory that relative file paths are relative to.
+
+    Returns
+    -------
+    List[Any]
+        Track arguments: the times, the values, and the interpolation if it was given.
+    """
+    for k in ("TIME", "VALUES"):
+        if k not in track:
+            raise ValueError(f"Track files must give {k}, but got {track}.")
+
+    if track.get("FILE", None):
+        file = cfg_path.joinpath(Path(track["FILE"]))
+        times = _load_npz_member(file, track["TIME"])
+        values = _load_npz_member(file, track["VALUES"])
+    else:
+        times = np.load(cfg_path.joinpath(Path(track["TIME"])), mmap_mode="r")
+        values = np.load(cfg_path.joinpath(Path(track["VALUES"])), mmap_mode="r")
+
+    if values.size % max(times.size, 1) or (values.ndim > 1 and values.shape[0] != times.size):
+        raise ValueError(
+            f"Expected the track values to have shape ({times.size}, D), but got {values.shape}."
+        )
+
+    # Keyframes are written in row-major order, so arrays stored in another order are read into
+    # memory when they are flattened
+    for k, arr in (("TIME", times), ("VALUES", values)):
+        if isinstance(arr, np.memmap) and not arr.flags.c_contiguous:
+            print(
+                f"WARNING: The {k} array of {track} is not stored in C order, so it is read "
+                + "into memory. Save it with np.ascontiguousarray to memory map it."
+            )
+
+    args = [times, values]
+    if track.get("INTERPOLATION", None):
+        args.append(track["INTERPOLATION"])
+    return args
+
+
+def write_base64(f: TextIO, arr: NDArray[Any], encoding: str) -> None:
+    """
+    Write an array to a file as base64-encoded, little-endian binary data.
+
+    The array is encoded in chunks, so the encoded copy of the data never has to be held in
+    memory all at once.
+
+    Parameters
+    ----------
+    f : TextIO
+        File to write to.
+    arr : NDArray[Any]
+        Flat array to encode.
+    encoding : str
+        One of the keys of TRACK_ENCODINGS.
+    """
+    for chunk in _binary_chunks(arr, encoding):
+        f.write(b64encode(chunk).decode("ascii"))
+
+
+def _binary_chunks(arr: NDArray[Any], encoding: str) -> Iterator[bytes]:
+    """
+    Convert an array to little-endian binary data one chunk at a time.
+
+    Parameters
+    ----------
+    arr : NDArray[Any]
+        Flat array to convert.
+    encoding : str
+        One of the keys of TRACK_ENCODINGS.
+
+    Returns
+    -------
+    Iterator[bytes]
+        Binary data of each chunk of CHUNK_SIZE elements.
+    """
+    dtype = TRACK_ENCODINGS[encoding]
+    for k in range(0, arr.size, CHUNK_SIZE):
+        yield np.ascontiguousarray(arr[k : k + CHUNK_SIZE], dtype=dtype).tobytes()
+
+
+def write_decoded_array(f: TextIO, arr: NDArray[Any], encoding: str) -> None:
+    """
+    Write a JavaScript expression that decodes the array into a typed array.
+
+    Parameters
+    ----------
+    f : TextIO
+        File to write to.
+    arr : NDArray[Any]
+        Flat array to encode.
+    encoding : str
+        One of the keys of TRACK_ENCODINGS.
+    """
+    f.write(f'{TRACK_DECODERS[encoding]}("')
+    write_base64(f, arr, encoding)
+    f.write('")')
+
+
+def write_compressed_array(f: TextIO, arr: NDArray[Any], encoding: str, level: int) -> None:
+    """
+    Write a JavaScript expression that decompresses the array when the scene loads, see
+    sihm.compress. Binary encodings are decoded into a typed array, and text into an array.
+    This must be written where top-level await can be used.
+
+    Parameters
+    ----------
+    f : TextIO
+        File to write to.
+    arr : NDArray[Any]
+        Flat array to encode. Arrays with the text encoding must be finite, since JSON cannot
+        hold other values.
+    encoding : str
+        text, or one of the keys of TRACK_ENCODINGS.
+    level : int
+        zlib compression level.
+    """
+    from sihm.compress import Base64Deflater
+
+    deflater = Base64Deflater(f, level)
+    if encoding == "text":
+        f.write('JSON.parse(await decompressText("')
+        write_text_array(deflater, arr, allow_nan=False)
+    else:
+        f.write(f'{TRACK_DECODERS[encoding]}(await decompress("')
+        for chunk in _binary_chunks(arr, encoding):
+            deflater.write(chunk)
+    deflater.close()
+    f.write('"))')
+
+
+def write_text_array(f: TextIO, arr: NDArray[Any], allow_nan: bool = True) -> None:
+    """
+    Write an array to a file as a JavaScript array literal.
+
+    Parameters
+    ----------
+    f : TextIO
+        File to write to.
+    arr : NDArray[Any]
+        Flat array to write.
+    allow_nan : bool
+        Whether to allow non-finite values. These are valid JavaScript, but not valid JSON.
+    """
+    f.write("[")
+    for k in range(0, arr.size, CHUNK_SIZE):
+        if k:
+            f.write(", ")
+        # JSON writes non-finite values as NaN and Infinity, which are also valid JavaScript.
+        f.write(json.dumps(arr[k : k + CHUNK_SIZE].tolist(), allow_nan=allow_nan)[1:-1])
+    f.write("]")
+
+
+def track_windows(
+    times: NDArray[Any], window: float, margin: int = 1
+) -> List[Tuple[float, float, int, int]]:
+    """
+    Split a keyframe track into time windows of a fixed duration, which the runtime decodes
+    one at a time, see MyMixer.addChunkedTrack.
+
+    Each window holds the keyframes that bracket it, plus margin keyframes on either side, so
+    interpolating within a window gives the same values as interpolating the whole track. The
+    margin keeps this true for smooth interpolation, which uses the neighbors of the bracketing
+    keyframes.
+
+    Parameters
+    ----------
+    times : NDArray[Any]
+        (T,) array of sorted keyframe times.
+    window : float
+        Duration of each window.
+    margin : int
+        Number of extra keyframes on either side of each window.
+
+    Returns
+    -------
+    List[Tuple[float, float, int, int]]
+        Start and end time of each window, and the start and stop index of its keyframes.
+    """
+    n = times.size
+    start = float(times[0])
+    count = max(1, int(np.ceil((float(times[-1]) - start) / window)))
+    bounds = start + window * np.arange(count + 1)
+    bounds[-1] = times[-1]
+
+    lo = np.searchsorted(times, bounds[:-1], side="right") - 1 - margin
+    hi = np.searchsorted(times, bounds[1:], side="left") + 1 + margin
+    lo = np.clip(lo, 0, n - 1)
+    hi = np.clip(hi, 1, n)
+    return [(float(bounds[k]), float(bounds[k + 1]), int(lo[k]), int(hi[k])) for k in range(count)]
+
+
+def write_track_windows(
+    f: TextIO,
+    times: NDArray[Any],
+    values: NDArray[Any],
+    windows: List[Tuple[float, float, int, int]],
+    encoding: str,
+    quote_text: bool = True,
+) -> None:
+    """
+    Write the windows of a keyframe track as an array of [start, end, times, values], see
+    track_windows. With a binary encoding, the times and values are base64 strings. With the
+    text encoding, they are array literals, which are quoted if quote_text is True, so the
+    runtime only parses them once it needs them.
+
+    Parameters
+    ----------
+    f : TextIO
+        File to write to.
+    times : NDArray[Any]
+        Flat array of keyframe times.
+    values : NDArray[Any]
+        Flat array of keyframe values.
+    windows : List[Tuple[float, float, int, int]]
+        Windows of the track.
+    encoding : str
+        text, or one of the keys of TRACK_ENCODINGS.
+    quote_text : bool
+        Whether to quote array literals.
+    """
+    size = values.size // max(times.size, 1)
+    f.write("[")
+    for k, (start, end, i0, i1) in enumerate(windows):
+        f.write(("," if k else "") + f"[{json.dumps(start)},{json.dumps(end)}")
+        for arr in (times[i0:i1], values[i0 * size : i1 * size]):
+            f.write(",")
+            if encoding == "text":
+                quote = "'" if quote_text else ""
+                f.write(quote)
+                write_text_array(f, arr, allow_nan=False)
+                f.write(quote)
+            else:
+                f.write('"')
+                write_base64(f, arr, encoding)
+                f.write('"')
+        f.write("]")
+    f.write("]")
+
+
+# Report entry of a decimated track: object, track, and number of keyframes kept and in total
+DecimationReportEntry = Tuple[str, str, int, int]
+
+
+def keyframe_tolerance(tolerance: Any, tracks: Iterable[str]) -> Union[float, Dict[str, float]]:
+    """
+    Validate a keyframe tolerance, i.e., the keyframe_tolerance option of the SIHM section or
+    the KEYFRAME_TOLERANCE of an object.
+
+    Parameters
+    ----------
+    tolerance : Any
+        A non-negative tolerance used for all tracks, or a dictionary of non-negative tolerances
+        keyed on the track name.
+    tracks : Iterable[str]
+        Names of the tracks the tolerance applies to.
+
+    Returns
+    -------
+    Union[float, Dict[str, float]]
+        Validated tolerance.
+    """
+
+    def check(v: Any, name: str) -> float:
+        if isinstance(v, bool) or not isinstance(v, (int, float)) or not v >= 0.0:
+            raise ValueError(f"Got {name} {v}, but expected a non-negative number.")
+        return float(v)
+
+    if not isinstance(tolerance, dict):
+        return check(tolerance, "keyframe tolerance")
+
+    tracks = set(tracks)
+    result = {}
+    for track, v in tolerance.items():
+        if track not in tracks:
+            raise ValueError(
+                f"Got a keyframe tolerance for track {track}, but there is no such track. "
+                + "Expected one of "
+                + ", ".join(sorted(tracks))
+                + "."
+            )
+        result[track] = check(v, f"keyframe tolerance of {track}")
+    return result
+
+
+def print_decimation_report(entries: List[DecimationReportEntry]) -> None:
+    """
+    Print the keyframes removed by decimating tracks.
+
+    Parameters
+    ----------
+    entries : List[DecimationReportEntry]
+        Report entries of the decimated tracks.
+    """
+    if not entries:
+        return
+
+    print("Keyframe decimation:")
+    for name, track, kept, total in entries:
+        print(f"  {name}.{track}: kept {kept} of {total} keyframes")
+    kept = sum(e[2] for e in entries)
+    total = sum(e[3] for e in entries)
+    print(f"  Total: kept {kept} of {total} keyframes")
+
+
+def decimate_track(
+    times: NDArray[Any], values: NDArray[Any], tolerance: float, quaternion: bool = False
+) -> NDArray[Any]:
+    """
+    Find the keyframes of a track that are needed to reproduce it to within a tolerance.
+
+    This is a Ramer-Douglas-Peucker style simplification, where the error of a keyframe is
+    measured against the interpolation ThreeJS does between the keyframes that are kept. For
+    vector tracks, this is linear interpolation and the error is the distance between the
+    interpolated and original values. For quaternion tracks, this is spherical linear
+    interpolation and the error is the angle, in radians, between the interpolated and
+    original rotations.
+
+    Rather than recursing one segment at a time, every segment is refined in a single
+    vectorized pass per iteration: the keyframe with the largest error in each segment that is
+    out of tolerance is kept, until all segments are within tolerance.
+
+    Parameters
+    ----------
+    times : NDArray[Any]
+        (T,) array of keyframe times.
+    values : NDArray[Any]
+        (T, D) array of keyframe values.
+    tolerance : float
+        Maximum allowed error.
+    quaternion : bool
+        Whether the values are xyzw quaternions.
+
+    Returns
+    -------
+    NDArray[Any]
+        Sorted indices of the keyframes to keep.
+    """
+    n = times.size
+    if n <= 2:
+        return np.arange(n)
+
+    if quaternion:
+        values = values / np.linalg.norm(values, axis=-1, keepdims=True)
+
+    keep = np.zeros(n, dtype=bool)
+    keep[0] = keep[-1] = True
+    ind = np.arange(n)
+    while True:
+        kept = np.flatnonzero(keep)
+
+        # Segment that each keyframe belongs to and the kept keyframes that bound it
+        seg = np.minimum(np.searchsorted(kept, ind, side="right") - 1, kept.size - 2)
+        i0 = kept[seg]
+        i1 = kept[seg + 1]
+
+        dt = times[i1] - times[i0]
+        t = np.divide(times - times[i0], dt, out=np.zeros(n), where=dt > 0.0)
+        if quaternion:
+            interp = quat_slerp(values[i0], values[i1], t)
+            dot = np.abs(np.sum(interp * values, axis=-1))
+            err = 2.0 * np.arccos(np.clip(dot, 0.0, 1.0))
+        else:
+            interp = lerp(values[i0], values[i1], t[:, None])
+            err = np.linalg.norm(interp - values, axis=-1)
+        err[keep] = 0.0
+
+        # Keep the worst keyframe of every segment that is out of tolerance
+        seg_max = np.maximum.reduceat(err, kept[:-1])
+        worst = (err > tolerance) & (err == seg_max[seg])
+        if not np.any(worst):
+            return kept
+        _, first = np.unique(seg[worst], return_index=True)
+        keep[np.flatnonzero(worst)[first]] = True
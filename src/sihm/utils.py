@@ -1,8 +1,11 @@
 from pathlib import Path
-from typing import List, Union, Tuple, TypedDict, Optional, Any
+from typing import Dict, List, Union, Tuple, TypedDict, Optional, Any, TYPE_CHECKING
 import numpy as np
 from numpy.typing import NDArray
 
+if TYPE_CHECKING:
+    from PIL import Image
+
 
 def lerp(from_val: NDArray[Any], to_val: NDArray[Any], t: NDArray[Any]) -> NDArray[Any]:
     """
@@ -83,6 +86,253 @@ def remap(
     return lerp(to_val_1, to_val_2, inv_lerp(from_val_1, from_val_2, val))
 
 
+def quat_slerp(q0: NDArray[Any], q1: NDArray[Any], t: NDArray[Any]) -> NDArray[Any]:
+    """
+    Spherical linear interpolation (slerp) of xyzw quaternions along the shortest path, which is
+    what ThreeJS uses when interpolating a QuaternionKeyframeTrack.
+
+    Parameters
+    ----------
+    q0 : NDArray[Any]
+        (..., 4) array of quaternions to interpolate from.
+    q1 : NDArray[Any]
+        (..., 4) array of quaternions to interpolate to.
+    t : NDArray[Any]
+        (...) array of interpolation parameters. This broadcasts against the quaternions
+        without their last axis.
+
+    Returns
+    -------
+    NDArray[Any]
+        (..., 4) array of unit quaternions.
+    """
+    q0 = np.asarray(q0, dtype=np.float64)
+    q1 = np.asarray(q1, dtype=np.float64)
+    t = np.asarray(t)[..., None]
+    dot = np.sum(q0 * q1, axis=-1, keepdims=True)
+    q1 = np.where(dot < 0.0, -q1, q1)
+    theta = np.arccos(np.clip(np.abs(dot), 0.0, 1.0))
+    sin_theta = np.sin(theta)
+
+    # Fall back to a normalized lerp when the quaternions are nearly parallel
+    small = sin_theta < 1e-8
+    safe_sin = np.where(small, 1.0, sin_theta)
+    w0 = np.where(small, 1.0 - t, np.sin((1.0 - t) * theta) / safe_sin)
+    w1 = np.where(small, t, np.sin(t * theta) / safe_sin)
+    q = w0 * q0 + w1 * q1
+    return q / np.linalg.norm(q, axis=-1, keepdims=True)
+
+
+def quat_normalize(q: NDArray[Any]) -> NDArray[Any]:
+    """
+    Normalize quaternions, e.g., to remove the drift a numerical integrator adds to their norm.
+
+    Parameters
+    ----------
+    q : NDArray[Any]
+        (..., 4) array of quaternions, e.g., (T, 4) or (N, T, 4).
+
+    Returns
+    -------
+    NDArray[Any]
+        (..., 4) array of unit quaternions.
+    """
+    q = np.asarray(q, dtype=np.float64)
+    return q / np.linalg.norm(q, axis=-1, keepdims=True)
+
+
+def quat_continuity(q: NDArray[Any]) -> NDArray[Any]:
+    """
+    Flip the signs of quaternions so each one is in the same hemisphere as the one before it.
+    q and -q are the same rotation, but sign flips in a history make interpolation between the
+    flipped keyframes spin the long way around.
+
+    Parameters
+    ----------
+    q : NDArray[Any]
+        (T, 4) or (N, T, 4) array of quaternions, where T is the time axis.
+
+    Returns
+    -------
+    NDArray[Any]
+        Array of quaternions with the same shape, where the first quaternion of each history is
+        unchanged.
+    """
+    q = np.asarray(q, dtype=np.float64)
+    if q.shape[-2] < 2:
+        return q.copy()
+
+    # Every flip between neighbors flips the sign of all the quaternions that follow it
+    flips = np.sum(q[..., 1:, :] * q[..., :-1, :], axis=-1) < 0.0
+    sign = np.ones(q.shape[:-1])
+    sign[..., 1:] = np.where(np.cumsum(flips, axis=-1) % 2, -1.0, 1.0)
+    return q * sign[..., None]
+
+
+def quat_multiply(q0: NDArray[Any], q1: NDArray[Any]) -> NDArray[Any]:
+    """
+    Multiply xyzw quaternions. To compose parent/child frames, q0 is the rotation of the parent
+    and q1 is the rotation of the child relative to the parent, which gives the rotation of the
+    child relative to the parent's parent, as in ThreeJS.
+
+    Parameters
+    ----------
+    q0 : NDArray[Any]
+        (..., 4) array of quaternions on the left.
+    q1 : NDArray[Any]
+        (..., 4) array of quaternions on the right. This broadcasts against q0, e.g., a (T, 4)
+        parent history composes with an (N, T, 4) array of child histories.
+
+    Returns
+    -------
+    NDArray[Any]
+        (..., 4) array of products q0 * q1.
+    """
+    q0 = np.asarray(q0, dtype=np.float64)
+    q1 = np.asarray(q1, dtype=np.float64)
+    x0, y0, z0, w0 = np.moveaxis(q0, -1, 0)
+    x1, y1, z1, w1 = np.moveaxis(q1, -1, 0)
+    return np.stack(
+        [
+            w0 * x1 + x0 * w1 + y0 * z1 - z0 * y1,
+            w0 * y1 - x0 * z1 + y0 * w1 + z0 * x1,
+            w0 * z1 + x0 * y1 - y0 * x1 + z0 * w1,
+            w0 * w1 - x0 * x1 - y0 * y1 - z0 * z1,
+        ],
+        axis=-1,
+    )
+
+
+def quat_conjugate(q: NDArray[Any]) -> NDArray[Any]:
+    """
+    Conjugate xyzw quaternions, which inverts unit quaternions. For example, the rotation of a
+    child relative to its parent is quat_multiply(quat_conjugate(parent), child) when both
+    rotations are relative to the same frame.
+
+    Parameters
+    ----------
+    q : NDArray[Any]
+        (..., 4) array of quaternions.
+
+    Returns
+    -------
+    NDArray[Any]
+        (..., 4) array of conjugated quaternions.
+    """
+    q = np.array(q, dtype=np.float64)
+    q[..., :3] *= -1.0
+    return q
+
+
+def quat_from_scalar_first(q: NDArray[Any]) -> NDArray[Any]:
+    """
+    Convert wxyz quaternions, where the scalar comes first, to the xyzw order ThreeJS uses.
+
+    Parameters
+    ----------
+    q : NDArray[Any]
+        (..., 4) array of wxyz quaternions.
+
+    Returns
+    -------
+    NDArray[Any]
+        (..., 4) array of xyzw quaternions.
+    """
+    return np.roll(np.asarray(q, dtype=np.float64), -1, axis=-1)
+
+
+# Euler orders ThreeJS supports
+EULER_ORDERS = ("XYZ", "YXZ", "ZXY", "ZYX", "YZX", "XZY")
+
+
+def quat_from_euler(angles: NDArray[Any], order: str = "XYZ") -> NDArray[Any]:
+    """
+    Convert Euler angles to xyzw quaternions, following the conventions of ThreeJS's Euler.
+    The angles are intrinsic rotations applied in the given order, e.g., "XYZ" rotates about X,
+    then about the new Y, and then about the new Z.
+
+    Parameters
+    ----------
+    angles : NDArray[Any]
+        (..., 3) array of the angles about X, Y, and Z in radians. These are always in XYZ order,
+        whatever the order of the rotations is.
+    order : str
+        Order of the rotations, one of EULER_ORDERS.
+
+    Returns
+    -------
+    NDArray[Any]
+        (..., 4) array of unit quaternions.
+    """
+    order = order.upper()
+    if order not in EULER_ORDERS:
+        raise ValueError(f"Unknown Euler order {order}. Expected one of {', '.join(EULER_ORDERS)}.")
+
+    half = 0.5 * np.asarray(angles, dtype=np.float64)
+    s = np.sin(half)
+    c = np.cos(half)
+    axis_quats = {}
+    for k, axis in enumerate("XYZ"):
+        q = np.zeros(half.shape[:-1] + (4,))
+        q[..., k] = s[..., k]
+        q[..., 3] = c[..., k]
+        axis_quats[axis] = q
+    return quat_multiply(
+        quat_multiply(axis_quats[order[0]], axis_quats[order[1]]), axis_quats[order[2]]
+    )
+
+
+def quat_from_dcm(m: NDArray[Any]) -> NDArray[Any]:
+    """
+    Convert rotation matrices to xyzw quaternions. The matrices rotate vectors from the child
+    frame into the parent frame, v_parent = m @ v_child, like a ThreeJS Matrix4's rotation. A
+    direction cosine matrix that maps parent coordinates to child coordinates is the transpose
+    of this, so transpose it first with np.swapaxes(dcm, -1, -2).
+
+    The quaternions are computed with Shepperd's method, which picks the largest of the four
+    components to divide by for every matrix, so the result is accurate for all rotations.
+
+    Parameters
+    ----------
+    m : NDArray[Any]
+        (..., 3, 3) array of rotation matrices.
+
+    Returns
+    -------
+    NDArray[Any]
+        (..., 4) array of unit quaternions.
+    """
+    m = np.asarray(m, dtype=np.float64)
+    m00, m01, m02 = m[..., 0, 0], m[..., 0, 1], m[..., 0, 2]
+    m10, m11, m12 = m[..., 1, 0], m[..., 1, 1], m[..., 1, 2]
+    m20, m21, m22 = m[..., 2, 0], m[..., 2, 1], m[..., 2, 2]
+
+    # Four times the square of each of x, y, z, and w
+    diag = np.stack(
+        [
+            1.0 + m00 - m11 - m22,
+            1.0 - m00 + m11 - m22,
+            1.0 - m00 - m11 + m22,
+            1.0 + m00 + m11 + m22,
+        ],
+        axis=-1,
+    )
+    # Four times the products of each of x, y, z, and w with all the components, in xyzw order
+    s = 0.5 / np.sqrt(np.maximum(np.max(diag, axis=-1), 1e-300))
+    cand = np.stack(
+        [
+            np.stack([diag[..., 0], m01 + m10, m02 + m20, m21 - m12], axis=-1),
+            np.stack([m01 + m10, diag[..., 1], m12 + m21, m02 - m20], axis=-1),
+            np.stack([m02 + m20, m12 + m21, diag[..., 2], m10 - m01], axis=-1),
+            np.stack([m21 - m12, m02 - m20, m10 - m01, diag[..., 3]], axis=-1),
+        ],
+        axis=-2,
+    )
+    largest = np.argmax(diag, axis=-1)[..., None, None]
+    q = np.take_along_axis(cand, largest, axis=-2)[..., 0, :] * s[..., None]
+    return quat_normalize(q)
+
+
 class ImageLoc(TypedDict):
     """
     Determines the location of the 6 images in the skybox image.
@@ -117,6 +367,46 @@ class ImageLoc(TypedDict):
 img_loc_default = ImageLoc(l=4, r=6, f=5, b=7, u=1, d=9)
 
 
+# Faces of a cube texture in the order the ThreeJS CubeTextureLoader expects them, i.e.,
+# +x, -x, +y, -y, +z, -z
+CUBE_FACES = ("r", "l", "u", "d", "f", "b")
+
+
+def crop_skybox(
+    img: "Image.Image", img_loc: ImageLoc = img_loc_default
+) -> Dict[str, "Image.Image"]:
+    """
+    Crop the 6 images of a ThreeJS skybox out of one large image, in memory.
+
+    Parameters
+    ----------
+    img : Image.Image
+        PIL image of the large image.
+    img_loc : ImageLoc
+        ImageLoc that defines the location of the 6 images in the larger image.
+
+    Returns
+    -------
+    Dict[str, Image.Image]
+        Smaller images keyed on the keys of ImageLoc.
+    """
+    # Get width/height of 6 smaller images
+    width, height = img.size
+    width /= 4
+    height /= 3
+    if width != height:
+        print(f"WARNING: Skybox image of size {img.size} will not produce square skybox images.")
+
+    faces = {}
+    for k in CUBE_FACES:
+        v = img_loc[k]
+        col = v % 4
+        row = int((v - col) / 4)
+        box = (width * col, row * height, width * (col + 1), (row + 1) * height)
+        faces[k] = img.crop(tuple(round(x) for x in box))
+    return faces
+
+
 def create_skybox(img_file: Path, img_loc: ImageLoc = img_loc_default) -> None:
     """
     Create the 6 images needed for a ThreeJS skybox from one large image.
@@ -131,6 +421,9 @@ def create_skybox(img_file: Path, img_loc: ImageLoc = img_loc_default) -> None:
     ThreeJS uses a right-handed coordiante systems where as other systems use a left-handed
     system. Therefore, you may need to flip the positive and negative x-axes.
 
+    The background of the SCENE section also accepts the large image directly, see crop_skybox,
+    which avoids writing the smaller images to disk.
+
     Parameters
     ----------
     img_file : Path
@@ -144,27 +437,152 @@ def create_skybox(img_file: Path, img_loc: ImageLoc = img_loc_default) -> None:
 
     img = Image.open(img_file)
 
-    # Get width/height of 6 smaller images
-    width, height = img.size
-    width /= 4
-    height /= 3
-    if width != height:
-        print(f"WARNING: Skybox image is {img_file} will not produce square skybox images.")
-
     # Variables used for naming smaller images
     stem = img_file.stem
     img_file_str = str(img_file.resolve()).rsplit(stem, 1)
 
-    # Crop out smaller images
-    for k, v in img_loc.items():
+    # Save smaller images
+    for k, crop in crop_skybox(img, img_loc).items():
         crop_file = Path((stem + "_" + k).join(img_file_str))
-        col = v % 4
-        row = int((v - col) / 4)
-
-        crop = img.crop((width * col, row * height, width * (col + 1), (row + 1) * height))
         crop.save(crop_file)
 
 
+def _cube_face_directions(face: str, size: int) -> Tuple[NDArray[Any], NDArray[Any], NDArray[Any]]:
+    """
+    Get the directions of the pixel centers of a cube texture face. The faces follow the
+    WebGL cube map convention, with the first row of each face at the top.
+
+    Parameters
+    ----------
+    face : str
+        Face, one of CUBE_FACES.
+    size : int
+        Width and height of the face in pixels.
+
+    Returns
+    -------
+    Tuple[NDArray[Any], NDArray[Any], NDArray[Any]]
+        (size, size) x, y, and z components of the directions. These are not normalized.
+    """
+    c = (2.0 * (np.arange(size, dtype=np.float32) + 0.5) / size - 1.0).astype(np.float32)
+    sc, tc = np.meshgrid(c, c)
+    one = np.ones_like(sc)
+    if face == "r":
+        return one, -tc, -sc
+    elif face == "l":
+        return -one, -tc, sc
+    elif face == "u":
+        return sc, one, tc
+    elif face == "d":
+        return sc, -one, -tc
+    elif face == "f":
+        return sc, -tc, one
+    else:
+        return -sc, -tc, -one
+
+
+def _sample_equirect(
+    pixels: NDArray[Any], x: NDArray[Any], y: NDArray[Any], z: NDArray[Any]
+) -> NDArray[Any]:
+    """
+    Sample an equirectangular image in the given directions with bilinear filtering. The image
+    wraps around horizontally.
+
+    Parameters
+    ----------
+    pixels : NDArray[Any]
+        (H, W, C) image.
+    x : NDArray[Any]
+        x components of the directions.
+    y : NDArray[Any]
+        y components of the directions.
+    z : NDArray[Any]
+        z components of the directions.
+
+    Returns
+    -------
+    NDArray[Any]
+        Sampled pixels, with the shape of the directions plus the channels.
+    """
+    height, width = pixels.shape[:2]
+
+    # ThreeJS flips the x-axis of cube textures when it renders them, so the direction in the
+    # scene has the opposite x. The longitude and latitude are those ThreeJS uses for
+    # equirectangular textures.
+    lon = np.arctan2(z, -x)
+    lat = np.arctan2(y, np.hypot(x, z))
+    col = (lon / (2 * np.pi) + 0.5) * width - 0.5
+    row = (0.5 - lat / np.pi) * height - 0.5
+
+    c0 = np.floor(col)
+    r0 = np.floor(row)
+    wc = (col - c0)[..., None].astype(np.float32)
+    wr = (row - r0)[..., None].astype(np.float32)
+    c0 = c0.astype(np.int64) % width
+    c1 = (c0 + 1) % width
+    r1 = np.clip(r0 + 1, 0, height - 1).astype(np.int64)
+    r0 = np.clip(r0, 0, height - 1).astype(np.int64)
+
+    top = lerp(pixels[r0, c0].astype(np.float32), pixels[r0, c1].astype(np.float32), wc)
+    bottom = lerp(pixels[r1, c0].astype(np.float32), pixels[r1, c1].astype(np.float32), wc)
+    return lerp(top, bottom, wr)
+
+
+def equirect_to_cubemap(
+    img: "Image.Image", face_size: Optional[int] = None, workers: Optional[int] = None
+) -> Dict[str, "Image.Image"]:
+    """
+    Resample an equirectangular panorama into the 6 images of a ThreeJS skybox. The faces are
+    oriented such that the skybox shows the same view as the panorama would as an
+    equirectangular background.
+
+    The spherical lookups and bilinear filtering are vectorized with NumPy, and the faces are
+    resampled in parallel threads, since NumPy releases the GIL for the heavy lifting.
+
+    Parameters
+    ----------
+    img : Image.Image
+        PIL image of the panorama. Its width should be twice its height.
+    face_size : Optional[int]
+        Width and height of the faces in pixels. Defaults to a quarter of the panorama's width,
+        which keeps its resolution at the horizon.
+    workers : Optional[int]
+        Number of threads. Defaults to one per face, limited by the number of cores.
+
+    Returns
+    -------
+    Dict[str, Image.Image]
+        Faces keyed on the keys of ImageLoc.
+    """
+    import os
+    from concurrent.futures import ThreadPoolExecutor
+    from PIL import Image
+
+    width, height = img.size
+    if width != 2 * height:
+        print(
+            f"WARNING: Equirectangular image of size {img.size} does not have a 2:1 aspect ratio."
+        )
+    if face_size is None:
+        face_size = max(1, width // 4)
+
+    if img.mode not in ("RGB", "RGBA", "L"):
+        img = img.convert("RGBA" if "transparency" in img.info or "A" in img.mode else "RGB")
+    pixels = np.asarray(img)
+    if pixels.ndim == 2:
+        pixels = pixels[..., None]
+
+    def resample(face: str) -> "Image.Image":
+        sampled = _sample_equirect(pixels, *_cube_face_directions(face, face_size))
+        sampled = np.clip(np.rint(sampled), 0, 255).astype(np.uint8)
+        return Image.fromarray(sampled[..., 0] if sampled.shape[-1] == 1 else sampled, img.mode)
+
+    if workers is None:
+        workers = min(len(CUBE_FACES), os.cpu_count() or 1)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        return dict(zip(CUBE_FACES, executor.map(resample, CUBE_FACES)))
+
+
 def add_texture_coords_to_mesh(input_file: Path, output_file: Path):
     """
     Adds texture coordinates to the input OBJ file and exports it as an output OBJ file.
@@ -0,0 +1,143 @@
+import time
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+
+def _stat_files(files: Iterable[Path]) -> Dict[Path, Optional[Tuple[int, int]]]:
+    """
+    Get the modification time and size of files.
+
+    Parameters
+    ----------
+    files : Iterable[Path]
+        Files to stat.
+
+    Returns
+    -------
+    Dict[Path, Optional[Tuple[int, int]]]
+        Modification time and size of each file, or None if the file does not exist.
+    """
+    stats = {}
+    for file in files:
+        try:
+            st = file.stat()
+            stats[file] = (st.st_mtime_ns, st.st_size)
+        except FileNotFoundError:
+            stats[file] = None
+    return stats
+
+
+def _changed_files(
+    stats: Dict[Path, Optional[Tuple[int, int]]], new_stats: Dict[Path, Optional[Tuple[int, int]]]
+) -> List[Path]:
+    """
+    Get the files that changed between two calls to _stat_files.
+
+    Parameters
+    ----------
+    stats : Dict[Path, Optional[Tuple[int, int]]]
+        Earlier stats of the files.
+    new_stats : Dict[Path, Optional[Tuple[int, int]]]
+        Later stats of the files.
+
+    Returns
+    -------
+    List[Path]
+        Files that were created, deleted, or modified in between.
+    """
+    return [f for f in new_stats if new_stats[f] != stats.get(f, None)]
+
+
+def watch(
+    cfg_file: Path,
+    html_file: Path,
+    project_dir: Optional[Path] = None,
+    jobs: int = 1,
+    interval: float = 0.5,
+    workspace: bool = True,
+    prebuilt: bool = True,
+) -> None:
+    """
+    Build the standalone HTML file, and rebuild it whenever the config file or any file it uses,
+    e.g., meshes, MTL files, shaders, textures, or track files, changes. This runs until it is
+    interrupted.
+
+    Rebuilds are incremental: only the SIHM_EXTRA_* modules whose sources changed and index.js
+    are regenerated, and the project is rebuilt in its existing build directory, so the node
+    modules are not reinstalled and the build system skips the steps that are up to date.
+
+    Parameters
+    ----------
+    cfg_file : Path
+        Input config file.
+    html_file : Path
+        Location of the final HTML file.
+    project_dir : Optional[Path]
+        Directory of the project. If None, the project is created in a temporary directory
+        that lasts as long as the watch.
+    jobs : int
+        Number of cores to use when building the project.
+    interval : float
+        Time between checks for changed files in seconds.
+    workspace : bool
+        Whether to use a persistent node workspace, see sihm.workspace.node_workspace.
+    prebuilt : bool
+        Whether to link the scene against the prebuilt runtime, see sihm.link, when the project
+        needs no extra modules or glslify.
+    """
+    import tempfile
+    from shutil import rmtree
+    from sihm.build import make_project, update_project, compile_project
+    from sihm.link import can_link, link_html
+
+    temp_dir = None
+    if project_dir is None:
+        temp_dir = tempfile.TemporaryDirectory()
+        project_dir = Path(temp_dir.name)
+
+    def build(previous_modules: Dict[str, str], previous_extra_modules: Optional[set]):
+        if previous_extra_modules is None:
+            parser = make_project(cfg_file, project_dir)
+        else:
+            # The project already exists, so only rewrite the modules that changed
+            parser = update_project(cfg_file, project_dir, previous_modules=previous_modules)
+        if previous_extra_modules is not None and parser.extra_modules != previous_extra_modules:
+            # The project needs different node modules, so start from a clean build directory
+            rmtree(project_dir.joinpath("build"), ignore_errors=True)
+
+        if prebuilt and can_link(parser.extra_modules, parser.glslify_files):
+            link_html(project_dir, html_file)
+            return parser
+
+        node_workspace = None
+        if workspace:
+            from sihm.workspace import node_workspace as get_node_workspace
+
+            node_workspace = get_node_workspace(parser.extra_modules)
+
+        compile_project(project_dir, html_file, jobs=jobs, node_workspace=node_workspace)
+        return parser
+
+    try:
+        parser = build({}, None)
+        stats = _stat_files(parser.dependencies)
+        print(f"Watching {len(stats)} files for changes. Press Ctrl+C to stop.")
+        while True:
+            time.sleep(interval)
+            changed = _changed_files(stats, _stat_files(stats))
+            if not changed:
+                continue
+
+            print(f"Detected changes in {', '.join(str(f) for f in changed)}. Rebuilding.")
+            try:
+                parser = build(parser.module_signatures, parser.extra_modules)
+                print(f"Rebuilt {html_file}.")
+            except Exception as e:
+                # Keep watching, so the user can fix the error
+                print(f"ERROR: Rebuild failed: {e}")
+            stats = _stat_files(parser.dependencies | set(stats))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if temp_dir is not None:
+            temp_dir.cleanup()
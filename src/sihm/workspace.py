@@ -0,0 +1,208 @@
+import os
+import json
+import time
+import hashlib
+from pathlib import Path
+from typing import Dict, Iterable, Optional, Union
+from sihm.cache import default_cache_dir
+
+# Node modules every project needs.
+BASE_MODULES = ("three", "webpack", "webpack-cli", "dat.gui")
+
+# Name of the file in each workspace that records the resolved versions of its modules.
+MANIFEST = "sihm_workspace.json"
+
+# Default age in days after which a workspace is reinstalled to pick up new module versions.
+DEFAULT_MAX_AGE = 7.0
+
+
+def workspace_key(extra_modules: Iterable[str]) -> str:
+    """
+    Get the key of the node workspace for a set of extra modules.
+
+    Parameters
+    ----------
+    extra_modules : Iterable[str]
+        Extra modules the project needs. These may be pinned to a version, e.g., stats-js@1.0.1.
+
+    Returns
+    -------
+    str
+        Workspace key.
+    """
+    modules = sorted(set(extra_modules) - set(BASE_MODULES))
+    return hashlib.sha256("\0".join(modules).encode("utf-8")).hexdigest()[:16]
+
+
+def _module_name(spec: str) -> str:
+    """
+    Get the name of a module from the spec given to yarn add, e.g., @scope/name@1.0 -> @scope/name.
+    """
+    k = spec.find("@", 1)
+    return spec if k < 0 else spec[:k]
+
+
+def _resolved_versions(workspace: Path, modules: Iterable[str]) -> Optional[Dict[str, str]]:
+    """
+    Get the versions of modules installed in a workspace.
+
+    Parameters
+    ----------
+    workspace : Path
+        Directory of the workspace.
+    modules : Iterable[str]
+        Specs of the modules.
+
+    Returns
+    -------
+    Optional[Dict[str, str]]
+        Installed version of each module keyed on its name, or None if any module is missing.
+    """
+    versions = {}
+    for spec in modules:
+        name = _module_name(spec)
+        try:
+            with open(workspace.joinpath("node_modules", name, "package.json"), "r") as f:
+                versions[name] = json.load(f)["version"]
+        except (OSError, ValueError, KeyError):
+            return None
+    return versions
+
+
+def _is_current(workspace: Path, modules: Iterable[str], max_age: float) -> bool:
+    """
+    Check whether a workspace is complete and young enough to use.
+
+    Parameters
+    ----------
+    workspace : Path
+        Directory of the workspace.
+    modules : Iterable[str]
+        Specs of the modules the workspace should have.
+    max_age : float
+        Age in days after which the workspace is stale.
+
+    Returns
+    -------
+    bool
+        True if the workspace records the versions it has installed, they are still installed,
+        and it was installed less than max_age days ago.
+    """
+    try:
+        with open(workspace.joinpath(MANIFEST), "r") as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return False
+    if time.time() - manifest.get("installed", 0.0) > max_age * 86400.0:
+        return False
+    return manifest.get("modules") == _resolved_versions(workspace, modules)
+
+
+def clear_workspaces(directory: Union[None, str, Path] = None) -> None:
+    """
+    Delete the node workspaces, so their modules are reinstalled by the next build that uses them.
+
+    Parameters
+    ----------
+    directory : Union[None, str, Path]
+        Directory that holds the workspaces. Defaults to the workspaces directory in
+        sihm.cache.default_cache_dir().
+    """
+    from shutil import rmtree
+
+    if directory is None:
+        directory = default_cache_dir().joinpath("workspaces")
+    rmtree(directory, ignore_errors=True)
+
+
+def node_workspace(
+    extra_modules: Iterable[str],
+    directory: Union[None, str, Path] = None,
+    max_age: float = DEFAULT_MAX_AGE,
+) -> Path:
+    """
+    Get a node workspace that has the base and extra modules installed, creating it if needed.
+
+    Workspaces persist between builds and are keyed on the set of extra modules, so the modules
+    are only installed the first time a set of extra modules is used. Projects use the workspace
+    by linking to its node_modules directory rather than running yarn themselves. Each workspace
+    records the versions yarn resolved its modules to, and is reinstalled once it is older than
+    max_age days or its modules no longer match those versions. Pin a module, e.g.,
+    stats-js@1.0.1, to keep its version fixed. Workspaces are installed in a temporary directory
+    and then renamed into place, so concurrent builds never see a partially installed workspace.
+    Use clear_workspaces to force a reinstall.
+
+    Parameters
+    ----------
+    extra_modules : Iterable[str]
+        Extra modules the project needs.
+    directory : Union[None, str, Path]
+        Directory that holds the workspaces. Defaults to the workspaces directory in
+        sihm.cache.default_cache_dir().
+    max_age : float
+        Age in days after which the workspace is reinstalled.
+
+    Returns
+    -------
+    Path
+        Directory of the workspace. This contains package.json and node_modules.
+    """
+    import subprocess
+    import tempfile
+    from shutil import rmtree
+    from sihm.profile import phase
+
+    extra_modules = sorted(set(extra_modules) - set(BASE_MODULES))
+    modules = list(BASE_MODULES) + extra_modules
+    if directory is None:
+        directory = default_cache_dir().joinpath("workspaces")
+    directory = Path(directory)
+    workspace = directory.joinpath(workspace_key(extra_modules))
+    if _is_current(workspace, modules, max_age):
+        return workspace
+
+    directory.mkdir(parents=True, exist_ok=True)
+    tmp = Path(tempfile.mkdtemp(dir=directory, prefix=".tmp_"))
+    try:
+        with phase("node workspace"):
+            subprocess.run("yarn init -p -y", shell=True, check=True, cwd=tmp)
+            subprocess.run(" ".join(["yarn add"] + modules), shell=True, check=True, cwd=tmp)
+        versions = _resolved_versions(tmp, modules)
+        if versions is None:
+            raise RuntimeError(f"yarn did not install all of {', '.join(modules)}.")
+        with open(tmp.joinpath(MANIFEST), "w") as f:
+            json.dump({"installed": time.time(), "modules": versions}, f, indent=2)
+
+        try:
+            os.rename(tmp, workspace)
+        except OSError:
+            if _is_current(workspace, modules, max_age):
+                # Another build installed the same workspace while this one was installing
+                rmtree(tmp)
+                return workspace
+            # Move the stale workspace aside rather than deleting it, since builds that are
+            # still running may link to it. It is deleted along with the other old workspaces.
+            try:
+                os.rename(
+                    workspace, tempfile.mkdtemp(dir=directory, prefix=f".old_{int(time.time())}_")
+                )
+            except OSError:
+                # Another build moved it first
+                pass
+            try:
+                os.rename(tmp, workspace)
+            except OSError:
+                # Another build replaced it first
+                if not _is_current(workspace, modules, max_age):
+                    raise
+                rmtree(tmp)
+    except BaseException:
+        rmtree(tmp, ignore_errors=True)
+        raise
+
+    # Old workspaces are kept for a day, which is plenty for the builds using them to finish
+    for old in directory.glob(".old_*"):
+        if time.time() - int(old.name.split("_")[1]) > 86400.0:
+            rmtree(old, ignore_errors=True)
+
+    return workspace
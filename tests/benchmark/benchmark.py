@@ -0,0 +1,217 @@
+import json
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Dict
+
+import click
+
+# Benchmark the sihm of this checkout, rather than an installed one, from any directory
+sys.path.insert(0, str(Path(__file__).resolve().parents[2].joinpath("src")))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+from generate import synthetic_scene  # noqa: E402
+
+# Benchmark cases keyed on their name. Each case varies one axis of the synthetic scene, see
+# generate.DEFAULT_SCENE.
+CASES: Dict[str, Dict[str, Any]] = {
+    "objects_10": {"objects": 10},
+    "objects_100": {"objects": 100},
+    "objects_1000": {"objects": 1000},
+    "keyframes_1000": {"keyframes": 1000},
+    "keyframes_10000": {"keyframes": 10000},
+    "keyframes_100000": {"keyframes": 100000},
+    "depth_5": {"objects": 10, "depth": 5},
+    "depth_50": {"objects": 10, "depth": 50},
+    "textures_8x256": {"objects": 8, "textures": 8, "texture_size": 256},
+    "textures_1x2048": {"textures": 1, "texture_size": 2048},
+    "mesh_10000": {"mesh_triangles": 10000},
+    "mesh_100000": {"mesh_triangles": 100000},
+}
+
+BASELINE = Path(__file__).parent.joinpath("baseline.json")
+
+# Absolute slack of each metric on top of its relative tolerance, so the small cases, which
+# take a few milliseconds, do not fail on noise
+SLACK = {"seconds": 0.05, "peak_memory": 2**20, "output_bytes": 0}
+
+
+def run_case(cfg: Dict[Any, Any], directory: Path, repeat: int) -> Dict[str, float]:
+    """
+    Parse a config into a project source directory. Parsing stops after
+    SihmParser.write_file, so neither node nor yarn is needed.
+
+    Parameters
+    ----------
+    cfg : Dict[Any, Any]
+        Config data.
+    directory : Path
+        Directory to write index.js and the SIHM_EXTRA_* modules to.
+    repeat : int
+        Number of timed runs. The fastest is reported, since the others only add noise.
+
+    Returns
+    -------
+    Dict[str, float]
+        Wall time in seconds, peak memory traced by tracemalloc in bytes, and bytes of the
+        written sources.
+    """
+    import tracemalloc
+    from copy import deepcopy
+    from sihm.parser import SihmParser
+
+    directory.mkdir(parents=True, exist_ok=True)
+    file_name = str(directory.joinpath("index.js"))
+
+    def parse() -> None:
+        # The parser replaces parts of the config, e.g., texture files with their modules
+        parser = SihmParser(deepcopy(cfg), file_name, cfg_path=directory)
+        parser.write_file()
+
+    # The memory is measured in a separate run, since tracing slows the parser down
+    seconds = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        parse()
+        seconds = min(seconds, time.perf_counter() - start)
+
+    tracemalloc.start()
+    parse()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    output_bytes = sum(f.stat().st_size for f in directory.glob("*.js"))
+    return {"seconds": seconds, "peak_memory": peak, "output_bytes": output_bytes}
+
+
+@click.command(context_settings={"help_option_names": ["-h", "--help"]})
+@click.option(
+    "--case",
+    "-k",
+    "names",
+    multiple=True,
+    help="Only run the cases whose name contains this, e.g., 'objects'. May be given several times.",
+)
+@click.option(
+    "--repeat",
+    type=click.IntRange(min=1),
+    default=3,
+    show_default=True,
+    help="Number of timed runs of each case.",
+)
+@click.option(
+    "--update",
+    is_flag=True,
+    default=False,
+    help="Store the results as the new baseline instead of comparing them to it.",
+)
+@click.option(
+    "--metric",
+    "metrics",
+    type=click.Choice(["seconds", "peak_memory", "output_bytes"]),
+    multiple=True,
+    help="Only compare this metric with the baseline. May be given several times. Wall times and peak memory depend on the machine, so CI only compares output_bytes.",
+)
+@click.option(
+    "--time-tolerance",
+    type=click.FloatRange(min=0.0),
+    default=0.5,
+    show_default=True,
+    help="Allowed relative increase of the wall time. Wall times depend on the machine, so this is loose.",
+)
+@click.option(
+    "--memory-tolerance",
+    type=click.FloatRange(min=0.0),
+    default=0.2,
+    show_default=True,
+    help="Allowed relative increase of the peak memory.",
+)
+@click.option(
+    "--size-tolerance",
+    type=click.FloatRange(min=0.0),
+    default=0.01,
+    show_default=True,
+    help="Allowed relative increase of the output bytes.",
+)
+@click.option(
+    "--json",
+    "json_file",
+    type=click.Path(dir_okay=False, file_okay=True),
+    default=None,
+    help="Write the results to this JSON file.",
+)
+def main(
+    names, repeat, update, metrics, time_tolerance, memory_tolerance, size_tolerance, json_file
+):
+    """
+    Benchmark the sihm parser on synthetic scenes, and fail if any case regressed against the
+    stored baseline.
+    """
+    cases = {k: v for k, v in CASES.items() if not names or any(n in k for n in names)}
+    if not cases:
+        raise click.UsageError("No cases match.")
+
+    # Textures are generated and encoded with Pillow, which is optional
+    try:
+        import PIL  # noqa: F401
+    except ImportError:
+        skipped = [k for k, v in cases.items() if v.get("textures", 0)]
+        if skipped:
+            print("NOTE: Pillow is not installed. Skipping " + ", ".join(skipped) + ".")
+            cases = {k: v for k, v in cases.items() if k not in skipped}
+
+    tolerances = {
+        "seconds": time_tolerance,
+        "peak_memory": memory_tolerance,
+        "output_bytes": size_tolerance,
+    }
+    if metrics:
+        tolerances = {k: v for k, v in tolerances.items() if k in metrics}
+    baseline = {}
+    if BASELINE.exists():
+        with open(BASELINE, "r") as f:
+            baseline = json.load(f)
+
+    results = {}
+    failed = []
+    print(f"{'Case':<20} {'Time':>10} {'Peak memory':>14} {'Output':>14}")
+    with tempfile.TemporaryDirectory() as temp_dir:
+        assets = Path(temp_dir).joinpath("assets")
+        for name, params in cases.items():
+            cfg = synthetic_scene(assets, **params)
+            result = run_case(cfg, Path(temp_dir).joinpath(name, "src"), repeat)
+            results[name] = result
+
+            # Compare each metric with its baseline
+            regressions = []
+            for metric, tolerance in tolerances.items():
+                base = baseline.get(name, {}).get(metric, None)
+                if base is not None and result[metric] > base * (1.0 + tolerance) + SLACK[metric]:
+                    regressions.append(f"{metric} {result[metric]:.4g} > {base:.4g}")
+            print(
+                f"{name:<20} {result['seconds']:>8.3f} s "
+                + f"{result['peak_memory'] / 1024**2:>11.1f} MB "
+                + f"{result['output_bytes'] / 1024**2:>11.2f} MB"
+                + ("" if name in baseline else "  (no baseline)")
+            )
+            for regression in regressions:
+                print(f"  REGRESSION: {regression}")
+            if regressions and not update:
+                failed.append(name)
+
+    if json_file is not None:
+        with open(json_file, "w") as f:
+            json.dump(results, f, indent=2)
+
+    if update:
+        with open(BASELINE, "w") as f:
+            json.dump({**baseline, **results}, f, indent=2, sort_keys=True)
+            f.write("\n")
+        print(f"Updated {BASELINE}.")
+    elif failed:
+        print(f"ERROR: {len(failed)} of {len(cases)} cases regressed: " + ", ".join(failed))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
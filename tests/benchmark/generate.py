@@ -0,0 +1,170 @@
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+# Parameters of the synthetic scenes. Each benchmark case varies one of these axes and keeps
+# the others at their defaults.
+DEFAULT_SCENE = {
+    "objects": 1,
+    "keyframes": 2,
+    "depth": 0,
+    "textures": 0,
+    "texture_size": 64,
+    "mesh_triangles": 0,
+}
+
+
+def write_sphere_obj(file: Path, triangles: int) -> None:
+    """
+    Write a UV sphere with about the given number of triangles as an OBJ file, with positions,
+    normals and texture coordinates.
+
+    Parameters
+    ----------
+    file : Path
+        OBJ file to write.
+    triangles : int
+        Approximate number of triangles.
+    """
+    import numpy as np
+
+    # A sphere with n rings and 2n segments has 4n^2 triangles
+    n = max(2, int(round(np.sqrt(triangles / 4.0))))
+    theta = np.linspace(0.0, np.pi, n + 1)
+    phi = np.linspace(0.0, 2.0 * np.pi, 2 * n + 1)
+    t, p = np.meshgrid(theta, phi, indexing="ij")
+    normals = np.stack([np.sin(t) * np.cos(p), np.sin(t) * np.sin(p), np.cos(t)], axis=-1)
+    uvs = np.stack([p / (2.0 * np.pi), 1.0 - t / np.pi], axis=-1)
+
+    # Vertices are numbered row by row, starting at 1
+    k = np.arange((n + 1) * (2 * n + 1)).reshape(n + 1, 2 * n + 1) + 1
+    a, b, c, d = k[:-1, :-1], k[:-1, 1:], k[1:, 1:], k[1:, :-1]
+    faces = np.concatenate(
+        [np.stack([a, d, c], axis=-1).reshape(-1, 3), np.stack([a, c, b], axis=-1).reshape(-1, 3)]
+    )
+
+    with open(file, "w") as f:
+        f.write("".join(f"v {x:.6f} {y:.6f} {z:.6f}\n" for x, y, z in normals.reshape(-1, 3)))
+        f.write("".join(f"vn {x:.6f} {y:.6f} {z:.6f}\n" for x, y, z in normals.reshape(-1, 3)))
+        f.write("".join(f"vt {u:.6f} {v:.6f}\n" for u, v in uvs.reshape(-1, 2)))
+        f.write("".join(f"f {i}/{i}/{i} {j}/{j}/{j} {m}/{m}/{m}\n" for i, j, m in faces))
+
+
+def write_noise_texture(file: Path, size: int, seed: int) -> None:
+    """
+    Write a square PNG of random noise. Noise does not compress, so it is the worst case for the
+    size of the output.
+
+    Parameters
+    ----------
+    file : Path
+        PNG file to write.
+    size : int
+        Width and height in pixels.
+    seed : int
+        Seed of the noise, so the texture is the same on every run.
+    """
+    import numpy as np
+    from PIL import Image
+
+    rng = np.random.default_rng(seed)
+    Image.fromarray(rng.integers(0, 256, (size, size, 3), dtype=np.uint8)).save(file)
+
+
+def _track(keyframes: int, phase: float) -> Dict[str, List[Any]]:
+    """
+    Create the position and quaternion tracks of an object moving along a circle.
+
+    Parameters
+    ----------
+    keyframes : int
+        Number of keyframes.
+    phase : float
+        Phase of the object on the circle.
+
+    Returns
+    -------
+    Dict[str, List[Any]]
+        ANIMATIONS of the object.
+    """
+    import numpy as np
+
+    times = np.linspace(0.0, 10.0, keyframes)
+    angle = times + phase
+    position = np.stack([np.cos(angle), np.sin(angle), 0.1 * times], axis=-1)
+    quaternion = np.stack(
+        [np.zeros_like(angle), np.zeros_like(angle), np.sin(angle / 2), np.cos(angle / 2)], axis=-1
+    )
+    return {
+        "position": [times.tolist(), position.ravel().tolist()],
+        "quaternion": [times.tolist(), quaternion.ravel().tolist()],
+    }
+
+
+def synthetic_scene(directory: Path, **params: Any) -> Dict[Any, Any]:
+    """
+    Create a synthetic config, and the assets it uses, for benchmarking the parser.
+
+    Parameters
+    ----------
+    directory : Path
+        Directory to write the assets to.
+    **params : Any
+        Parameters of the scene, see DEFAULT_SCENE:
+
+        * objects: Number of objects under the scene.
+        * keyframes: Number of keyframes of the position and quaternion track of each object.
+        * depth: Number of CHILDREN each object is nested under.
+        * textures: Number of distinct textures the objects use as their map.
+        * texture_size: Width and height of the textures in pixels.
+        * mesh_triangles: Approximate number of triangles of the OBJ mesh the objects use, or 0
+          to use a BoxGeometry.
+
+    Returns
+    -------
+    Dict[Any, Any]
+        Config data.
+    """
+    for k in params:
+        if k not in DEFAULT_SCENE:
+            raise ValueError(f"Unknown scene parameter {k}.")
+    p = {**DEFAULT_SCENE, **params}
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+
+    textures: List[Optional[str]] = [None]
+    if p["textures"]:
+        textures = []
+        for k in range(p["textures"]):
+            file = directory.joinpath(f"texture_{p['texture_size']}_{k}.png")
+            if not file.exists():
+                write_noise_texture(file, p["texture_size"], k)
+            textures.append(str(file))
+
+    geometry: Dict[str, Any] = {"FUNCTION": "BoxGeometry", "ARGS": [1, 1, 1]}
+    if p["mesh_triangles"]:
+        file = directory.joinpath(f"sphere_{p['mesh_triangles']}.obj")
+        if not file.exists():
+            write_sphere_obj(file, p["mesh_triangles"])
+        geometry = {"FILE": str(file)}
+
+    objects: Dict[str, Any] = {}
+    for k in range(p["objects"]):
+        args: Dict[str, Any] = {"color": "0x808080"}
+        if (texture := textures[k % len(textures)]) is not None:
+            args["map"] = texture
+        obj = {
+            "GEOMETRY": geometry,
+            "MATERIAL": {"FUNCTION": "MeshPhongMaterial", "ARGS": args},
+            "ANIMATIONS": _track(p["keyframes"], 2.0 * 3.141592653589793 * k / p["objects"]),
+        }
+
+        # Nest the object under a chain of children, each with its own animation
+        for d in range(p["depth"]):
+            obj = {
+                "GEOMETRY": {"FUNCTION": "BoxGeometry", "ARGS": [0.1, 0.1, 0.1]},
+                "ANIMATIONS": _track(2, float(d)),
+                "CHILDREN": {f"o{k}_{p['depth'] - d}": obj},
+            }
+        objects[f"o{k}"] = obj
+
+    return {"OBJECTS": objects}
@@ -0,0 +1,108 @@
+import json
+import re
+from copy import deepcopy
+from pathlib import Path
+
+import pytest
+
+from sihm.atlas import obj_uvs_fit, pack_shelves, remap_obj_uvs, uv_rect
+
+
+def test_pack_shelves():
+    sizes = [(64, 64), (32, 16), (100, 40), (16, 64), (128, 8), (30, 30)]
+    padding = 2
+    placements, atlas_sizes = pack_shelves(sizes, 256, padding)
+    assert len(atlas_sizes) == 1
+
+    # Textures and their padding are inside the atlas and do not overlap
+    boxes = []
+    for (a, x, y), (w, h) in zip(placements, sizes):
+        assert a == 0
+        box = (x - padding, y - padding, x + w + padding, y + h + padding)
+        assert box[0] >= 0 and box[1] >= 0
+        assert box[2] <= atlas_sizes[0][0] and box[3] <= atlas_sizes[0][1]
+        for other in boxes:
+            assert (
+                box[2] <= other[0] or other[2] <= box[0] or box[3] <= other[1] or other[3] <= box[1]
+            )
+        boxes.append(box)
+
+    # Atlases are powers of two
+    for size in atlas_sizes[0]:
+        assert size & (size - 1) == 0
+
+
+def test_pack_shelves_overflow():
+    # Textures that do not fit in one atlas start another
+    placements, atlas_sizes = pack_shelves([(60, 60)] * 5, 128, 2)
+    assert sorted(p[0] for p in placements) == [0, 0, 0, 0, 1]
+    assert atlas_sizes == [(128, 128), (64, 64)]
+
+    with pytest.raises(ValueError):
+        pack_shelves([(127, 10)], 128, 1)
+
+
+def test_uv_rect():
+    # v runs from the bottom of the atlas, while y runs from its top
+    assert uv_rect((0, 0, 0), (64, 32), (128, 128)) == [0.0, 0.75, 0.5, 0.25]
+    assert uv_rect((0, 64, 96), (64, 32), (128, 128)) == [0.5, 0.0, 0.5, 0.25]
+
+
+def test_remap_obj_uvs(tmp_path: Path):
+    text = "v 0 0 0\nvt 0 0\n  vt 1 1 0\nvt 0.5 0.25\nf 1/1 1/2 1/3\n"
+    remapped = remap_obj_uvs(text, [0.5, 0.25, 0.5, 0.25])
+    assert remapped == "v 0 0 0\nvt 0.5 0.25\n  vt 1 0.5 0\nvt 0.75 0.3125\nf 1/1 1/2 1/3\n"
+
+    obj = tmp_path.joinpath("mesh.obj")
+    obj.write_text(text)
+    assert obj_uvs_fit(obj)
+    obj.write_text(text + "vt 2 0\n")
+    assert not obj_uvs_fit(obj)
+
+
+@pytest.mark.parametrize("mesh_encoding", ["text", "quantized"])
+def test_atlas_obj_uvs(tmp_path: Path, mesh_encoding):
+    pytest.importorskip("PIL")
+    from PIL import Image
+    from sihm.parser import SihmParser
+
+    for k in range(3):
+        Image.new("RGB", (16, 16), (80 * k, 0, 0)).save(tmp_path.joinpath(f"{k}.png"))
+    quad = "v 0 0 0\nv 1 0 0\nv 1 1 0\nvt 0 0\nvt 1 0\nvt {u} 1\nf 1/1 2/2 3/3\n"
+    tmp_path.joinpath("fits.obj").write_text(quad.format(u=1))
+    tmp_path.joinpath("repeats.obj").write_text(quad.format(u=3))
+
+    def material(k):
+        return {"FUNCTION": "MeshPhongMaterial", "ARGS": {"map": f"{k}.png"}}
+
+    objects = {
+        "a": {"GEOMETRY": {"FILE": "fits.obj"}, "MATERIAL": material(0)},
+        "b": {"GEOMETRY": {"FUNCTION": "BoxGeometry", "ARGS": [1, 1, 1]}, "MATERIAL": material(1)},
+        "c": {"GEOMETRY": {"FILE": "repeats.obj"}, "MATERIAL": material(2)},
+    }
+    cfg = {"SIHM": {"texture_atlas": True, "mesh_encoding": mesh_encoding}, "OBJECTS": objects}
+    parser = SihmParser(deepcopy(cfg), str(tmp_path.joinpath("index.js")), cfg_path=tmp_path)
+    parser.write_file()
+    index = tmp_path.joinpath("index.js").read_text()
+
+    # The map of the mesh whose texture coordinates repeat is not packed
+    assert sorted(parser._atlas_maps) == ['"0.png"', '"1.png"']
+
+    # Only the built-in geometry is remapped when the scene loads. The texture coordinates of
+    # the OBJ file are remapped when it is embedded.
+    assert re.findall(r"remapUVs\((\w+)", index) == ["b_geometry"]
+    rect = parser._atlas_maps['"0.png"'][1]
+    if mesh_encoding == "text":
+        files = [f.read_text() for f in tmp_path.glob("SIHM_EXTRA_FILE_*.js")]
+        assert any(remap_obj_uvs(quad.format(u=1), rect) in text for text in files)
+        assert any(quad.format(u=3) in text for text in files)
+    else:
+        # The texture coordinates of the packed mesh start at the corner of its rectangle
+        offsets = []
+        for f in tmp_path.glob("SIHM_EXTRA_MESH_*.js"):
+            text = f.read_text()
+            header, _ = json.JSONDecoder().raw_decode(text, text.index("{header: ") + 9)
+            offsets.append(header["uv"]["offset"])
+        offsets.sort()
+        assert offsets[0] == [0.0, 0.0]
+        assert offsets[1] == pytest.approx(rect[:2])
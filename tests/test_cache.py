@@ -0,0 +1,70 @@
+import io
+import os
+from pathlib import Path
+
+import pytest
+
+from sihm.cache import AssetCache, TeeWriter
+
+
+def test_hash(tmp_path: Path):
+    file = tmp_path.joinpath("a.txt")
+    file.write_text("content")
+
+    # Paths are hashed by their content, and items are separated
+    assert AssetCache.hash(file) == AssetCache.hash("content")
+    assert AssetCache.hash("ab", "c") != AssetCache.hash("a", "bc")
+    assert AssetCache.hash(b"ab") == AssetCache.hash("ab")
+
+
+def test_miss_and_hit(tmp_path: Path):
+    cache = AssetCache(tmp_path)
+    key = AssetCache.hash("asset")
+
+    f = io.StringIO()
+    assert not cache.read(key, f)
+    assert f.getvalue() == ""
+
+    out = io.StringIO()
+    with cache.writer(key) as cached:
+        TeeWriter(out, cached).write("payload")
+    assert out.getvalue() == "payload"
+
+    f = io.StringIO()
+    assert cache.read(key, f)
+    assert f.getvalue() == "payload"
+
+
+def test_atomic_write(tmp_path: Path):
+    cache = AssetCache(tmp_path)
+    key = AssetCache.hash("asset")
+
+    # An entry whose writer fails is not added, and leaves no temporary file behind
+    with pytest.raises(RuntimeError):
+        with cache.writer(key) as cached:
+            cached.write("partial")
+            raise RuntimeError()
+    assert not cache.read(key, io.StringIO())
+    assert os.listdir(tmp_path) == []
+
+    # Entries only appear under their key once they are complete
+    with cache.writer(key) as cached:
+        cached.write("partial")
+        assert not tmp_path.joinpath(key).exists()
+    assert tmp_path.joinpath(key).read_text() == "partial"
+
+
+def test_evict(tmp_path: Path):
+    # Room for two entries of 2**19 characters
+    cache = AssetCache(tmp_path, max_size=1.0)
+    keys = [AssetCache.hash(str(k)) for k in range(3)]
+    for k, key in enumerate(keys[:2]):
+        with cache.writer(key) as cached:
+            cached.write("x" * 2**19)
+        os.utime(tmp_path.joinpath(key), (k, k))
+
+    # Reading the oldest entry marks it as recently used, so the other one is evicted
+    assert cache.read(keys[0], io.StringIO())
+    with cache.writer(keys[2]) as cached:
+        cached.write("x" * 2**19)
+    assert sorted(os.listdir(tmp_path)) == sorted([keys[0], keys[2]])
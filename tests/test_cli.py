@@ -0,0 +1,22 @@
+import sys
+from pathlib import Path
+
+import click
+import pytest
+
+from sihm.__main__ import main
+
+
+@pytest.mark.parametrize(
+    "pattern, message",
+    [
+        ("missing.yaml", "does not exist"),
+        (".", "is a directory"),
+        ("missing_*.yaml", "No files match"),
+    ],
+)
+def test_missing_input(tmp_path: Path, monkeypatch, pattern, message):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(sys, "argv", ["sihm", "-i", pattern])
+    with pytest.raises(click.BadParameter, match=message):
+        main()
@@ -0,0 +1,108 @@
+import io
+import subprocess
+from copy import deepcopy
+from pathlib import Path
+from shutil import which
+
+import pytest
+
+from sihm.link import _import_to_const, _link_module, link_scene
+from sihm.parser import SihmParser
+
+
+def _node_check(tmp_path: Path, text: str) -> None:
+    """
+    Check that text is valid JavaScript with node, if it is installed.
+    """
+    if which("node") is None:
+        pytest.skip("node is not installed")
+    script = tmp_path.joinpath("linked.js")
+    script.write_text(text, encoding="utf8")
+    result = subprocess.run(["node", "--check", str(script)], capture_output=True, text=True)
+    assert result.returncode == 0, result.stderr
+
+
+def test_import_to_const():
+    assert _import_to_const("* as THREE", "three") == 'const THREE = SIHM.modules["three"];\n'
+    assert (
+        _import_to_const("{ decodeMesh, decompress as inflate }", "./decode")
+        == 'const { decodeMesh, decompress: inflate } = SIHM.modules["./decode"];\n'
+    )
+    assert _import_to_const("Animator", "./animator") == (
+        'const Animator = SIHM.modules["./animator"].default;\n'
+    )
+    with pytest.raises(ValueError):
+        _import_to_const("* as pako", "pako")
+
+
+@pytest.mark.parametrize("compressed", [False, True])
+def test_link_module(tmp_path: Path, compressed):
+    # Compressed assets await their decompression at the top level of the module
+    value = 'await inflate("eJwDAAAAAAE=")' if compressed else "[1, 2, 3]"
+    tmp_path.joinpath("SIHM_EXTRA_FILE_0.js").write_text(
+        'import { decompress as inflate } from "./decode";\n'
+        "const helper = 1;\n"
+        f"export const SIHM_EXTRA_FILE_0 = {value};\n"
+    )
+    f = io.StringIO()
+    _link_module(tmp_path, "SIHM_EXTRA_FILE_0", f)
+    text = f.getvalue()
+
+    assert 'const { decompress: inflate } = SIHM.modules["./decode"];' in text
+    assert "import " not in text
+    assert "export " not in text
+    assert text.startswith("const { SIHM_EXTRA_FILE_0 } = " + ("await " if compressed else ""))
+    _node_check(tmp_path, "(async () => {\n" + text + "\n})();\n")
+
+    with pytest.raises(ValueError):
+        _link_module(tmp_path, "SIHM_EXTRA_FILE_1", f)
+
+
+@pytest.mark.parametrize("compress", [False, {"min_size": 1}])
+def test_link_scene(tmp_path: Path, compress):
+    obj = tmp_path.joinpath("triangle.obj")
+    obj.write_text("v 0 0 0\nv 1 0 0\nv 0 1 0\nf 1 2 3\n")
+    times = [0.0, 1.0]
+    cfg = {
+        "SIHM": {"compress": compress},
+        "OBJECTS": {
+            "tri": {"GEOMETRY": {"FILE": str(obj)}, "ANIMATIONS": {"position": [times, [0] * 6]}}
+        },
+    }
+    src_dir = tmp_path.joinpath("src")
+    src_dir.mkdir()
+    parser = SihmParser(deepcopy(cfg), str(src_dir.joinpath("index.js")), cfg_path=tmp_path)
+    parser.write_file()
+    assert any(src_dir.glob("SIHM_EXTRA_*.js"))
+
+    # The linked scene is one script without imports or exports
+    f = io.StringIO()
+    link_scene(src_dir, f)
+    text = f.getvalue()
+    assert "SIHM_EXTRA_FILE_0" in text
+    assert "import " not in text
+    assert "export " not in text
+    assert ("= await (async () => {" in text) == bool(compress)
+    _node_check(tmp_path, text)
+
+
+def test_can_link(monkeypatch, capsys):
+    import sihm.link
+
+    monkeypatch.setattr(sihm.link, "runtime_bundle", lambda: Path("sihm_runtime.min.js"))
+    assert sihm.link.can_link([], [])
+    assert capsys.readouterr().out == ""
+
+    # Scenes that are compiled with webpack say why
+    assert not sihm.link.can_link(["stats-js"], [])
+    assert "stats-js" in capsys.readouterr().out
+    assert not sihm.link.can_link([], ["shader.glsl"])
+    assert "glslify" in capsys.readouterr().out
+
+    # A missing runtime is only reported once
+    monkeypatch.setattr(sihm.link, "runtime_bundle", lambda: None)
+    monkeypatch.setattr(sihm.link, "_warned_missing_runtime", False)
+    assert not sihm.link.can_link([], [])
+    assert "WARNING: The prebuilt runtime is not installed" in capsys.readouterr().out
+    assert not sihm.link.can_link([], [])
+    assert capsys.readouterr().out == ""
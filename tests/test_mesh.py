@@ -0,0 +1,119 @@
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from sihm.mesh import read_obj
+
+
+def test_read_obj(tmp_path: Path):
+    obj = tmp_path.joinpath("mesh.obj")
+    obj.write_text(
+        "# quad and triangle\n"
+        "v 0 0 0\n"
+        "v 1 0 0 1.0\n"
+        "v 1 1 0\n"
+        "v 0 1 0\n"
+        "vt 0 0\n"
+        "vt 1 1\n"
+        "vn 0 0 1\n"
+        "usemtl b\n"
+        "f 1/1/1 2/2/1 3//1 4\n"
+        "usemtl a\n"
+        "  f\t-4 -3/-1 -2\r\n"
+        "l 1 2\n"
+    )
+    mesh = read_obj(obj)
+
+    # The quad is split into a fan of two triangles, and the triangles keep their order within
+    # each material
+    expected = np.array([[0, 1, 2], [0, 2, 3], [0, 1, 2]])
+    positions = np.array([[0, 0, 0], [1, 0, 0], [1, 1, 0], [0, 1, 0]], dtype=np.float64)
+    np.testing.assert_array_equal(mesh["position"], positions[expected.reshape(-1)])
+    assert mesh["groups"] == [(0, 6, "b"), (6, 3, "a")]
+
+    # Missing texture coordinates are 0, and missing normals are the normal of the triangle
+    np.testing.assert_array_equal(
+        mesh["uv"], [[0, 0], [1, 1], [0, 0], [0, 0], [0, 0], [0, 0], [0, 0], [1, 1], [0, 0]]
+    )
+    np.testing.assert_array_equal(mesh["normal"], np.tile([0.0, 0.0, 1.0], (9, 1)))
+
+
+def test_read_obj_errors(tmp_path: Path):
+    obj = tmp_path.joinpath("mesh.obj")
+    obj.write_text("v 0 0 0\nv 1 0 0\n")
+    with pytest.raises(ValueError, match="does not contain any faces"):
+        read_obj(obj)
+
+    obj.write_text("v 0 0 0\nv 1 0 0\nv 1 1 0\nf 1/1/1/1 2 3\n")
+    with pytest.raises(ValueError, match="Could not read"):
+        read_obj(obj)
+
+
+def test_faces_before_usemtl(tmp_path: Path):
+    from sihm.mesh import encode_mesh
+
+    obj = tmp_path.joinpath("mesh.obj")
+    obj.write_text("v 0 0 0\nv 1 0 0\nv 1 1 0\nf 1 2 3\nusemtl a\nf 1 3 2\n")
+    mesh = read_obj(obj)
+
+    # Faces before the first usemtl are in a group without a name, which decodeMesh gives the
+    # default material, and the encoded mesh keeps that group
+    assert mesh["groups"] == [(0, 3, ""), (3, 3, "a")]
+    header, _ = encode_mesh(mesh)
+    assert [tuple(group) for group in header["groups"]] == [(0, 3, ""), (3, 3, "a")]
+
+
+def _sphere_obj(file: Path, n: int) -> None:
+    """
+    Write a UV sphere with n rings and 2n segments, whose halves use different materials.
+    """
+    theta = np.linspace(0.0, np.pi, n + 1)
+    phi = np.linspace(0.0, 2.0 * np.pi, 2 * n + 1)
+    t, p = np.meshgrid(theta, phi, indexing="ij")
+    v = np.stack([np.sin(t) * np.cos(p), np.sin(t) * np.sin(p), np.cos(t)], axis=-1)
+    ind = np.arange(v.shape[0] * v.shape[1]).reshape(v.shape[:2]) + 1
+    lines = [f"v {x} {y} {z}\n" for x, y, z in v.reshape(-1, 3)]
+    lines += [f"vt {u} {w}\n" for u, w in zip(p.reshape(-1) / (2.0 * np.pi), t.reshape(-1) / np.pi)]
+    for mat, rows in (("top", range(n // 2)), ("bottom", range(n // 2, n))):
+        lines.append(f"usemtl {mat}\n")
+        for i in rows:
+            for j in range(2 * n):
+                a, b, c, d = ind[i, j], ind[i + 1, j], ind[i + 1, j + 1], ind[i, j + 1]
+                lines.append(f"f {a}/{a} {b}/{b} {c}/{c}\nf {a}/{a} {c}/{c} {d}/{d}\n")
+    file.write_text("".join(lines))
+
+
+@pytest.mark.parametrize("ratio", [0.5, 0.25, 0.1])
+def test_simplify_mesh(tmp_path: Path, ratio):
+    from sihm.mesh import encode_mesh, simplify_mesh
+
+    obj = tmp_path.joinpath("sphere.obj")
+    _sphere_obj(obj, 40)
+    mesh = read_obj(obj)
+    n_tris = mesh["position"].shape[0] // 3
+    simple = simplify_mesh(mesh, ratio)
+
+    # The mesh keeps at least the target number of triangles, and not many more
+    kept = simple["position"].shape[0] // 3
+    assert ratio * n_tris <= kept <= 1.2 * ratio * n_tris
+    for key in ("normal", "uv"):
+        assert simple[key].shape[0] == 3 * kept
+
+    # The material groups tile the simplified triangles
+    assert [name for _, _, name in simple["groups"]] == ["top", "bottom"]
+    assert simple["groups"][0][0] == 0
+    assert sum(count for _, count, _ in simple["groups"]) == 3 * kept
+    for (start, count, _), (next_start, _, _) in zip(simple["groups"], simple["groups"][1:]):
+        assert start + count == next_start
+
+    # The encoded mesh only indexes its own vertices
+    header, data = encode_mesh(simple)
+    assert header["indices"] == 3 * kept
+    index = np.frombuffer(
+        data,
+        dtype=header["index_type"],
+        count=header["indices"],
+        offset=header["index_byte_offset"],
+    )
+    assert index.max() < header["vertices"]
@@ -0,0 +1,179 @@
+import json
+import re
+from copy import deepcopy
+from pathlib import Path
+from typing import Any, Dict, Tuple
+
+import pytest
+
+from sihm.parser import SihmParser
+
+
+@pytest.mark.filterwarnings("error::pytest.PytestUnraisableExceptionWarning")
+def test_bad_config_path(tmp_path: Path):
+    # Only the missing file is reported, not an error from cleaning up the partial parser
+    with pytest.raises(FileNotFoundError):
+        SihmParser(tmp_path.joinpath("missing.yaml"), str(tmp_path.joinpath("index.js")))
+
+
+def _build(cfg: Dict[Any, Any], directory: Path) -> Dict[str, str]:
+    """
+    Parse a config into a directory, and return the text of the written modules.
+    """
+    directory.mkdir()
+    parser = SihmParser(deepcopy(cfg), str(directory.joinpath("index.js")), cfg_path=directory)
+    parser.write_file()
+    return {f.name: f.read_text() for f in sorted(directory.glob("SIHM_EXTRA_*.js"))}
+
+
+@pytest.mark.parametrize("mesh_encoding", ["text", "quantized"])
+def test_cached_rebuild(tmp_path: Path, mesh_encoding):
+    obj = tmp_path.joinpath("triangle.obj")
+    obj.write_text("v 0 0 0\nv 1 0 0\nv 0 1 0\nf 1 2 3\n")
+    cache = {"directory": str(tmp_path.joinpath("cache"))}
+    scene = {"OBJECTS": {"tri": {"GEOMETRY": {"FILE": str(obj)}}}}
+
+    def cfg(asset_cache: Any) -> Dict[Any, Any]:
+        return {"SIHM": {"mesh_encoding": mesh_encoding, "asset_cache": asset_cache}, **scene}
+
+    # Builds that fill the cache and that read from it give the same modules as building
+    # without the cache
+    uncached = _build(cfg(False), tmp_path.joinpath("uncached"))
+    assert uncached
+    for k in range(2):
+        assert _build(cfg(cache), tmp_path.joinpath(f"cached_{k}")) == uncached
+    assert any(tmp_path.joinpath("cache").iterdir())
+
+
+@pytest.mark.parametrize("mesh_encoding", ["text", "quantized"])
+def test_cached_rebuild_with_other_options(tmp_path: Path, mesh_encoding):
+    # A strip of triangles that zlib compresses differently at different levels
+    obj = tmp_path.joinpath("strip.obj")
+    n = 2000
+    obj.write_text(
+        "".join(f"v {k % 7} {k // 2} {k % 2}\n" for k in range(n))
+        + "".join(f"f {k} {k + 1} {k + 2}\n" for k in range(1, n - 1))
+    )
+    cache = {"directory": str(tmp_path.joinpath("cache"))}
+    scene = {"OBJECTS": {"strip": {"GEOMETRY": {"FILE": str(obj)}}}}
+
+    def cfg(compress: Any, asset_cache: Any) -> Dict[Any, Any]:
+        sihm = {"mesh_encoding": mesh_encoding, "compress": compress, "asset_cache": asset_cache}
+        return {"SIHM": sihm, **scene}
+
+    # Building with compression after building without it, the other way around, or with
+    # another compression level, gives the same modules as building without the cache
+    options = [False, {"min_size": 1}, {"min_size": 1, "level": 1}, False, {"min_size": 1}]
+    for k, compress in enumerate(options):
+        cached = _build(cfg(compress, cache), tmp_path.joinpath(f"cached_{k}"))
+        uncached = _build(cfg(compress, False), tmp_path.joinpath(f"uncached_{k}"))
+        assert cached == uncached
+
+
+def test_keyframe_tolerance(tmp_path: Path, capsys):
+    times = [0.0, 1.0, 2.0]
+    box = {"FUNCTION": "BoxGeometry", "ARGS": [1, 1, 1]}
+    scene = {"OBJECTS": {"box": {"GEOMETRY": box, "ANIMATIONS": {"position": [times, [0] * 9]}}}}
+
+    # Decimation is reported once the scene is written
+    _build({"SIHM": {"keyframe_tolerance": {"position": 0.1}}, **scene}, tmp_path.joinpath("a"))
+    assert capsys.readouterr().out.splitlines()[-2:] == [
+        "  box.position: kept 2 of 3 keyframes",
+        "  Total: kept 2 of 3 keyframes",
+    ]
+
+    with pytest.raises(ValueError):
+        _build({"SIHM": {"keyframe_tolerance": {"scale": 0.1}}, **scene}, tmp_path.joinpath("b"))
+    with pytest.raises(ValueError):
+        _build({"SIHM": {"keyframe_tolerance": -1}, **scene}, tmp_path.joinpath("c"))
+
+
+def _code_scene(text: str) -> Tuple[Dict[str, str], Dict[Tuple[str, str], Any]]:
+    """
+    Get the parent of each object and the keyframes of each track of a code mode index.js.
+    """
+    parents = {child: parent for parent, child in re.findall(r"^(\w+)\.add\((\w+)\);", text, re.M)}
+    tracks = {
+        (name, track): (json.loads(times), json.loads(values))
+        for name, track, times, values in re.findall(
+            r"KeyframeTrack\((\w+)_uuid \+ '\.(\w+)', (\[[^\]]*\]),(\[[^\]]*\])\)", text
+        )
+    }
+    return parents, tracks
+
+
+def _payload_scene(text: str) -> Tuple[Dict[str, str], Dict[Tuple[str, str], Any]]:
+    """
+    Get the parent of each object and the keyframes of each track of a payload mode index.js.
+    """
+    payload = json.loads(re.search(r"JSON\.parse\('(.*?)'\)", text).group(1))
+    assert payload["encoding"] == "text"
+    objects = payload["objects"]
+    parents = {obj[0]: "scene" if obj[1] < 0 else objects[obj[1]][0] for obj in objects}
+    tracks = {
+        (obj[0], track): (times, values) for obj in objects for track, times, values in obj[4]
+    }
+    return parents, tracks
+
+
+def test_payload_scene(tmp_path: Path):
+    box = {"FUNCTION": "BoxGeometry", "ARGS": [1, 1, 1]}
+    times = [0.0, 0.5, 1.0]
+    scene = {
+        "OBJECTS": {
+            "a": {
+                "GEOMETRY": box,
+                "ANIMATIONS": {"position": [times, [0, 0, 0, 1, 1, 1, 2, 2, 2]]},
+                "CHILDREN": {
+                    "b": {
+                        "GEOMETRY": box,
+                        "ANIMATIONS": {"quaternion": [times, [0, 0, 0, 1] * 3]},
+                        "CHILDREN": {"c": {"GEOMETRY": box}},
+                    }
+                },
+            },
+            "d": {"GEOMETRY": box, "ANIMATIONS": {"scale": [times, [1, 1, 1] * 3]}},
+        }
+    }
+
+    # Both formats build the same object tree with the same tracks
+    texts = {}
+    for scene_format in ("code", "payload"):
+        directory = tmp_path.joinpath(scene_format)
+        _build({"SIHM": {"scene_format": scene_format}, **scene}, directory)
+        texts[scene_format] = directory.joinpath("index.js").read_text()
+    parents, tracks = _code_scene(texts["code"])
+    assert parents == {"a": "scene", "b": "a", "c": "b", "d": "scene"}
+    assert len(tracks) == 3
+    assert _payload_scene(texts["payload"]) == (parents, tracks)
+
+
+def test_instancing(tmp_path: Path):
+    box = {"FUNCTION": "BoxGeometry", "ARGS": [1, 1, 1]}
+    sphere = {"FUNCTION": "SphereGeometry", "ARGS": [1]}
+    red = {"FUNCTION": "MeshPhongMaterial", "ARGS": {"color": 0xFF0000}}
+    blue = {"FUNCTION": "MeshPhongMaterial", "ARGS": {"color": 0x0000FF}}
+    objects = {
+        "a": {"GEOMETRY": box, "MATERIAL": red},
+        "b": {"GEOMETRY": box, "MATERIAL": red},
+        "c": {"GEOMETRY": box, "MATERIAL": blue},
+        "d": {"GEOMETRY": sphere, "MATERIAL": red},
+        "e": {
+            "GEOMETRY": box,
+            "MATERIAL": red,
+            "CHILDREN": {"f": {"GEOMETRY": box, "MATERIAL": red}},
+        },
+    }
+    directory = tmp_path.joinpath("scene")
+    directory.mkdir()
+    parser = SihmParser(
+        {"SIHM": {"instancing": True}, "OBJECTS": deepcopy(objects)},
+        str(directory.joinpath("index.js")),
+        cfg_path=directory,
+    )
+    parser.write_file()
+
+    # Only objects with the same geometry, material, and parent are instanced together
+    assert sorted(parser._instance_keys) == [("scene", "a"), ("scene", "b"), ("scene", "e")]
+    assert len(set(parser._instance_keys.values())) == 1
+    assert "MyInstances" in directory.joinpath("index.js").read_text()
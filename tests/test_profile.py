@@ -0,0 +1,76 @@
+import json
+from pathlib import Path
+
+import pytest
+
+import sihm.profile
+from sihm.profile import Profiler, phase, profiling
+
+
+def test_phase_nesting():
+    # Phases do nothing without an active profiler
+    with phase("ignored"):
+        assert not profiling()
+
+    with Profiler() as profiler:
+        assert profiling()
+        with phase("outer"):
+            with phase("inner"):
+                data = bytearray(4 * 1024**2)
+            del data
+            with phase("second"):
+                pass
+    assert not profiling()
+
+    assert [(p.name, p.depth) for p in profiler.phases] == [
+        ("outer", 0),
+        ("inner", 1),
+        ("second", 1),
+    ]
+    outer, inner, second = profiler.phases
+
+    # The peaks and time of a phase include those of the phases nested in it
+    assert inner.python_peak >= 4 * 1024**2
+    assert outer.python_peak >= inner.python_peak
+    assert second.python_peak < inner.python_peak
+    assert outer.seconds >= inner.seconds + second.seconds
+    assert profiler.seconds >= outer.seconds
+    if inner.rss_peak is not None:
+        assert outer.rss_peak >= inner.rss_peak
+
+    with pytest.raises(ValueError):
+        with Profiler():
+            with Profiler():
+                pass
+    assert not profiling()
+
+
+def test_write_json(tmp_path: Path):
+    with Profiler() as profiler:
+        with phase("parse"):
+            with phase("textures"):
+                pass
+    file = tmp_path.joinpath("profile.json")
+    profiler.write_json(file)
+    report = json.loads(file.read_text())
+
+    assert set(report) == {"seconds", "phases"}
+    assert isinstance(report["seconds"], float)
+    assert [(p["name"], p["depth"]) for p in report["phases"]] == [("parse", 0), ("textures", 1)]
+    for p in report["phases"]:
+        assert set(p) == {"name", "depth", "seconds", "python_peak", "rss_peak"}
+        assert isinstance(p["seconds"], float)
+        assert isinstance(p["python_peak"], int)
+        assert p["rss_peak"] is None or isinstance(p["rss_peak"], int)
+
+
+def test_no_rss(monkeypatch, capsys):
+    # Platforms without /proc only profile Python allocations, and say so once
+    monkeypatch.setattr(sihm.profile, "_tree_rss", lambda pid: None)
+    monkeypatch.setattr(sihm.profile, "_noted_no_rss", False)
+    for k in range(2):
+        with Profiler() as profiler:
+            with phase("parse"):
+                pass
+        assert profiler.phases[0].rss_peak is None
+        assert ("NOTE: The resident set size" in capsys.readouterr().out) == (k == 0)
@@ -0,0 +1,72 @@
+import numpy as np
+import pytest
+
+from sihm.resample import resample, uniform_times
+
+
+def _z_rotation(angle):
+    """
+    xyzw quaternions of rotations about the z axis.
+    """
+    half = 0.5 * np.asarray(angle, dtype=np.float64)
+    zero = np.zeros_like(half)
+    return np.stack([zero, zero, np.sin(half), np.cos(half)], axis=-1)
+
+
+def test_uniform_times():
+    np.testing.assert_allclose(uniform_times(np.array([0.0, 0.35, 1.0]), 4.0), np.arange(5) / 4.0)
+
+    # The grid spans the times of all tracks, and stops before a last time that is off the grid
+    times = np.array([[0.5, 0.9], [0.0, 0.8]])
+    np.testing.assert_allclose(uniform_times(times, 2.0), [0.0, 0.5])
+
+    with pytest.raises(ValueError):
+        uniform_times(times, 0.0)
+
+
+def test_resample_vectors():
+    times = np.array([0.0, 1.0, 3.0])
+    values = np.array([[0.0, 0.0], [1.0, 2.0], [3.0, 2.0]])
+    new_times = np.array([-1.0, 0.5, 1.0, 2.0, 4.0])
+    out = resample(times, values, new_times)
+
+    # Times outside the track hold its first and last values
+    expected = np.stack([np.interp(new_times, times, values[:, k]) for k in range(2)], axis=-1)
+    np.testing.assert_allclose(out, expected)
+
+
+def test_resample_batched():
+    rng = np.random.default_rng(0)
+    times = np.sort(rng.random((4, 20)), axis=1)
+    values = rng.normal(size=(4, 20, 3))
+    new_times = np.linspace(0.0, 1.0, 50)
+
+    # Tracks with their own times give the same result as resampling each one alone
+    out = resample(times, values, new_times)
+    assert out.shape == (4, 50, 3)
+    for k in range(4):
+        np.testing.assert_allclose(out[k], resample(times[k], values[k], new_times))
+
+    # Shared times broadcast over the tracks
+    out = resample(times[0], values, new_times)
+    for k in range(4):
+        np.testing.assert_allclose(out[k], resample(times[0], values[k], new_times))
+
+
+def test_resample_quaternions():
+    times = np.array([0.0, 1.0])
+    q = _z_rotation([0.0, np.pi / 2])
+
+    # Slerp between rotations about one axis rotates at a constant rate
+    out = resample(times, q, np.array([0.25, 0.5]), quaternion=True)
+    np.testing.assert_allclose(out, _z_rotation([np.pi / 8, np.pi / 4]), atol=1e-12)
+
+    with pytest.raises(ValueError):
+        resample(times, values=np.zeros((2, 3)), new_times=times, quaternion=True)
+
+
+def test_resample_errors():
+    with pytest.raises(ValueError):
+        resample(np.array([1.0, 0.0]), np.zeros((2, 3)), np.array([0.5]))
+    with pytest.raises(ValueError):
+        resample(np.array([0.0, 1.0, 2.0]), np.zeros((2, 3)), np.array([0.5]))
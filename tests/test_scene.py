@@ -0,0 +1,91 @@
+from pathlib import Path
+from typing import Any, Dict
+
+from sihm.parser import SihmParser
+from sihm.scene import Light, Object, Scene
+
+SYSTEM_DIR = Path(__file__).parent.joinpath("test_system")
+
+
+def _build(cfg: Any, directory: Path, cfg_path: Any = None) -> Dict[str, str]:
+    """
+    Parse a config into a directory, and return the text of the written files.
+    """
+    directory.mkdir()
+    parser = SihmParser(cfg, str(directory.joinpath("index.js")), cfg_path=cfg_path)
+    parser.write_file()
+    return {f.name: f.read_text() for f in sorted(directory.glob("*.js"))}
+
+
+def test_system_scene(tmp_path: Path):
+    """
+    Build tests/test_system/test.yaml with the scene API.
+    """
+    skybox = [f"../../common/skyboxes/sh_{k}.png" for k in "fbudrl"]
+    scene = Scene(
+        base_dir=SYSTEM_DIR,
+        background=skybox,
+        show_stats=True,
+        extra_modules=["glslify", "glsl-noise", "three"],
+    )
+    scene.add(Light("l1", "HemisphereLight", [0xFFFFFF, 0x444444], position=[0, 20, 0]))
+    scene.add(Light("l2", "DirectionalLight", [0xFFFFFF], position=[-3, 10, -10]))
+
+    sphere = Object(
+        "sphere",
+        geometry={"FUNCTION": "SphereGeometry", "ARGS": [1, 30, 30]},
+        material={
+            "FUNCTION": "ShaderMaterial",
+            "ARGS": {
+                "vertexShader": "../../common/shaders/3d_perlin_noise.vert",
+                "fragmentShader": "../../common/shaders/3d_perlin_noise.frag",
+                "uniforms": {"time": None},
+            },
+            "USES_GLSLIFY": True,
+        },
+    )
+    sphere.add_track("position", [0, 1, 2], [1, 2, 3, 4, 5, 6, 7, 8, 9])
+    sphere2 = sphere.add_child(
+        Object(
+            "sphere2",
+            geometry="../../common/meshes/sphere.obj",
+            material="../../common/meshes/sphere.mtl",
+        )
+    )
+    sphere2.add_track("position", [0, 1, 2], [1, 6, 3, 8, 2, 1, 1, 3, 2])
+    scene.add(sphere)
+
+    box = Object(
+        "box",
+        geometry={"FUNCTION": "BoxGeometry", "ARGS": [1, 2, 3]},
+        material={
+            "FUNCTION": "MeshLambertMaterial",
+            "ARGS": {
+                "color": "0xff6600",
+                "envMap": skybox,
+                "combine": "THREE.MixOperation",
+                "reflectivity": 0.3,
+            },
+        },
+    )
+    box.add_track("position", [0, 1, 3], [1, 2, 0, 4, 8, 6, 6, 2, 3])
+    scene.add(box)
+
+    expected = _build(SYSTEM_DIR.joinpath("test.yaml"), tmp_path.joinpath("yaml"))
+    out = _build(scene.to_config(), tmp_path.joinpath("scene"), cfg_path=scene.base_dir)
+    assert out == expected
+
+
+def test_track_data_is_not_copied():
+    import numpy as np
+
+    times = np.linspace(0.0, 1.0, 5)
+    values = np.zeros((5, 3))
+    obj = Object("ball", geometry={"FUNCTION": "SphereGeometry", "ARGS": [1]})
+    obj.add_track("position", times, values, interpolation="THREE.InterpolateDiscrete")
+    scene = Scene()
+    scene.add(obj)
+
+    track = scene.to_config()["OBJECTS"]["ball"]["ANIMATIONS"]["position"]
+    assert track[0] is times and track[1] is values
+    assert track[2] == "THREE.InterpolateDiscrete"
@@ -0,0 +1,63 @@
+from copy import deepcopy
+from pathlib import Path
+
+import pytest
+
+from sihm.parser import SihmParser
+from sihm.sizes import SizeManifest
+
+
+def test_report():
+    sizes = SizeManifest()
+    sizes.add("a", "geometry", 100)
+    sizes.add("a", "track position", 50)
+    sizes.add("a/b", "geometry", 300)
+    sizes.add("a/b", "material", 0)
+    sizes.add("c", "track position", 400, payload=True)
+    sizes.payload_scale = 0.5
+    sizes.add_module("SIHM_EXTRA_FILE_0", 20)
+    sizes.use("SIHM_EXTRA_FILE_0", "a/b")
+    sizes.use("SIHM_EXTRA_FILE_0", None)
+
+    # Objects are sorted by size, and payload parts are scaled by the payload compression
+    report = sizes.report(1000)
+    assert list(report["objects"]) == ["a/b", "c", "a"]
+    assert report["objects"]["a"] == {
+        "total": 150,
+        "parts": {"geometry": 100, "track position": 50},
+    }
+    assert report["objects"]["c"]["total"] == 200
+    assert report["modules"] == {"SIHM_EXTRA_FILE_0": {"total": 20, "objects": ["a/b", "SCENE"]}}
+    assert report["runtime"] == 1000 - 150 - 300 - 200 - 20
+
+
+@pytest.mark.parametrize("scene_format", ["code", "payload"])
+def test_object_paths(tmp_path: Path, scene_format):
+    # Objects that share a name under different parents are kept apart
+    times = [0.0, 1.0]
+    boxes = iter(range(1, 10))
+
+    def obj(children=None):
+        # Payload mode scenes share geometries, so each object gets its own
+        out = {
+            "GEOMETRY": {"FUNCTION": "BoxGeometry", "ARGS": [next(boxes), 1, 1]},
+            "ANIMATIONS": {"position": [times, [0] * 6]},
+        }
+        if children:
+            out["CHILDREN"] = children
+        return out
+
+    objects = {"a": obj({"wheel": obj()}), "b": obj({"wheel": obj()})}
+    if scene_format == "code":
+        # Variables of code mode scenes are named after their objects
+        objects["b"]["CHILDREN"] = {"wheel2": obj()}
+    cfg = {"SIHM": {"scene_format": scene_format}, "OBJECTS": objects}
+    parser = SihmParser(deepcopy(cfg), str(tmp_path.joinpath("index.js")), cfg_path=tmp_path)
+    parser.write_file()
+
+    report = parser.sizes.report(tmp_path.joinpath("index.js").stat().st_size)
+    child = "wheel" if scene_format == "payload" else "wheel2"
+    assert sorted(report["objects"]) == sorted(["a", "a/wheel", "b", f"b/{child}"])
+    for entry in report["objects"].values():
+        assert entry["parts"]["geometry"] > 0
+        assert entry["parts"]["track position"] > 0
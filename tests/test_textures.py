@@ -0,0 +1,122 @@
+from copy import deepcopy
+from io import BytesIO
+from pathlib import Path
+
+import pytest
+
+from sihm.textures import _snap_power_of_two, target_size, texture_options
+
+Image = pytest.importorskip("PIL.Image")
+
+
+def test_texture_options():
+    assert texture_options({"MAX_SIZE": 64, "format": "jpg"}) == {"max_size": 64, "format": "jpeg"}
+    for bad in ({"max_size": 0}, {"format": "gif"}, {"quality": 101}, {"max_pixels": True}):
+        with pytest.raises(ValueError):
+            texture_options(bad)
+
+
+def test_snap_power_of_two():
+    assert [_snap_power_of_two(n, 1024) for n in (1, 3, 5, 6, 100, 512, 700)] == [
+        1,
+        4,
+        4,
+        8,
+        128,
+        512,
+        512,
+    ]
+
+    # Sizes never snap past the maximum size
+    assert _snap_power_of_two(1000, 512) == 512
+    assert _snap_power_of_two(1000, 300) == 256
+
+
+def test_target_size():
+    assert target_size((640, 480), {}) == (640, 480)
+
+    # Downscaling keeps the aspect ratio
+    assert target_size((640, 480), {"max_size": 320}) == (320, 240)
+    assert target_size((100, 1), {"max_size": 10}) == (10, 1)
+    assert target_size((320, 240), {"max_size": 320}) == (320, 240)
+
+    assert target_size((640, 480), {"power_of_two": True}) == (512, 512)
+    assert target_size((640, 480), {"max_size": 320, "power_of_two": True}) == (256, 256)
+
+
+def _gradient(file: Path, size, alpha: bool = False) -> None:
+    """
+    Save a smooth image, which compresses well as PNG.
+    """
+    img = Image.linear_gradient("L").resize(size)
+    if alpha:
+        rgba = img.convert("RGBA")
+        rgba.putalpha(img)
+        rgba.save(file)
+    else:
+        img.convert("RGB").save(file)
+
+
+def test_encode_texture(tmp_path: Path):
+    from sihm.textures import encode_texture
+
+    png = tmp_path.joinpath("texture.png")
+    _gradient(png, (64, 32))
+    original = png.read_bytes()
+
+    # Textures that the options do not change are kept as they are
+    data, fmt, entry = encode_texture(png, {"max_size": 64})
+    assert (data, fmt) == (original, "png")
+    assert entry == (str(png), (64, 32), (64, 32), len(original), len(original))
+
+    data, fmt, entry = encode_texture(png, {"max_size": 16, "format": "jpeg", "quality": 50})
+    assert fmt == "jpeg"
+    assert entry[1:] == ((64, 32), (16, 8), len(original), len(data))
+    with Image.open(BytesIO(data)) as img:
+        assert img.format == "JPEG"
+        assert img.size == (16, 8)
+
+    # Transparent textures stay PNG
+    rgba = tmp_path.joinpath("alpha.png")
+    _gradient(rgba, (8, 8), alpha=True)
+    data, fmt, _ = encode_texture(rgba, {"format": "jpeg"})
+    assert fmt == "png"
+
+
+def test_max_pixels(tmp_path: Path):
+    from sihm.textures import encode_texture
+
+    png = tmp_path.joinpath("texture.png")
+    _gradient(png, (64, 64))
+    with pytest.raises(ValueError, match="raise max_pixels"):
+        encode_texture(png, {"max_pixels": 64 * 64 - 1})
+    assert encode_texture(png, {"max_pixels": 64 * 64})[2][1] == (64, 64)
+
+    # Images larger than Pillow opens by default can be allowed
+    limit = Image.MAX_IMAGE_PIXELS
+    Image.MAX_IMAGE_PIXELS = 1000
+    try:
+        assert encode_texture(png, {"max_size": 32})[2][2] == (32, 32)
+    finally:
+        Image.MAX_IMAGE_PIXELS = limit
+
+
+def test_mtl_texture_options(tmp_path: Path):
+    from sihm.parser import SihmParser
+
+    _gradient(tmp_path.joinpath("texture.png"), (64, 64))
+    tmp_path.joinpath("mesh.mtl").write_text("newmtl a\nmap_Kd texture.png\n")
+    tmp_path.joinpath("mesh.obj").write_text(
+        "mtllib mesh.mtl\nv 0 0 0\nv 1 0 0\nv 0 1 0\nusemtl a\nf 1 2 3\n"
+    )
+    geometry = {"FILE": "mesh.obj"}
+    objects = {
+        "a": {"GEOMETRY": geometry, "MATERIAL": {"FILE": "mesh.mtl"}},
+        "b": {"GEOMETRY": geometry, "MATERIAL": {"FILE": "mesh.mtl", "TEXTURES": {"max_size": 8}}},
+    }
+    cfg = {"SIHM": {"textures": {"max_size": 32}}, "OBJECTS": objects}
+    parser = SihmParser(deepcopy(cfg), str(tmp_path.joinpath("index.js")), cfg_path=tmp_path)
+    parser.write_file()
+
+    # The maps of an MTL file get the texture options of their material
+    assert sorted(entry[2] for entry in parser.texture_report) == [(8, 8), (32, 32)]
@@ -0,0 +1,189 @@
+import io
+import json
+import re
+import zlib
+from base64 import b64decode
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from sihm.tracks import (
+    CHUNK_SIZE,
+    TRACK_ENCODINGS,
+    _load_npz_member,
+    decimate_track,
+    load_track_file,
+    track_to_array,
+    track_windows,
+    write_base64,
+    write_compressed_array,
+    write_decoded_array,
+)
+
+
+def _decode(text: str, encoding: str) -> np.ndarray:
+    """
+    Decode base64 text written by write_base64.
+    """
+    return np.frombuffer(b64decode(text), dtype=TRACK_ENCODINGS[encoding])
+
+
+def test_track_to_array():
+    assert track_to_array("[0, 1.5, 2]").tolist() == [0.0, 1.5, 2.0]
+    assert track_to_array([[1, 2], [3, 4]]).dtype == np.float64
+
+    # Contiguous floating point arrays are not copied
+    arr = np.arange(6, dtype=np.float32).reshape(3, 2)
+    out = track_to_array(arr)
+    assert out.dtype == np.float32
+    assert np.shares_memory(out, arr)
+
+
+@pytest.mark.parametrize("encoding", ["float32", "float64"])
+def test_base64_round_trip(encoding):
+    # Span several chunks, so the concatenated base64 chunks must decode as one string
+    arr = np.random.default_rng(0).normal(size=2 * CHUNK_SIZE + 7)
+    f = io.StringIO()
+    write_base64(f, arr, encoding)
+    out = _decode(f.getvalue(), encoding)
+    np.testing.assert_array_equal(out, arr.astype(TRACK_ENCODINGS[encoding]))
+
+
+@pytest.mark.parametrize("encoding", ["float32", "float64"])
+def test_decoded_array(encoding):
+    arr = np.linspace(0.0, 1.0, 11)
+    f = io.StringIO()
+    write_decoded_array(f, arr, encoding)
+    match = re.fullmatch(r'(\w+)\("([^"]*)"\)', f.getvalue())
+    assert match is not None
+    assert match.group(1) == (
+        "decodeFloat32Array" if encoding == "float32" else "decodeFloat64Array"
+    )
+    np.testing.assert_array_equal(_decode(match.group(2), encoding), arr.astype(encoding))
+
+
+@pytest.mark.parametrize("encoding", ["text", "float32", "float64"])
+def test_compressed_array_round_trip(encoding):
+    arr = np.random.default_rng(1).normal(size=CHUNK_SIZE + 5)
+    f = io.StringIO()
+    write_compressed_array(f, arr, encoding, 6)
+    data = re.search(r'decompress(?:Text)?\("([^"]*)"\)', f.getvalue()).group(1)
+    raw = zlib.decompress(b64decode(data))
+    if encoding == "text":
+        out = np.array(json.loads(raw))
+        np.testing.assert_array_equal(out, arr)
+    else:
+        out = np.frombuffer(raw, dtype=TRACK_ENCODINGS[encoding])
+        np.testing.assert_array_equal(out, arr.astype(TRACK_ENCODINGS[encoding]))
+
+
+@pytest.mark.parametrize("compressed", [False, True])
+def test_npz_members(tmp_path: Path, compressed):
+    times = np.linspace(0.0, 1.0, 5)
+    values = np.arange(15, dtype=np.float32).reshape(5, 3)
+    fortran = np.asfortranarray(values)
+    file = tmp_path.joinpath("track.npz")
+    save = np.savez_compressed if compressed else np.savez
+    save(file, t=times, v=values, f=fortran)
+
+    for key, expected in (("t", times), ("v", values), ("f", fortran)):
+        arr = _load_npz_member(file, key)
+        assert isinstance(arr, np.memmap) != compressed
+        assert arr.dtype == expected.dtype
+        np.testing.assert_array_equal(arr, expected)
+
+    with pytest.raises(ValueError):
+        _load_npz_member(file, "missing")
+
+
+@pytest.mark.parametrize("npz", [False, True])
+def test_track_files_stay_memory_mapped(tmp_path: Path, capsys, npz):
+    times = np.linspace(0.0, 1.0, 4)
+    values = np.arange(12, dtype=np.float32).reshape(4, 3)
+    if npz:
+        np.savez(tmp_path.joinpath("track.npz"), t=times, v=values)
+        track = {"FILE": "track.npz", "TIME": "t", "VALUES": "v"}
+    else:
+        np.save(tmp_path.joinpath("t.npy"), times)
+        np.save(tmp_path.joinpath("v.npy"), values)
+        track = {"TIME": "t.npy", "VALUES": "v.npy"}
+
+    # The flattened arrays are views of the memory-mapped files
+    for arr, expected in zip(load_track_file(track, tmp_path), (times, values)):
+        assert isinstance(arr, np.memmap)
+        flat = track_to_array(arr)
+        assert np.shares_memory(flat, arr)
+        np.testing.assert_array_equal(flat, expected.reshape(-1))
+    assert capsys.readouterr().out == ""
+
+
+def test_fortran_track_file(tmp_path: Path, capsys):
+    values = np.asfortranarray(np.arange(12, dtype=np.float64).reshape(4, 3))
+    np.save(tmp_path.joinpath("t.npy"), np.arange(4.0))
+    np.save(tmp_path.joinpath("v.npy"), values)
+    _, arr = load_track_file({"TIME": "t.npy", "VALUES": "v.npy"}, tmp_path)
+
+    # Keyframes are flattened in row-major order, which needs a copy
+    assert "not stored in C order" in capsys.readouterr().out
+    np.testing.assert_array_equal(track_to_array(arr), values.reshape(-1))
+
+
+def test_track_windows():
+    times = np.arange(11, dtype=np.float64)
+    windows = track_windows(times, 3.0, margin=1)
+
+    # Windows tile the track, and the last one ends at the last keyframe
+    assert [(w[0], w[1]) for w in windows] == [(0.0, 3.0), (3.0, 6.0), (6.0, 9.0), (9.0, 10.0)]
+
+    # Each window holds the keyframes that bracket it plus one on either side, clipped to the
+    # track, so neighboring windows overlap
+    assert [(w[2], w[3]) for w in windows] == [(0, 5), (2, 8), (5, 11), (8, 11)]
+
+
+def test_track_windows_uneven():
+    times = np.array([0.0, 0.1, 0.2, 2.5, 2.6, 7.0])
+    for start, end, lo, hi in track_windows(times, 2.0, margin=0):
+        # The keyframes of a window bracket its start and end
+        assert times[lo] <= start
+        assert times[hi - 1] >= end
+
+    # A track shorter than one window is one window over the whole track
+    assert track_windows(times, 100.0) == [(0.0, 7.0, 0, 6)]
+
+
+def test_decimate_track():
+    times = np.linspace(0.0, 1.0, 101)
+    values = np.stack([times, np.where(times < 0.5, 0.0, times - 0.5)], axis=-1)
+    keep = decimate_track(times, values, 1e-9)
+
+    # The piecewise linear track only needs its end points and the kink
+    assert keep.tolist() == [0, 50, 100]
+
+    keep = decimate_track(times, np.sin(6.0 * values), 1e-3)
+    interp = np.stack(
+        [np.interp(times, times[keep], np.sin(6.0 * values[keep, k])) for k in range(2)], axis=-1
+    )
+    assert np.max(np.linalg.norm(interp - np.sin(6.0 * values), axis=-1)) <= 1e-3
+
+
+def test_decimate_quaternion_track():
+    times = np.linspace(0.0, 1.0, 21)
+    angle = np.pi * times
+    values = np.stack(
+        [np.zeros_like(angle), np.zeros_like(angle), np.sin(angle / 2), np.cos(angle / 2)],
+        axis=-1,
+    )
+
+    # A constant rate rotation about one axis is exactly a slerp between its end points
+    assert decimate_track(times, values, 1e-6, quaternion=True).tolist() == [0, 20]
+
+
+def test_keyframe_tolerance():
+    from sihm.tracks import keyframe_tolerance
+
+    assert keyframe_tolerance(1, ["position"]) == 1.0
+    assert keyframe_tolerance({"position": 0}, ["position", "quaternion"]) == {"position": 0.0}
+    for bad in (-1.0, "0.1", True, float("nan"), {"position": -1.0}, {"scale": 0.1}):
+        with pytest.raises(ValueError):
+            keyframe_tolerance(bad, ["position"])
@@ -0,0 +1,109 @@
+import numpy as np
+import pytest
+
+from sihm.utils import (
+    quat_conjugate,
+    quat_continuity,
+    quat_from_dcm,
+    quat_from_euler,
+    quat_from_scalar_first,
+    quat_multiply,
+    quat_normalize,
+    quat_slerp,
+)
+
+
+def _axis_angle(axis, angle):
+    """
+    xyzw quaternions of rotations about an axis.
+    """
+    axis = np.asarray(axis, dtype=np.float64)
+    half = 0.5 * np.asarray(angle, dtype=np.float64)[..., None]
+    return np.concatenate([np.sin(half) * axis, np.cos(half)], axis=-1)
+
+
+def _dcm(q):
+    """
+    Rotation matrices of xyzw quaternions, which rotate child vectors into the parent frame.
+    """
+    x, y, z, w = np.moveaxis(q, -1, 0)
+    return np.stack(
+        [
+            np.stack([1 - 2 * (y * y + z * z), 2 * (x * y - z * w), 2 * (x * z + y * w)], -1),
+            np.stack([2 * (x * y + z * w), 1 - 2 * (x * x + z * z), 2 * (y * z - x * w)], -1),
+            np.stack([2 * (x * z - y * w), 2 * (y * z + x * w), 1 - 2 * (x * x + y * y)], -1),
+        ],
+        axis=-2,
+    )
+
+
+def _random_quats(n, seed=0):
+    return quat_normalize(np.random.default_rng(seed).normal(size=(n, 4)))
+
+
+def test_slerp():
+    q0 = _axis_angle([0, 0, 1], 0.0)
+    q1 = _axis_angle([0, 0, 1], 2.0)
+    t = np.array([0.0, 0.25, 1.0])
+    np.testing.assert_allclose(quat_slerp(q0, q1, t), _axis_angle([0, 0, 1], 2.0 * t), atol=1e-12)
+
+    # The shortest path is taken when the quaternions are in opposite hemispheres
+    np.testing.assert_allclose(quat_slerp(q0, -q1, t), _axis_angle([0, 0, 1], 2.0 * t), atol=1e-12)
+
+    # Nearly parallel quaternions fall back to a normalized lerp
+    out = quat_slerp(q0, _axis_angle([0, 0, 1], 1e-10), 0.5)
+    np.testing.assert_allclose(np.linalg.norm(out), 1.0)
+
+
+def test_continuity():
+    q = _axis_angle([1, 0, 0], np.linspace(0.0, 1.0, 6))
+    flipped = q * np.array([1, -1, -1, 1, -1, 1])[:, None]
+    np.testing.assert_allclose(quat_continuity(flipped), q)
+
+    # Histories of many objects are made continuous along their time axis
+    np.testing.assert_allclose(quat_continuity(np.stack([flipped, -flipped])), np.stack([q, -q]))
+
+
+def test_multiply_and_conjugate():
+    q0 = _random_quats(10, 0)
+    q1 = _random_quats(10, 1)
+
+    # The product composes rotations, with q0 applied after q1
+    np.testing.assert_allclose(_dcm(quat_multiply(q0, q1)), _dcm(q0) @ _dcm(q1), atol=1e-12)
+
+    # The conjugate inverts unit quaternions, and does not change its input
+    copy = q0.copy()
+    identity = quat_multiply(quat_conjugate(q0), q0)
+    np.testing.assert_allclose(identity, np.tile([0.0, 0.0, 0.0, 1.0], (10, 1)), atol=1e-12)
+    np.testing.assert_array_equal(q0, copy)
+
+
+def test_scalar_first():
+    np.testing.assert_array_equal(quat_from_scalar_first([1.0, 2.0, 3.0, 4.0]), [2, 3, 4, 1])
+
+
+@pytest.mark.parametrize("order", ["XYZ", "YXZ", "ZXY", "ZYX", "YZX", "XZY"])
+def test_from_euler(order):
+    angles = np.random.default_rng(2).uniform(-np.pi, np.pi, size=(5, 3))
+    axes = {"X": [1, 0, 0], "Y": [0, 1, 0], "Z": [0, 0, 1]}
+
+    # Intrinsic rotations in the given order
+    expected = np.tile([0.0, 0.0, 0.0, 1.0], (5, 1))
+    for axis in order:
+        expected = quat_multiply(expected, _axis_angle(axes[axis], angles[:, "XYZ".index(axis)]))
+    np.testing.assert_allclose(quat_from_euler(angles, order.lower()), expected, atol=1e-12)
+
+    with pytest.raises(ValueError):
+        quat_from_euler(angles, "XXY")
+
+
+def test_from_dcm():
+    # Include rotations near 180 degrees about each axis, where w is close to 0
+    q = np.concatenate(
+        [_random_quats(20), _axis_angle(np.eye(3), np.full(3, np.pi - 1e-9))], axis=0
+    )
+    out = quat_from_dcm(_dcm(q))
+
+    # q and -q are the same rotation
+    sign = np.sign(np.sum(out * q, axis=-1, keepdims=True))
+    np.testing.assert_allclose(sign * out, q, atol=1e-9)
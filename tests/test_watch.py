@@ -0,0 +1,49 @@
+import os
+from pathlib import Path
+
+from sihm.build import make_project, update_project
+from sihm.watch import _changed_files, _stat_files
+
+
+def test_changed_files(tmp_path: Path):
+    a, b, c = (tmp_path.joinpath(name) for name in ("a.obj", "b.obj", "c.obj"))
+    a.write_text("v 0 0 0\n")
+    b.write_text("v 0 0 0\n")
+    stats = _stat_files([a, b, c])
+    assert stats[c] is None
+    assert _changed_files(stats, _stat_files([a, b, c])) == []
+
+    # Modified, deleted, and created files are all changes
+    os.utime(a, ns=(0, 0))
+    b.unlink()
+    c.write_text("v 0 0 0\n")
+    assert _changed_files(stats, _stat_files([a, b, c])) == [a, b, c]
+
+
+def test_update_project(tmp_path: Path):
+    objs = [tmp_path.joinpath(f"{name}.obj") for name in ("a", "b")]
+    for obj in objs:
+        obj.write_text("v 0 0 0\nv 1 0 0\nv 0 1 0\nf 1 2 3\n")
+    cfg = {"OBJECTS": {obj.stem: {"GEOMETRY": {"FILE": str(obj)}} for obj in objs}}
+    project = tmp_path.joinpath("project")
+    parser = make_project(cfg, project)
+    src = project.joinpath("src")
+    modules = sorted(src.glob("SIHM_EXTRA_*.js"))
+    assert len(modules) == 2
+    stats = _stat_files(modules)
+
+    # Updating the project only rewrites the modules whose sources changed, and leaves the rest
+    # of the project as it is
+    src.joinpath("camera.js").write_text("// edited")
+    objs[0].write_text("v 0 0 0\nv 20 0 0\nv 0 20 0\nf 1 2 3\n")
+    parser = update_project(cfg, project, previous_modules=parser.module_signatures)
+    assert sorted(src.glob("SIHM_EXTRA_*.js")) == modules
+    changed = _changed_files(stats, _stat_files(modules))
+    assert len(changed) == 1
+    assert "20" in changed[0].read_text()
+    assert src.joinpath("camera.js").read_text() == "// edited"
+
+    # Nothing is rewritten if nothing changed
+    stats = _stat_files(modules)
+    update_project(cfg, project, previous_modules=parser.module_signatures)
+    assert _changed_files(stats, _stat_files(modules)) == []
@@ -0,0 +1,128 @@
+import json
+import os
+import subprocess
+import threading
+import time
+from pathlib import Path
+
+import pytest
+
+from sihm.workspace import (
+    BASE_MODULES,
+    MANIFEST,
+    clear_workspaces,
+    node_workspace,
+    workspace_key,
+)
+
+
+class FakeYarn:
+    """
+    Stands in for subprocess.run, installing empty modules the way yarn add would.
+    """
+
+    def __init__(self, version: str = "1.0.0", delay: float = 0.0) -> None:
+        self.version = version
+        self.delay = delay
+        self.installs = []
+
+    def __call__(self, cmd, shell, check, cwd):
+        cwd = Path(cwd)
+        if cmd.startswith("yarn add"):
+            self.installs.append(cwd)
+            for spec in cmd.split()[2:]:
+                k = spec.find("@", 1)
+                name, version = (spec, self.version) if k < 0 else (spec[:k], spec[k + 1 :])
+                module = cwd.joinpath("node_modules", name)
+                module.mkdir(parents=True)
+                with open(module.joinpath("package.json"), "w") as f:
+                    json.dump({"name": name, "version": version}, f)
+                # Concurrent installs overlap while yarn is busy
+                time.sleep(self.delay)
+        else:
+            cwd.joinpath("package.json").write_text("{}")
+        return subprocess.CompletedProcess(cmd, 0)
+
+
+def test_workspace_key():
+    # The base modules and the order of the extra modules do not change the key
+    assert workspace_key(["a", "b"]) == workspace_key(["b", "a", BASE_MODULES[0]])
+    assert workspace_key(["a"]) != workspace_key(["a@1.0.0"])
+
+
+def test_install(tmp_path: Path, monkeypatch):
+    yarn = FakeYarn()
+    monkeypatch.setattr(subprocess, "run", yarn)
+    workspace = node_workspace(["stats-js@0.17.0"], tmp_path)
+
+    # The modules are installed in a temporary directory that is then renamed into place
+    assert len(yarn.installs) == 1
+    assert yarn.installs[0].parent == tmp_path
+    assert yarn.installs[0].name.startswith(".tmp_")
+    assert not yarn.installs[0].exists()
+    assert [p.name for p in tmp_path.iterdir()] == [workspace.name]
+
+    # The resolved versions are recorded, and the workspace is reused while they match
+    with open(workspace.joinpath(MANIFEST), "r") as f:
+        modules = json.load(f)["modules"]
+    assert modules["stats-js"] == "0.17.0"
+    assert modules["three"] == "1.0.0"
+    assert node_workspace(["stats-js@0.17.0"], tmp_path) == workspace
+    assert len(yarn.installs) == 1
+
+
+def test_failed_install(tmp_path: Path, monkeypatch):
+    def fail(cmd, shell, check, cwd):
+        if cmd.startswith("yarn add"):
+            raise subprocess.CalledProcessError(1, cmd)
+
+    # A failed install leaves nothing behind
+    monkeypatch.setattr(subprocess, "run", fail)
+    with pytest.raises(subprocess.CalledProcessError):
+        node_workspace([], tmp_path)
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_reinstall(tmp_path: Path, monkeypatch):
+    yarn = FakeYarn()
+    monkeypatch.setattr(subprocess, "run", yarn)
+    workspace = node_workspace([], tmp_path)
+
+    # A workspace whose modules changed is reinstalled, and the old one is moved aside
+    with open(workspace.joinpath("node_modules", "three", "package.json"), "w") as f:
+        json.dump({"name": "three", "version": "0.1.0"}, f)
+    yarn.version = "2.0.0"
+    assert node_workspace([], tmp_path) == workspace
+    assert len(yarn.installs) == 2
+    with open(workspace.joinpath(MANIFEST), "r") as f:
+        assert json.load(f)["modules"]["three"] == "2.0.0"
+    assert len(list(tmp_path.glob(".old_*"))) == 1
+
+    # So is a stale workspace
+    node_workspace([], tmp_path, max_age=0.0)
+    assert len(yarn.installs) == 3
+
+    clear_workspaces(tmp_path)
+    assert not tmp_path.exists()
+
+
+def test_concurrent_installs(tmp_path: Path, monkeypatch):
+    yarn = FakeYarn(delay=0.01)
+    monkeypatch.setattr(subprocess, "run", yarn)
+    results = []
+    threads = [
+        threading.Thread(target=lambda: results.append(node_workspace(["glslify"], tmp_path)))
+        for _ in range(4)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    # Every build gets the same complete workspace, and the losing installs are cleaned up
+    assert len(results) == 4
+    assert len(set(results)) == 1
+    workspace = results[0]
+    assert os.listdir(tmp_path) == [workspace.name]
+    assert workspace.joinpath("node_modules", "glslify", "package.json").is_file()
+    assert workspace.joinpath(MANIFEST).is_file()